@@ -1,4 +1,16 @@
 from django.contrib import admin
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+from ns.admin_actions import bulk_action
+from ns.admin_filters import LookupListFilter
+from ns.mixins import ReplicaChangeListMixin
+from ns.pagination import EstimatedCountPaginator
+from ns.search import FullTextSearchMixin
+from .bulk import (
+    goals_of, record_weights, session_goals_of,
+    set_goal_results, set_session_status
+)
+from .forms import GoalResultForm, SessionStatusForm, WeightHistoryForm
 from .models import (
     SessionType, SessionStatus, NSSession,
     SessionGoal, SUR, GoalWeightHistory
@@ -21,35 +33,86 @@ class SessionStatusAdmin(admin.ModelAdmin):
     readonly_fields = ('createdat', 'modifiedat')
 
 
+# Виджет автодополнения загружает выбранное значение отдельным запросом,
+# поэтому в существующих строках инлайнов внешние ключи только отображаются
+# (из select_related), а выбор через автодополнение есть только в строках
+# для добавления, у которых значения еще нет.
+
+class AddRowsInline(admin.TabularInline):
+    """Инлайн только для новых строк: существующие показывает другой инлайн модели"""
+    extra = 1
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).none()
+
+
 class SessionGoalInline(admin.TabularInline):
     """Инлайн для целей сессии"""
     model = SessionGoal
-    extra = 1
-    readonly_fields = ('createdat', 'modifiedat')
+    extra = 0
+    readonly_fields = ('goal', 'createdat', 'modifiedat')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('goal')
+
+
+class SessionGoalAddInline(AddRowsInline):
+    """Добавление целей в сессию"""
+    model = SessionGoal
+    verbose_name_plural = 'Добавление целей в сессию'
+    autocomplete_fields = ('goal',)
+    fields = ('goal', 'current_weight', 'goal_plan', 'goal_steps')
 
 
 class SURInline(admin.TabularInline):
     """Инлайн для участников сессии"""
     model = SUR
-    extra = 1
-    readonly_fields = ('createdat', 'modifiedat')
+    extra = 0
+    readonly_fields = ('nsuser', 'nsrole', 'createdat', 'modifiedat')
 
+    def has_add_permission(self, request, obj=None):
+        return False
 
-class GoalWeightHistoryInline(admin.TabularInline):
-    """Инлайн для истории весов целей"""
-    model = GoalWeightHistory
-    extra = 1
-    readonly_fields = ('createdat', 'modifiedat')
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('nsuser', 'nsrole')
+
+
+class SURAddInline(AddRowsInline):
+    """Добавление участников в сессию"""
+    model = SUR
+    verbose_name_plural = 'Добавление участников в сессию'
+    autocomplete_fields = ('nsuser',)
+    fields = ('nsuser', 'nsrole')
 
 
 @admin.register(NSSession)
-class NSSessionAdmin(admin.ModelAdmin):
+class NSSessionAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     """Админка для сессий целеполагания"""
-    list_display = ('id', 'session_type', 'session_status', 'start_date', 'stop_date', 'createdat')
-    list_filter = ('session_type', 'session_status', 'start_date')
+    list_display = (
+        'id', 'session_type', 'session_status', 'start_date', 'stop_date',
+        'goal_count', 'participant_count', 'createdat'
+    )
+    list_select_related = ('session_type', 'session_status', 'summary')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_filter = (
+        ('session_type', LookupListFilter),
+        ('session_status', LookupListFilter),
+        'start_date',
+    )
     search_fields = ('id',)
-    readonly_fields = ('createdat', 'modifiedat', 'duration_days')
-    inlines = [SessionGoalInline, SURInline, GoalWeightHistoryInline]
+    readonly_fields = (
+        'createdat', 'modifiedat', 'duration_days',
+        'goal_count', 'weight_total', 'participant_count',
+        'participants_by_role', 'results_by_type', 'weight_history',
+    )
+    # История весов сессии не ограничена по размеру и открывается
+    # отфильтрованным списком, а не инлайном
+    inlines = [SessionGoalInline, SessionGoalAddInline, SURInline, SURAddInline]
+    actions = ['change_status', 'set_goal_results', 'record_weights']
     fieldsets = (
         (None, {
             'fields': ('session_type', 'session_status')
@@ -57,35 +120,136 @@ class NSSessionAdmin(admin.ModelAdmin):
         ('Даты', {
             'fields': ('start_date', 'stop_date', 'duration_days')
         }),
+        ('Сводка', {
+            'fields': (
+                'goal_count', 'weight_total', 'participant_count',
+                'participants_by_role', 'results_by_type', 'weight_history',
+            )
+        }),
         ('Служебные поля', {
             'fields': ('createdat', 'modifiedat'),
             'classes': ('collapse',)
         }),
     )
 
+    @staticmethod
+    def _summary(obj):
+        # Сводки может еще не быть, если сессия не пересчитывалась
+        return getattr(obj, 'summary', None)
+
+    @admin.display(description='Целей', ordering='summary__goal_count')
+    def goal_count(self, obj):
+        summary = self._summary(obj)
+        return summary.goal_count if summary else 0
+
+    @admin.display(description='Суммарный вес целей')
+    def weight_total(self, obj):
+        summary = self._summary(obj)
+        return summary.weight_total if summary else 0
+
+    @admin.display(description='Участников', ordering='summary__participant_count')
+    def participant_count(self, obj):
+        summary = self._summary(obj)
+        return summary.participant_count if summary else 0
+
+    @admin.display(description='Участники по ролям')
+    def participants_by_role(self, obj):
+        summary = self._summary(obj)
+        return self._distribution(summary.participants_by_role if summary else {})
+
+    @admin.display(description='Цели по типам результата')
+    def results_by_type(self, obj):
+        summary = self._summary(obj)
+        return self._distribution(summary.results_by_type if summary else {})
+
+    @admin.display(description='История весов')
+    def weight_history(self, obj):
+        if obj.pk is None:
+            return '-'
+        url = reverse('admin:goal_sessions_goalweighthistory_changelist')
+        return format_html('<a href="{}?nssession__id__exact={}">Открыть историю весов сессии</a>', url, obj.pk)
+
+    @staticmethod
+    def _distribution(counts):
+        return format_html_join('', '<div>{}: {}</div>', sorted(counts.items())) or '-'
+
+    @admin.action(description='Изменить статус сессий')
+    def change_status(self, request, queryset):
+        return bulk_action(
+            self, request, queryset, SessionStatusForm,
+            set_session_status, 'Изменение статуса сессий'
+        )
+
+    @admin.action(description='Установить результат целей сессий')
+    def set_goal_results(self, request, queryset):
+        return bulk_action(
+            self, request, queryset, GoalResultForm,
+            lambda sessions, **params: set_goal_results(goals_of(session_goals_of(sessions)), **params),
+            'Установка результата целей сессий'
+        )
+
+    @admin.action(description='Записать веса целей сессий в историю')
+    def record_weights(self, request, queryset):
+        return bulk_action(
+            self, request, queryset, WeightHistoryForm,
+            lambda sessions, **params: record_weights(session_goals_of(sessions), **params),
+            'Запись весов целей в историю'
+        )
+
 
 @admin.register(SessionGoal)
-class SessionGoalAdmin(admin.ModelAdmin):
+class SessionGoalAdmin(ReplicaChangeListMixin, FullTextSearchMixin, admin.ModelAdmin):
     """Админка для целей в сессии"""
     list_display = ('goal', 'nssession', 'current_weight', 'createdat')
-    list_filter = ('nssession__session_type', 'createdat')
+    list_select_related = ('goal', 'nssession')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    autocomplete_fields = ('goal', 'nssession')
+    list_filter = (('nssession__session_type', LookupListFilter), 'createdat')
     search_fields = ('goal__goal_name', 'goal_plan', 'goal_steps')
+    search_vector_fields = ('search_vector', 'goal__search_vector')
+    search_help_text = 'Поиск по словам в плане, шагах и имени цели'
     readonly_fields = ('createdat', 'modifiedat')
+    actions = ['set_goal_results', 'record_weights']
+
+    @admin.action(description='Установить результат целей')
+    def set_goal_results(self, request, queryset):
+        return bulk_action(
+            self, request, queryset, GoalResultForm,
+            lambda session_goals, **params: set_goal_results(goals_of(session_goals), **params),
+            'Установка результата целей'
+        )
+
+    @admin.action(description='Записать веса целей в историю')
+    def record_weights(self, request, queryset):
+        return bulk_action(
+            self, request, queryset, WeightHistoryForm,
+            record_weights, 'Запись весов целей в историю'
+        )
 
 
 @admin.register(SUR)
-class SURAdmin(admin.ModelAdmin):
+class SURAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     """Админка для участников сессий с ролями"""
     list_display = ('nsuser', 'nsrole', 'nssession', 'createdat')
-    list_filter = ('nsrole', 'nssession__session_type')
+    list_select_related = ('nsuser', 'nsrole', 'nssession')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    autocomplete_fields = ('nsuser', 'nssession')
+    list_filter = (('nsrole', LookupListFilter), ('nssession__session_type', LookupListFilter))
     search_fields = ('nsuser__userlogin', 'nsrole__rolename')
     readonly_fields = ('createdat', 'modifiedat')
 
 
 @admin.register(GoalWeightHistory)
-class GoalWeightHistoryAdmin(admin.ModelAdmin):
+class GoalWeightHistoryAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     """Админка для истории весов целей"""
-    list_display = ('nssession', 'goal_weight', 'change_reason', 'createdat')
-    list_filter = ('nssession', 'createdat')
-    search_fields = ('change_reason',)
+    list_display = ('nssession', 'goal', 'goal_weight', 'change_reason', 'createdat')
+    list_select_related = ('nssession', 'goal')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    autocomplete_fields = ('nssession', 'goal')
+    # Фильтр по типу сессии вместо списка всех сессий, конкретная сессия - поиском по id
+    list_filter = (('nssession__session_type', LookupListFilter), 'createdat')
+    search_fields = ('change_reason', '=nssession__id')
     readonly_fields = ('createdat', 'modifiedat')
@@ -0,0 +1,61 @@
+from django.db.models import Q
+from ns.api import ModelListAPIView, ModelDetailAPIView
+from .models import NSSession, SessionGoal, SUR
+
+
+class SessionAPIMixin:
+    """JSON API сессий целеполагания: сессии, в которых участвует пользователь"""
+    model = NSSession
+    fields = ('id', 'session_type', 'session_status', 'start_date', 'stop_date', 'createdat', 'modifiedat')
+    filter_fields = ('session_type', 'session_status')
+
+    def get_queryset(self):
+        return NSSession.objects.participated_by(self.request.user)
+
+
+class SessionGoalAPIMixin:
+    """JSON API целей сессий: свои цели и цели, видимые для других"""
+    model = SessionGoal
+    fields = ('id', 'nssession', 'goal', 'current_weight', 'goal_plan', 'goal_steps', 'createdat', 'modifiedat')
+    filter_fields = ('nssession', 'goal')
+
+    def get_queryset(self):
+        return SessionGoal.objects.filter(
+            Q(goal__nsuser=self.request.user) | Q(goal__visibleforothers=True)
+        )
+
+
+class SURAPIMixin:
+    """JSON API участников сессий с ролями: участники сессий пользователя"""
+    model = SUR
+    fields = ('id', 'nssession', 'nsuser', 'nsrole', 'createdat', 'modifiedat')
+    filter_fields = ('nssession', 'nsuser', 'nsrole')
+
+    def get_queryset(self):
+        return SUR.objects.filter(
+            nssession__in=NSSession.objects.participated_by(self.request.user).values('pk')
+        )
+
+
+class SessionListAPIView(SessionAPIMixin, ModelListAPIView):
+    pass
+
+
+class SessionDetailAPIView(SessionAPIMixin, ModelDetailAPIView):
+    pass
+
+
+class SessionGoalListAPIView(SessionGoalAPIMixin, ModelListAPIView):
+    pass
+
+
+class SessionGoalDetailAPIView(SessionGoalAPIMixin, ModelDetailAPIView):
+    pass
+
+
+class SURListAPIView(SURAPIMixin, ModelListAPIView):
+    pass
+
+
+class SURDetailAPIView(SURAPIMixin, ModelDetailAPIView):
+    pass
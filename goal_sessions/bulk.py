@@ -0,0 +1,73 @@
+from django.db import router, transaction
+from django.utils import timezone
+
+from goals.models import GoalsBacklog
+from .models import NSSession, SessionGoal, GoalWeightHistory, schedule_summary_refresh
+
+# Количество записей истории в одном INSERT
+HISTORY_BATCH_SIZE = 1000
+
+# Массовые операции над сессиями и целями. Каждая операция выполняется
+# одним UPDATE или одной серией INSERT в транзакции и возвращает количество
+# измененных строк; с dry_run=True только считает строки, которые изменятся.
+
+
+def session_goals_of(sessions):
+    """Цели сессий из выборки сессий"""
+    return SessionGoal.objects.filter(nssession__in=sessions.order_by().values('pk'))
+
+
+def goals_of(session_goals):
+    """Цели бэклога из выборки целей сессий"""
+    return GoalsBacklog.objects.filter(pk__in=session_goals.order_by().values('goal_id'))
+
+
+def set_session_status(sessions, session_status, dry_run=False):
+    """Смена статуса сессий (запись или id статуса)"""
+    sessions = sessions.exclude(session_status=session_status).order_by()
+    if dry_run:
+        return sessions.count()
+    with transaction.atomic(using=router.db_for_write(NSSession)):
+        return sessions.update(session_status=session_status, modifiedat=timezone.now())
+
+
+def set_goal_results(goals, goal_result_type, dry_run=False):
+    """
+    Установка результата целей бэклога (запись или id типа результата).
+    Сводки сессий с этими целями пересчитываются после фиксации.
+    """
+    goals = goals.exclude(goal_result_type=goal_result_type).order_by()
+    if dry_run:
+        return goals.count()
+    with transaction.atomic(using=router.db_for_write(GoalsBacklog)):
+        # update() не вызывает сигналы, сессии для пересчета сводок выбираются до изменения
+        nssession_ids = list(
+            SessionGoal.objects.filter(goal__in=goals.values('pk'))
+            .order_by().values_list('nssession_id', flat=True).distinct()
+        )
+        count = goals.update(goal_result_type=goal_result_type, modifiedat=timezone.now())
+        for nssession_id in nssession_ids:
+            schedule_summary_refresh(nssession_id)
+    return count
+
+
+def record_weights(session_goals, change_reason, dry_run=False):
+    """Запись текущих весов целей сессий в историю весов с общей причиной"""
+    session_goals = session_goals.order_by()
+    if dry_run:
+        return session_goals.count()
+    rows = session_goals.values_list('nssession_id', 'goal_id', 'current_weight')
+    with transaction.atomic(using=router.db_for_write(GoalWeightHistory)):
+        history = GoalWeightHistory.objects.bulk_create([
+            GoalWeightHistory(
+                nssession_id=nssession_id,
+                goal_id=goal_id,
+                goal_weight=current_weight,
+                change_reason=change_reason
+            )
+            for nssession_id, goal_id, current_weight in rows
+        ], batch_size=HISTORY_BATCH_SIZE)
+        # bulk_create не вызывает сигналы, поэтому сводки пересчитываются явно
+        for nssession_id in {entry.nssession_id for entry in history}:
+            schedule_summary_refresh(nssession_id)
+    return len(history)
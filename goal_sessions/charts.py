@@ -0,0 +1,50 @@
+from django.utils import timezone
+
+# Количество интервалов, до которого прореживается история весов
+CHART_POINTS = 60
+
+# Цвета линий целей, повторяются по кругу
+CHART_COLORS = ('#0d6efd', '#dc3545', '#198754', '#fd7e14', '#6f42c1', '#20c997', '#6c757d', '#d63384')
+
+
+def weight_chart(series, names, width=600, height=200, padding=10):
+    """
+    Линии графика весов для встроенного SVG.
+
+    series - ряды {id цели: [(время, вес), ...]} из GoalWeightHistory.downsampled,
+    names - имена целей по id. Время и вес масштабируются в область
+    width x height с отступом padding. Возвращает None, если точек нет.
+    """
+    points = [point for goal_points in series.values() for point in goal_points]
+    if not points:
+        return None
+
+    start = min(moment for moment, weight in points)
+    end = max(moment for moment, weight in points)
+    low = min(weight for moment, weight in points)
+    high = max(weight for moment, weight in points)
+    time_span = (end - start).total_seconds() or 1
+    weight_span = float(high - low) or 1
+
+    def scale(moment, weight):
+        x = padding + (moment - start).total_seconds() / time_span * (width - 2 * padding)
+        y = height - padding - float(weight - low) / weight_span * (height - 2 * padding)
+        return f'{x:.1f},{y:.1f}'
+
+    lines = [
+        {
+            'name': names.get(goal_id, goal_id),
+            'color': CHART_COLORS[index % len(CHART_COLORS)],
+            'points': ' '.join(scale(moment, weight) for moment, weight in goal_points),
+        }
+        for index, (goal_id, goal_points) in enumerate(series.items())
+    ]
+    return {
+        'width': width,
+        'height': height,
+        'lines': lines,
+        'start': timezone.localtime(start),
+        'end': timezone.localtime(end),
+        'low': round(low),
+        'high': round(high),
+    }
@@ -0,0 +1,120 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import NSSession, SessionGoal, GoalWeightHistory
+
+# Количество строк, получаемых из серверного курсора за одно обращение
+EXPORT_CHUNK_SIZE = 2000
+
+# Выгружаемые наборы данных: модель, путь от модели к сессии, порядок и колонки
+# (имя колонки, поле для values_list)
+DATASETS = {
+    'sessions': {
+        'model': NSSession,
+        'session': '',
+        'ordering': ('id',),
+        'columns': (
+            ('id', 'id'),
+            ('session_type', 'session_type__type_name'),
+            ('session_status', 'session_status__type_name'),
+            ('start_date', 'start_date'),
+            ('stop_date', 'stop_date'),
+            ('createdat', 'createdat'),
+            ('modifiedat', 'modifiedat'),
+        ),
+    },
+    'goals': {
+        'model': SessionGoal,
+        'session': 'nssession__',
+        'ordering': ('nssession_id', 'id'),
+        'columns': (
+            ('id', 'id'),
+            ('nssession_id', 'nssession_id'),
+            ('goal_id', 'goal_id'),
+            ('goal_name', 'goal__goal_name'),
+            ('current_weight', 'current_weight'),
+            ('goal_plan', 'goal_plan'),
+            ('goal_steps', 'goal_steps'),
+            ('createdat', 'createdat'),
+            ('modifiedat', 'modifiedat'),
+        ),
+    },
+    'history': {
+        'model': GoalWeightHistory,
+        'session': 'nssession__',
+        # Порядок совпадает с ключом индекса gwh_session_goal_createdat_idx,
+        # строки выгружаются без сортировки всей таблицы
+        'ordering': ('nssession_id', 'goal_id', 'createdat'),
+        'columns': (
+            ('id', 'id'),
+            ('nssession_id', 'nssession_id'),
+            ('goal_id', 'goal_id'),
+            ('goal_weight', 'goal_weight'),
+            ('change_reason', 'change_reason'),
+            ('createdat', 'createdat'),
+        ),
+    },
+}
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_queryset(dataset, session_type=None, session_status=None, date_from=None, date_to=None):
+    """
+    Выборка набора данных с фильтрами по сессии.
+    Период отбирает сессии, пересекающиеся с [date_from, date_to].
+    """
+    options = DATASETS[dataset]
+    session = options['session']
+    filters = {}
+    if session_type is not None:
+        filters[f'{session}session_type'] = session_type
+    if session_status is not None:
+        filters[f'{session}session_status'] = session_status
+    if date_from is not None:
+        filters[f'{session}stop_date__gte'] = date_from
+    if date_to is not None:
+        filters[f'{session}start_date__lte'] = date_to
+
+    return options['model'].objects.filter(**filters).order_by(*options['ordering']).values_list(
+        *(field for _, field in options['columns'])
+    )
+
+
+def export_lines(dataset, export_format, chunk_size=EXPORT_CHUNK_SIZE, **filters):
+    """
+    Строки выгрузки в формате csv или ndjson.
+    Записи читаются серверным курсором порциями по chunk_size, поэтому
+    расход памяти не зависит от объема выгрузки.
+    """
+    header = [name for name, _ in DATASETS[dataset]['columns']]
+    queryset = export_queryset(dataset, **filters)
+    # БД выбирается сейчас: строки читаются уже после выхода из представления
+    rows = queryset.using(queryset.db).iterator(chunk_size=chunk_size)
+    if export_format == 'csv':
+        return _csv_lines(header, rows)
+    return _ndjson_lines(header, rows)
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(header, rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(header, row))) + '\n'
@@ -0,0 +1,80 @@
+from django import forms
+
+from goals.forms import lookup_choices
+from goals.models import GoalResultType
+from .export import DATASETS, FORMATS
+from .models import SessionType, SessionStatus, GoalWeightHistory
+
+
+class SessionExportForm(forms.Form):
+    """Параметры выгрузки сессий, целей сессий и истории весов"""
+    dataset = forms.ChoiceField(
+        label='Данные',
+        choices=[(name, name) for name in DATASETS],
+        initial='sessions'
+    )
+    format = forms.ChoiceField(
+        label='Формат',
+        choices=[(name, name) for name in FORMATS],
+        initial='csv',
+        required=False
+    )
+    session_type = forms.TypedChoiceField(
+        label='Тип сессии',
+        choices=lookup_choices(SessionType),
+        coerce=int,
+        empty_value=None,
+        required=False
+    )
+    session_status = forms.TypedChoiceField(
+        label='Статус сессии',
+        choices=lookup_choices(SessionStatus),
+        coerce=int,
+        empty_value=None,
+        required=False
+    )
+    date_from = forms.DateField(label='Период с', required=False)
+    date_to = forms.DateField(label='Период по', required=False)
+
+    def clean_format(self):
+        return self.cleaned_data['format'] or 'csv'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from, date_to = cleaned_data.get('date_from'), cleaned_data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError('Начало периода позже его окончания')
+        return cleaned_data
+
+    def filters(self):
+        """Фильтры для export_lines"""
+        return {
+            name: self.cleaned_data[name]
+            for name in ('session_type', 'session_status', 'date_from', 'date_to')
+        }
+
+
+class SessionStatusForm(forms.Form):
+    """Новый статус для массовой смены статуса сессий"""
+    session_status = forms.TypedChoiceField(
+        label='Статус сессии',
+        choices=lambda: SessionStatus.lookups.choices(),
+        coerce=int
+    )
+
+
+class GoalResultForm(forms.Form):
+    """Результат для массовой установки результата целей"""
+    goal_result_type = forms.TypedChoiceField(
+        label='Результат цели',
+        choices=lambda: GoalResultType.lookups.choices(),
+        coerce=int
+    )
+
+
+class WeightHistoryForm(forms.Form):
+    """Причина для массовой записи весов целей в историю"""
+    change_reason = forms.CharField(
+        label='Причина изменения',
+        max_length=GoalWeightHistory._meta.get_field('change_reason').max_length
+    )
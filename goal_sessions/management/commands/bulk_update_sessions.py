@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+from goal_sessions.bulk import (
+    goals_of, record_weights, session_goals_of,
+    set_goal_results, set_session_status
+)
+from goal_sessions.forms import GoalResultForm, SessionStatusForm, WeightHistoryForm
+from goal_sessions.models import NSSession, SessionType, SessionStatus
+from goals.models import GoalResultType
+
+# Операции: форма параметра, справочник значения (None - значение как есть)
+# и функция над выборкой сессий
+OPERATIONS = {
+    'status': (SessionStatusForm, SessionStatus, set_session_status),
+    'result': (
+        GoalResultForm, GoalResultType,
+        lambda sessions, **params: set_goal_results(goals_of(session_goals_of(sessions)), **params)
+    ),
+    'history': (
+        WeightHistoryForm, None,
+        lambda sessions, **params: record_weights(session_goals_of(sessions), **params)
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Массово меняет статус сессий (status), результат их целей (result) '
+        'или записывает текущие веса целей в историю (history)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('operation', choices=list(OPERATIONS), help='Операция')
+        parser.add_argument(
+            'value', type=str,
+            help='Статус сессии или результат цели (id или название), для history - причина изменения'
+        )
+        parser.add_argument('--sessions', type=int, nargs='+', help='ID сессий')
+        parser.add_argument('--session-type', type=str, help='Тип сессии (id или название)')
+        parser.add_argument('--status', type=str, help='Текущий статус сессии (id или название)')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать количество строк, которые будут изменены'
+        )
+
+    def handle(self, *args, **options):
+        form_class, lookup_model, operation = OPERATIONS[options['operation']]
+        field_name = next(iter(form_class.base_fields))
+        value = options['value']
+        if lookup_model is not None:
+            value = self.lookup_id(lookup_model, value)
+        form = form_class({field_name: value})
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+
+        sessions = NSSession.objects.all()
+        if options['sessions']:
+            sessions = sessions.filter(pk__in=options['sessions'])
+        if options['session_type']:
+            sessions = sessions.filter(session_type=self.lookup_id(SessionType, options['session_type']))
+        if options['status']:
+            sessions = sessions.filter(session_status=self.lookup_id(SessionStatus, options['status']))
+        if not (options['sessions'] or options['session_type'] or options['status']):
+            raise CommandError('Укажите сессии: --sessions, --session-type или --status')
+
+        count = operation(sessions, dry_run=options['dry_run'], **form.cleaned_data)
+        if options['dry_run']:
+            self.stdout.write(f'Будет изменено строк: {count}')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Изменено строк: {count}'))
+
+    def lookup_id(self, model, value):
+        """id записи справочника по id или названию"""
+        if not value or value.isdigit():
+            return value
+        obj = model.lookups.get_by_name(value)
+        if obj is None:
+            raise CommandError(f'{model._meta.verbose_name} «{value}» не найден')
+        return obj.pk
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from goal_sessions.export import DATASETS, FORMATS, EXPORT_CHUNK_SIZE, export_lines
+from goal_sessions.forms import SessionExportForm
+from goal_sessions.models import SessionType, SessionStatus
+from ns.routers import replica_reads
+
+
+class Command(BaseCommand):
+    help = 'Выгружает сессии, цели сессий или историю весов в CSV/NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS), help='Набор данных')
+        parser.add_argument('--format', choices=list(FORMATS), default='csv', help='Формат выгрузки')
+        parser.add_argument('--session-type', type=str, help='Тип сессии (id или название)')
+        parser.add_argument('--status', type=str, help='Статус сессии (id или название)')
+        parser.add_argument('--date-from', type=str, help='Начало периода, ГГГГ-ММ-ДД')
+        parser.add_argument('--date-to', type=str, help='Окончание периода, ГГГГ-ММ-ДД')
+        parser.add_argument('--output', type=str, help='Файл для выгрузки (по умолчанию stdout)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+            help='Количество строк, читаемых из курсора за раз'
+        )
+
+    def handle(self, *args, **options):
+        form = SessionExportForm({
+            'dataset': options['dataset'],
+            'format': options['format'],
+            'session_type': self.lookup_id(SessionType, options['session_type']),
+            'session_status': self.lookup_id(SessionStatus, options['status']),
+            'date_from': options['date_from'],
+            'date_to': options['date_to'],
+        })
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+
+        # Выгрузка читает с реплики, если реплики настроены
+        with replica_reads():
+            lines = export_lines(
+                form.cleaned_data['dataset'], form.cleaned_data['format'],
+                chunk_size=options['chunk_size'], **form.filters()
+            )
+        if options['output']:
+            count = 0
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                for line in lines:
+                    output.write(line)
+                    count += 1
+            self.stdout.write(self.style.SUCCESS(f"Выгружено строк: {count} в {options['output']}"))
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
+
+    def lookup_id(self, model, value):
+        """id записи справочника по id или названию"""
+        if not value or value.isdigit():
+            return value
+        obj = model.lookups.get_by_name(value)
+        if obj is None:
+            raise CommandError(f'{model._meta.verbose_name} «{value}» не найден')
+        return obj.pk
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from goal_sessions.models import NSSession, SessionSummary
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводные показатели сессий целеполагания'
+
+    def add_arguments(self, parser):
+        parser.add_argument('session_ids', nargs='*', type=int, help='ID сессий (по умолчанию все)')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Количество сессий, пересчитываемых одним набором запросов'
+        )
+
+    def handle(self, *args, **options):
+        sessions = NSSession.objects.order_by('pk').values_list('pk', flat=True)
+        if options['session_ids']:
+            sessions = sessions.filter(pk__in=options['session_ids'])
+
+        # Пересчет пачками: каждая пачка - короткая транзакция, сводки
+        # остаются доступными для чтения на все время пересчета
+        count = 0
+        last_pk = None
+        while True:
+            pending = sessions if last_pk is None else sessions.filter(pk__gt=last_pk)
+            ids = list(pending[:options['batch_size']])
+            if not ids:
+                break
+            count += len(SessionSummary.objects.refresh(ids))
+            last_pk = ids[-1]
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано сводок: {count}')
+        )
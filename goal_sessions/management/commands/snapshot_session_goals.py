@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from goal_sessions.models import NSSession, SessionGoal
+
+
+class Command(BaseCommand):
+    help = 'Переносит первые цели из бэклогов участников в сессию целеполагания'
+
+    def add_arguments(self, parser):
+        parser.add_argument('session_id', type=int, help='ID сессии')
+        parser.add_argument(
+            '--top', type=int, default=5,
+            help='Количество первых целей из бэклога каждого участника'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            nssession = NSSession.objects.get(pk=options['session_id'])
+        except NSSession.DoesNotExist:
+            raise CommandError(f"Сессия {options['session_id']} не найдена")
+
+        session_goals = SessionGoal.objects.snapshot_backlogs(nssession, options['top'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'В сессию {nssession.id} добавлено целей: {len(session_goals)}')
+        )
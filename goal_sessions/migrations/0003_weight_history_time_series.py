@@ -0,0 +1,67 @@
+# Generated by Django 6.0 on 2026-10-18 16:14
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не выполняется внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ("goal_sessions", "0002_initial_data"),
+        ("goals", "0003_deferrable_priority_weight"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="goalweighthistory",
+            name="goal",
+            field=models.ForeignKey(
+                blank=True,
+                db_column="goal_id",
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="weight_history",
+                to="goals.goalsbacklog",
+                verbose_name="Цель",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="goalweighthistory",
+            index=models.Index(
+                fields=["nssession", "createdat"],
+                include=("goal_weight",),
+                name="gwh_session_createdat_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="goalweighthistory",
+            index=models.Index(
+                fields=["goal", "createdat"],
+                include=("goal_weight",),
+                name="gwh_goal_createdat_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="goalweighthistory",
+            index=django.contrib.postgres.indexes.BrinIndex(
+                fields=["createdat"], name="gwh_createdat_brin"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="goalweighthistory",
+            name="nssession",
+            field=models.ForeignKey(
+                db_column="nssession_id",
+                db_index=False,
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="weight_history",
+                to="goal_sessions.nssession",
+                verbose_name="Сессия",
+            ),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 6.0 on 2026-10-18 16:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goal_sessions", "0003_weight_history_time_series"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SessionSummary",
+            fields=[
+                (
+                    "nssession",
+                    models.OneToOneField(
+                        db_column="nssession_id",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to="goal_sessions.nssession",
+                        verbose_name="Сессия",
+                    ),
+                ),
+                (
+                    "goal_count",
+                    models.IntegerField(default=0, verbose_name="Количество целей"),
+                ),
+                (
+                    "weight_total",
+                    models.BigIntegerField(
+                        default=0, verbose_name="Суммарный вес целей"
+                    ),
+                ),
+                (
+                    "participant_count",
+                    models.IntegerField(
+                        default=0, verbose_name="Количество участников"
+                    ),
+                ),
+                (
+                    "participants_by_role",
+                    models.JSONField(default=dict, verbose_name="Участники по ролям"),
+                ),
+                (
+                    "results_by_type",
+                    models.JSONField(
+                        default=dict, verbose_name="Цели по типам результата"
+                    ),
+                ),
+                (
+                    "history_count",
+                    models.IntegerField(default=0, verbose_name="Изменений веса"),
+                ),
+                (
+                    "last_weight_change_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Последнее изменение веса"
+                    ),
+                ),
+                (
+                    "refreshedat",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        verbose_name="Дата и время пересчета",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Сводка сессии",
+                "verbose_name_plural": "Сводки сессий",
+                "db_table": "session_summary",
+            },
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 6.0 on 2026-10-18 16:36
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def drop_fk_index(model_name, name, index, table, column, field):
+    """
+    Удаление одиночного индекса внешнего ключа без блокировки таблицы:
+    в состоянии моделей поле получает db_index=False, в БД индекс
+    удаляется через DROP INDEX CONCURRENTLY
+    """
+    return migrations.SeparateDatabaseAndState(
+        state_operations=[
+            migrations.AlterField(model_name=model_name, name=name, field=field),
+        ],
+        database_operations=[
+            migrations.RunSQL(
+                f'DROP INDEX CONCURRENTLY IF EXISTS "{index}"',
+                reverse_sql=f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index}" ON "{table}" ("{column}")',
+            ),
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+    # CREATE/DROP INDEX CONCURRENTLY не выполняются внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ("goal_sessions", "0005_full_text_search"),
+        ("goals", "0004_full_text_search"),
+        ("users", "0006_one_to_one_profile"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="sessiongoal",
+            index=models.Index(
+                fields=["nssession", "-current_weight"],
+                include=("goal",),
+                name="session_goals_weight_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="sur",
+            index=models.Index(
+                fields=["nssession", "nsuser"],
+                include=("nsrole",),
+                name="sur_session_user_idx",
+            ),
+        ),
+        drop_fk_index(
+            "sessiongoal",
+            "nssession",
+            "session_goals_nssession_id_fc038c98",
+            "session_goals",
+            "nssession_id",
+            models.ForeignKey(
+                db_column="nssession_id",
+                db_index=False,
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="session_goals",
+                to="goal_sessions.nssession",
+                verbose_name="Сессия",
+            ),
+        ),
+        drop_fk_index(
+            "sur",
+            "nssession",
+            "sur_nssession_id_3ff12320",
+            "sur",
+            "nssession_id",
+            models.ForeignKey(
+                db_column="nssession_id",
+                db_index=False,
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="participants",
+                to="goal_sessions.nssession",
+                verbose_name="Сессия",
+            ),
+        ),
+        drop_fk_index(
+            "sur",
+            "nsuser",
+            "sur_nsuser_id_d80ef7eb",
+            "sur",
+            "nsuser_id",
+            models.ForeignKey(
+                db_column="nsuser_id",
+                db_index=False,
+                on_delete=django.db.models.deletion.RESTRICT,
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Пользователь",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 18:02
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE/DROP INDEX CONCURRENTLY не выполняются внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ("goal_sessions", "0006_composite_indexes"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="goalweighthistory",
+            index=models.Index(
+                fields=["nssession", "goal", "createdat"],
+                include=("goal_weight",),
+                name="gwh_session_goal_createdat_idx",
+            ),
+        ),
+        RemoveIndexConcurrently(
+            model_name="goalweighthistory",
+            name="gwh_session_createdat_idx",
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 19:45
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не выполняется внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ("goal_sessions", "0007_weight_history_series_index"),
+    ]
+
+    operations = [
+        # Индекс строится без блокировки записи. IF NOT EXISTS - для БД, где
+        # индекс уже создан прежней версией миграции 0005_full_text_search
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name="sessiongoal",
+                    index=django.contrib.postgres.indexes.GinIndex(
+                        fields=["search_vector"], name="session_goals_search_idx"
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "session_goals_search_idx" '
+                    'ON "session_goals" USING gin ("search_vector")',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS "session_goals_search_idx"',
+                ),
+            ],
+        ),
+    ]
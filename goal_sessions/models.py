@@ -1,8 +1,20 @@
-from django.db import models
+from datetime import datetime, time, timedelta
+
+from asgiref.local import Local
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import Avg, Count, Exists, F, Func, Max, OuterRef, Subquery, Sum, Value, Window
+from django.db.models.functions import Coalesce, Greatest, Least, RowNumber
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
+from ns.lookups import LookupCache
+from ns.search import search_vector
 from users.models import NSUser, NSRole
-from goals.models import GoalsBacklog
+from goals.models import GoalsBacklog, GoalResultType
 
 
 class SessionType(models.Model):
@@ -24,6 +36,9 @@ class SessionType(models.Model):
         auto_now=True
     )
 
+    # Кэш справочника в памяти процесса
+    lookups = LookupCache('type_name')
+
     class Meta:
         db_table = 'session_type'
         verbose_name = _('Тип сессии')
@@ -53,6 +68,9 @@ class SessionStatus(models.Model):
         auto_now=True
     )
 
+    # Кэш справочника в памяти процесса
+    lookups = LookupCache('type_name')
+
     class Meta:
         db_table = 'session_status'
         verbose_name = _('Статус сессии')
@@ -63,6 +81,39 @@ class SessionStatus(models.Model):
         return self.type_name
 
 
+class NSSessionQuerySet(models.QuerySet):
+    """Выборки сессий"""
+
+    def participated_by(self, nsuser):
+        """Сессии, в которых участвует пользователь (EXISTS по sur)"""
+        return self.filter(Exists(SUR.objects.filter(nssession=OuterRef('pk'), nsuser=nsuser)))
+
+    def for_participant(self, nsuser):
+        """
+        Сессии, в которых участвует пользователь, одним запросом.
+
+        Участие проверяется через EXISTS по sur, названия ролей пользователя
+        в сессии (список user_roles), количество целей (goal_count) и их суммарный текущий
+        вес (weight_total) - коррелированными подзапросами по индексам
+        (nssession, nsuser) и (nssession, -current_weight).
+        """
+        membership = SUR.objects.filter(nssession=OuterRef('pk'), nsuser=nsuser)
+        goals = SessionGoal.objects.filter(nssession=OuterRef('pk')).order_by().values('nssession')
+        return self.participated_by(nsuser).annotate(
+            user_roles=Subquery(
+                membership.order_by().values('nssession').annotate(
+                    roles=ArrayAgg('nsrole__rolename', order_by='nsrole__rolename')
+                ).values('roles')
+            ),
+            goal_count=Coalesce(
+                Subquery(goals.annotate(total=Count('*')).values('total')), Value(0)
+            ),
+            weight_total=Coalesce(
+                Subquery(goals.annotate(total=Sum('current_weight')).values('total')), Value(0)
+            ),
+        )
+
+
 class NSSession(models.Model):
     """Модель сессий целеполагания (таблица nssessions)"""
     id = models.AutoField(primary_key=True, verbose_name=_('ID'))
@@ -96,6 +147,8 @@ class NSSession(models.Model):
         auto_now=True
     )
 
+    objects = NSSessionQuerySet.as_manager()
+
     class Meta:
         db_table = 'nssessions'
         verbose_name = _('Сессия целеполагания')
@@ -112,6 +165,59 @@ class NSSession(models.Model):
             return (self.stop_date - self.start_date).days
         return 0
 
+class SessionGoalManager(models.Manager):
+    """Менеджер целей сессии"""
+
+    def get_queryset(self):
+        # Поисковый вектор нужен только в условиях поиска и не загружается в объекты
+        return super().get_queryset().defer('search_vector')
+
+    def snapshot_backlogs(self, nssession, top_n):
+        """
+        Перенос первых top_n целей из бэклога каждого участника сессии.
+
+        Цели выбираются одним запросом с оконной функцией, цели сессии и
+        начальные записи истории весов создаются через bulk_create в одной
+        транзакции. Цели, уже добавленные в сессию, пропускаются.
+        Возвращает список созданных целей сессии.
+        """
+        participants = SUR.objects.using(self.db).filter(nssession=nssession).values('nsuser_id')
+        backlog = GoalsBacklog.objects.using(self.db).filter(nsuser__in=participants).annotate(
+            backlog_rank=Window(
+                RowNumber(),
+                partition_by=F('nsuser'),
+                order_by=F('priority_weight').asc()
+            )
+        ).filter(backlog_rank__lte=top_n).only('id', 'goal_name', 'priority_weight')
+
+        with transaction.atomic(using=self.db):
+            existing = set(self.filter(nssession=nssession).values_list('goal_id', flat=True))
+            goals = [goal for goal in backlog if goal.pk not in existing]
+
+            session_goals = self.bulk_create([
+                SessionGoal(
+                    nssession=nssession,
+                    goal=goal,
+                    current_weight=goal.priority_weight,
+                    goal_plan='',
+                    goal_steps=''
+                )
+                for goal in goals
+            ])
+            GoalWeightHistory.objects.using(self.db).bulk_create([
+                GoalWeightHistory(
+                    nssession=nssession,
+                    goal=goal,
+                    goal_weight=goal.priority_weight,
+                    change_reason=f'Начальный вес цели «{goal.goal_name}»'
+                )
+                for goal in goals
+            ])
+            # bulk_create не вызывает сигналы, поэтому сводка пересчитывается явно
+            schedule_summary_refresh(nssession.pk)
+        return session_goals
+
+
 class SessionGoal(models.Model):
     """Модель целей в сессии (таблица session_goals)"""
     id = models.AutoField(primary_key=True, verbose_name=_('ID'))
@@ -120,7 +226,8 @@ class SessionGoal(models.Model):
         on_delete=models.RESTRICT,
         db_column='nssession_id',
         related_name='session_goals',
-        verbose_name=_('Сессия')
+        verbose_name=_('Сессия'),
+        db_index=False
     )
     goal = models.ForeignKey(
         GoalsBacklog,
@@ -140,6 +247,13 @@ class SessionGoal(models.Model):
         _('Что сделано для достижения цели'),
         max_length=1024
     )
+    # Поисковый вектор плана (вес A) и сделанных шагов (вес B), поддерживается PostgreSQL
+    search_vector = models.GeneratedField(
+        expression=search_vector(('goal_plan', 'A'), ('goal_steps', 'B')),
+        output_field=SearchVectorField(),
+        db_persist=True,
+        editable=False
+    )
 
     # Служебные поля с DateTimeField
     createdat = models.DateTimeField(
@@ -152,14 +266,26 @@ class SessionGoal(models.Model):
         auto_now=True
     )
 
+    objects = SessionGoalManager()
+
     class Meta:
         db_table = 'session_goals'
         verbose_name = _('Цель в сессии')
         verbose_name_plural = _('Цели в сессии')
         ordering = ['id']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='session_goals_search_idx'),
+            # Цели сессии по убыванию веса и суммы весов по сессиям читаются только из индекса,
+            # индекс заменяет одиночный индекс внешнего ключа сессии
+            models.Index(
+                fields=['nssession', '-current_weight'],
+                include=['goal'],
+                name='session_goals_weight_idx'
+            ),
+        ]
 
     def __str__(self):
-        return f"Цель '{self.goal.goal_name}' в сессии {self.nssession.id}"
+        return f"Цель '{self.goal.goal_name}' в сессии {self.nssession_id}"
 
 
 class SUR(models.Model):
@@ -169,7 +295,8 @@ class SUR(models.Model):
         NSUser,
         on_delete=models.RESTRICT,
         db_column='nsuser_id',
-        verbose_name=_('Пользователь')
+        verbose_name=_('Пользователь'),
+        db_index=False
     )
     nsrole = models.ForeignKey(
         NSRole,
@@ -182,7 +309,8 @@ class SUR(models.Model):
         on_delete=models.RESTRICT,
         db_column='nssession_id',
         related_name='participants',
-        verbose_name=_('Сессия')
+        verbose_name=_('Сессия'),
+        db_index=False
     )
 
     # Служебные поля с DateTimeField
@@ -201,15 +329,98 @@ class SUR(models.Model):
         verbose_name = _('Участник сессии с ролью')
         verbose_name_plural = _('Участники сессий с ролями')
         ordering = ['id']
+        # Сессии пользователя читаются по индексу уникального ограничения
+        # (nsuser, nssession, nsrole), участники сессии и проверка участия
+        # пользователя в сессии - по индексу (nssession, nsuser) с ролью.
+        # Они заменяют одиночные индексы внешних ключей пользователя и сессии
         constraints = [
             models.UniqueConstraint(
                 fields=['nsuser', 'nssession', 'nsrole'],
                 name='unique_user_session_role'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['nssession', 'nsuser'],
+                include=['nsrole'],
+                name='sur_session_user_idx'
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.nsuser.userlogin} - {self.nsrole.rolename} в сессии {self.nssession.id}"
+        # Роль берется из кэша справочника, сессия - по id без запроса
+        role = NSRole.lookups.get(self.nsrole_id)
+        return f"{self.nsuser.userlogin} - {role} в сессии {self.nssession_id}"
+
+
+class DateBin(Func):
+    """date_bin(шаг, время, начало) PostgreSQL: начало интервала шириной шаг"""
+    function = 'DATE_BIN'
+    output_field = models.DateTimeField()
+
+
+class GoalWeightHistoryQuerySet(models.QuerySet):
+    """Выборки истории весов как временных рядов"""
+
+    def in_range(self, start=None, end=None):
+        """Записи за период [start, end)"""
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(createdat__gte=start)
+        if end is not None:
+            queryset = queryset.filter(createdat__lt=end)
+        return queryset
+
+    def series(self, nssession=None, goals=None, start=None, end=None):
+        """
+        Ряды весов целей за период одним запросом.
+        Возвращает словарь {(id сессии, id цели): [(createdat, goal_weight), ...]},
+        точки каждого ряда упорядочены по времени.
+        """
+        queryset = self.in_range(start, end).filter(goal__isnull=False)
+        if nssession is not None:
+            queryset = queryset.filter(nssession=nssession)
+        if goals is not None:
+            queryset = queryset.filter(goal__in=goals)
+
+        rows = queryset.order_by('nssession_id', 'goal_id', 'createdat').values_list(
+            'nssession_id', 'goal_id', 'createdat', 'goal_weight'
+        )
+        series = {}
+        for nssession_id, goal_id, createdat, goal_weight in rows.iterator(chunk_size=2000):
+            series.setdefault((nssession_id, goal_id), []).append((createdat, goal_weight))
+        return series
+
+    def downsampled(self, nssession, points, goals=None):
+        """
+        Ряды весов целей сессии, прореженные до points интервалов за время сессии.
+        Веса внутри интервала усредняются в БД (date_bin), объем выборки
+        не зависит от количества записей истории. Записи до начала и после
+        окончания сессии относятся к первому и последнему интервалу.
+        Возвращает словарь {id цели: [(начало интервала, средний вес), ...]}.
+        """
+        tz = timezone.get_current_timezone()
+        start = datetime.combine(nssession.start_date, time.min, tzinfo=tz)
+        stop = datetime.combine(nssession.stop_date + timedelta(days=1), time.min, tzinfo=tz)
+        stride = max((stop - start) / points, timedelta(minutes=1))
+
+        last = stop - timedelta(microseconds=1)
+
+        queryset = self.filter(nssession=nssession, goal__isnull=False)
+        if goals is not None:
+            queryset = queryset.filter(goal__in=goals)
+        rows = queryset.annotate(
+            bucket=DateBin(
+                Value(stride), Greatest(Least(F('createdat'), Value(last)), Value(start)), Value(start)
+            )
+        ).values('goal_id', 'bucket').annotate(
+            weight=Avg('goal_weight')
+        ).order_by('goal_id', 'bucket').values_list('goal_id', 'bucket', 'weight')
+
+        series = {}
+        for goal_id, bucket, weight in rows:
+            series.setdefault(goal_id, []).append((bucket, weight))
+        return series
 
 
 class GoalWeightHistory(models.Model):
@@ -220,7 +431,18 @@ class GoalWeightHistory(models.Model):
         on_delete=models.RESTRICT,
         db_column='nssession_id',
         related_name='weight_history',
-        verbose_name=_('Сессия')
+        verbose_name=_('Сессия'),
+        db_index=False
+    )
+    goal = models.ForeignKey(
+        GoalsBacklog,
+        on_delete=models.RESTRICT,
+        db_column='goal_id',
+        related_name='weight_history',
+        verbose_name=_('Цель'),
+        null=True,
+        blank=True,
+        db_index=False
     )
     goal_weight = models.IntegerField(
         _('Вес цели')
@@ -241,12 +463,205 @@ class GoalWeightHistory(models.Model):
         auto_now=True
     )
 
+    objects = GoalWeightHistoryQuerySet.as_manager()
+
     class Meta:
         db_table = 'goal_weight_history'
         verbose_name = _('История веса цели')
         verbose_name_plural = _('История весов целей')
         ordering = ['id']
+        # Индексы по (сессия, цель, время) и (цель, время) заменяют одиночные
+        # индексы внешних ключей. Порядок ключей совпадает с сортировкой series(),
+        # а вес включен в индекс, поэтому ряды читаются только из индекса.
+        # BRIN по времени создания компактен для таблицы, растущей по времени.
+        indexes = [
+            models.Index(
+                fields=['nssession', 'goal', 'createdat'],
+                include=['goal_weight'],
+                name='gwh_session_goal_createdat_idx'
+            ),
+            models.Index(
+                fields=['goal', 'createdat'],
+                include=['goal_weight'],
+                name='gwh_goal_createdat_idx'
+            ),
+            BrinIndex(
+                fields=['createdat'],
+                name='gwh_createdat_brin'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Вес: {self.goal_weight} (сессия {self.nssession_id})"
+
+
+
+class SessionSummaryManager(models.Manager):
+    """Менеджер сводок сессий"""
+
+    def refresh(self, nssession_ids=None):
+        """
+        Пересчет сводок указанных сессий (None - всех сессий).
+        Каждый показатель считается одним агрегирующим запросом по всем
+        сессиям сразу, сводки записываются одним INSERT ... ON CONFLICT,
+        поэтому пересчет безопасно выполнять параллельно с чтением и
+        другими пересчетами.
+        """
+        sessions = NSSession.objects.using(self.db)
+        if nssession_ids is not None:
+            sessions = sessions.filter(pk__in=list(nssession_ids))
+        summaries = {
+            pk: SessionSummary(nssession_id=pk, participants_by_role={}, results_by_type={})
+            for pk in sessions.values_list('pk', flat=True)
+        }
+        if not summaries:
+            return []
+        ids = list(summaries)
+
+        session_goals = SessionGoal.objects.using(self.db).filter(nssession_id__in=ids)
+        for row in session_goals.values('nssession_id').annotate(
+            total=Count('id'), weight=Sum('current_weight')
+        ).order_by():
+            summary = summaries[row['nssession_id']]
+            summary.goal_count = row['total']
+            summary.weight_total = row['weight'] or 0
+
+        for row in session_goals.values('nssession_id', 'goal__goal_result_type_id').annotate(
+            total=Count('id')
+        ).order_by():
+            result_type = GoalResultType.lookups.get(row['goal__goal_result_type_id'])
+            name = str(result_type) if result_type else str(row['goal__goal_result_type_id'])
+            summaries[row['nssession_id']].results_by_type[name] = row['total']
+
+        participants = SUR.objects.using(self.db).filter(nssession_id__in=ids)
+        for row in participants.values('nssession_id').annotate(
+            total=Count('nsuser', distinct=True)
+        ).order_by():
+            summaries[row['nssession_id']].participant_count = row['total']
+
+        for row in participants.values('nssession_id', 'nsrole_id').annotate(
+            total=Count('nsuser', distinct=True)
+        ).order_by():
+            role = NSRole.lookups.get(row['nsrole_id'])
+            name = str(role) if role else str(row['nsrole_id'])
+            summaries[row['nssession_id']].participants_by_role[name] = row['total']
+
+        history = GoalWeightHistory.objects.using(self.db).filter(nssession_id__in=ids)
+        for row in history.values('nssession_id').annotate(
+            total=Count('id'), last_change=Max('createdat')
+        ).order_by():
+            summary = summaries[row['nssession_id']]
+            summary.history_count = row['total']
+            summary.last_weight_change_at = row['last_change']
+
+        now = timezone.now()
+        for summary in summaries.values():
+            summary.refreshedat = now
+
+        return self.bulk_create(
+            summaries.values(),
+            update_conflicts=True,
+            unique_fields=['nssession'],
+            update_fields=[
+                'goal_count', 'weight_total', 'participant_count', 'participants_by_role',
+                'results_by_type', 'history_count', 'last_weight_change_at', 'refreshedat',
+            ]
+        )
+
+
+class SessionSummary(models.Model):
+    """Сводные показатели сессии (таблица session_summary)"""
+    nssession = models.OneToOneField(
+        NSSession,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        db_column='nssession_id',
+        related_name='summary',
+        verbose_name=_('Сессия')
+    )
+    goal_count = models.IntegerField(
+        _('Количество целей'),
+        default=0
+    )
+    weight_total = models.BigIntegerField(
+        _('Суммарный вес целей'),
+        default=0
+    )
+    participant_count = models.IntegerField(
+        _('Количество участников'),
+        default=0
+    )
+    participants_by_role = models.JSONField(
+        _('Участники по ролям'),
+        default=dict
+    )
+    results_by_type = models.JSONField(
+        _('Цели по типам результата'),
+        default=dict
+    )
+    history_count = models.IntegerField(
+        _('Изменений веса'),
+        default=0
+    )
+    last_weight_change_at = models.DateTimeField(
+        _('Последнее изменение веса'),
+        null=True,
+        blank=True
+    )
+    refreshedat = models.DateTimeField(
+        _('Дата и время пересчета'),
+        default=timezone.now
+    )
+
+    objects = SessionSummaryManager()
+
+    class Meta:
+        db_table = 'session_summary'
+        verbose_name = _('Сводка сессии')
+        verbose_name_plural = _('Сводки сессий')
 
     def __str__(self):
-        return f"Вес: {self.goal_weight} (сессия {self.nssession.id})"
+        return f"Сводка сессии {self.nssession_id}"
+
+
+# Сессии, ожидающие пересчета сводки после фиксации транзакции
+_pending_summaries = Local()
+
+
+def schedule_summary_refresh(nssession_id):
+    """
+    Пересчет сводки сессии после фиксации транзакции.
+    Несколько изменений одной сессии в транзакции дают один пересчет.
+    """
+    if not hasattr(_pending_summaries, 'ids'):
+        _pending_summaries.ids = set()
+    _pending_summaries.ids.add(nssession_id)
+    transaction.on_commit(_refresh_pending_summaries)
+
+
+def _refresh_pending_summaries():
+    ids = getattr(_pending_summaries, 'ids', None)
+    if ids:
+        _pending_summaries.ids = set()
+        SessionSummary.objects.refresh(ids)
+
+
+@receiver(post_save, sender=SessionGoal)
+@receiver(post_delete, sender=SessionGoal)
+@receiver(post_save, sender=SUR)
+@receiver(post_delete, sender=SUR)
+@receiver(post_save, sender=GoalWeightHistory)
+@receiver(post_delete, sender=GoalWeightHistory)
+def refresh_session_summary(sender, instance, raw=False, **kwargs):
+    """Пересчет сводки при изменении целей, участников или истории весов сессии"""
+    if not raw:
+        schedule_summary_refresh(instance.nssession_id)
+
 
+@receiver(post_save, sender=GoalsBacklog)
+def refresh_goal_sessions_summary(sender, instance, created, update_fields=None, **kwargs):
+    """Пересчет сводок сессий с целью при изменении ее типа результата"""
+    if created or (update_fields is not None and 'goal_result_type' not in update_fields):
+        return
+    for nssession_id in SessionGoal.objects.filter(goal=instance).values_list('nssession_id', flat=True).distinct():
+        schedule_summary_refresh(nssession_id)
@@ -1,3 +1,746 @@
+import json
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from goals.models import GoalsBacklog, GoalType, GoalResultType
+from ns.pagination import EstimatedCountPaginator
+from users.models import NSUser, NSRole, UserProfile
+from .bulk import set_session_status
+from .charts import CHART_POINTS
+from .export import export_queryset
+from .models import (
+    SessionType, SessionStatus, NSSession,
+    SessionGoal, SUR, GoalWeightHistory, SessionSummary
+)
+
+
+class SessionSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = NSUser.objects.create_user('owner', 'owner@example.com', 'password')
+        cls.other = NSUser.objects.create_user('member', 'member@example.com', 'password')
+        cls.leader = NSRole.objects.get_or_create(rolename='Ведущий')[0]
+        cls.member = NSRole.objects.get_or_create(rolename='Участник')[0]
+        cls.goal_type = GoalType.objects.get_or_create(type_name='Личная')[0]
+        cls.achieved = GoalResultType.objects.get_or_create(type_name='Достигнута')[0]
+        cls.in_progress = GoalResultType.objects.get_or_create(type_name='В работе')[0]
+        cls.session = NSSession.objects.create(
+            session_type=SessionType.objects.get_or_create(type_name='Квартальная')[0],
+            session_status=SessionStatus.objects.get_or_create(type_name='Открыта')[0],
+            start_date=date(2026, 1, 1),
+            stop_date=date(2026, 3, 31),
+        )
+
+    def create_goal(self, name, result_type, weight):
+        goal = GoalsBacklog.objects.create(
+            nsuser=self.user,
+            goal_type=self.goal_type,
+            goal_result_type=result_type,
+            goal_name=name,
+            priority_weight=weight,
+        )
+        return SessionGoal.objects.create(nssession=self.session, goal=goal, current_weight=weight)
+
+    def test_summary_refreshed_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.create_goal('Первая', self.achieved, 10)
+            self.create_goal('Вторая', self.in_progress, 20)
+            SUR.objects.create(nssession=self.session, nsuser=self.user, nsrole=self.leader)
+            SUR.objects.create(nssession=self.session, nsuser=self.other, nsrole=self.member)
+            GoalWeightHistory.objects.create(
+                nssession=self.session, goal=first.goal, goal_weight=10, change_reason='Начальный вес'
+            )
+
+        summary = SessionSummary.objects.get(nssession=self.session)
+        self.assertEqual(summary.goal_count, 2)
+        self.assertEqual(summary.weight_total, 30)
+        self.assertEqual(summary.participant_count, 2)
+        self.assertEqual(summary.participants_by_role, {'Ведущий': 1, 'Участник': 1})
+        self.assertEqual(summary.results_by_type, {'Достигнута': 1, 'В работе': 1})
+        self.assertEqual(summary.history_count, 1)
+
+    def test_summary_follows_goal_result_type(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            session_goal = self.create_goal('Первая', self.in_progress, 10)
+
+        goal = session_goal.goal
+        goal.goal_result_type = self.achieved
+        with self.captureOnCommitCallbacks(execute=True):
+            goal.save()
+
+        summary = SessionSummary.objects.get(nssession=self.session)
+        self.assertEqual(summary.results_by_type, {'Достигнута': 1})
+
+    def test_refresh_is_idempotent(self):
+        self.create_goal('Первая', self.achieved, 10)
+
+        SessionSummary.objects.refresh([self.session.pk])
+        SessionSummary.objects.refresh()
+
+        self.assertEqual(SessionSummary.objects.count(), 1)
+        self.assertEqual(SessionSummary.objects.get().goal_count, 1)
+
+
+class SessionExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = NSUser.objects.create_user('analyst', 'analyst@example.com', 'password', is_staff=True)
+        UserProfile.objects.filter(user=cls.staff).update(email_verified=True)
+        cls.quarterly = SessionType.objects.get_or_create(type_name='Квартальная')[0]
+        cls.yearly = SessionType.objects.get_or_create(type_name='Годовая')[0]
+        status = SessionStatus.objects.get_or_create(type_name='Открыта')[0]
+        for session_type, month in ((cls.quarterly, 1), (cls.quarterly, 4), (cls.yearly, 1)):
+            NSSession.objects.create(
+                session_type=session_type,
+                session_status=status,
+                start_date=date(2026, month, 1),
+                stop_date=date(2026, month + 2, 28),
+            )
+
+    def test_csv_export_is_streamed_and_filtered(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('session_export'), {
+            'dataset': 'sessions',
+            'session_type': self.quarterly.pk,
+            'date_from': '2026-01-01',
+            'date_to': '2026-02-01',
+        })
+
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['id', 'session_type'])
+        self.assertEqual(len(lines), 2)
+        self.assertIn('2026-01-01', lines[1])
+
+    def test_invalid_parameters_are_returned_as_text(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('session_export'), {
+            'dataset': 'sessions', 'session_type': '<script>alert(1)</script>',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+
+    def test_export_requires_staff(self):
+        user = NSUser.objects.create_user('member', 'member@example.com', 'password')
+        UserProfile.objects.filter(user=user).update(email_verified=True)
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('session_export'), {'dataset': 'sessions'}).status_code, 403)
+
+    def test_ndjson_command(self):
+        out = StringIO()
+        call_command('export_sessions', 'sessions', format='ndjson', session_type='Годовая', stdout=out)
+
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['session_type'] for row in rows], ['Годовая'])
+
+    def test_history_export_reads_in_index_order(self):
+        # На нескольких строках планировщик предпочел бы полный просмотр таблицы
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+        plan = export_queryset('history').explain()
+        self.assertIn('gwh_session_goal_createdat_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+
+class SessionAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = NSUser.objects.create_superuser('admin', 'admin@example.com', 'password')
+        UserProfile.objects.filter(user=cls.admin).update(email_verified=True)
+        cls.goal_type = GoalType.objects.get_or_create(type_name='Личная')[0]
+        cls.result_type = GoalResultType.objects.get_or_create(type_name='В работе')[0]
+        cls.session = NSSession.objects.create(
+            session_type=SessionType.objects.get_or_create(type_name='Квартальная')[0],
+            session_status=SessionStatus.objects.get_or_create(type_name='Открыта')[0],
+            start_date=date(2026, 1, 1),
+            stop_date=date(2026, 3, 31),
+        )
+        goal = cls.create_goal('В сессии', 1)
+        SessionGoal.objects.create(nssession=cls.session, goal=goal, current_weight=10)
+        SUR.objects.create(
+            nssession=cls.session, nsuser=cls.admin,
+            nsrole=NSRole.objects.get_or_create(rolename='Ведущий')[0],
+        )
+
+    @classmethod
+    def create_goal(cls, name, weight):
+        return GoalsBacklog.objects.create(
+            nsuser=cls.admin, goal_type=cls.goal_type, goal_result_type=cls.result_type,
+            goal_name=name, priority_weight=weight,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_change_page_does_not_depend_on_backlog_size(self):
+        url = reverse('admin:goal_sessions_nssession_change', args=[self.session.pk])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(url)
+
+        other = [self.create_goal(f'Цель {i}', i) for i in range(2, 22)]
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(after), len(before))
+        # Цели выбираются через автодополнение, а не списком всех целей
+        self.assertNotContains(response, other[0].goal_name)
+
+        # Количество запросов не зависит и от числа целей, участников и записей истории сессии
+        role = NSRole.objects.get_or_create(rolename='Участник')[0]
+        for index, goal in enumerate(other):
+            SessionGoal.objects.create(nssession=self.session, goal=goal, current_weight=index)
+            user = NSUser.objects.create_user(f'member{index}', f'member{index}@example.com', 'password')
+            SUR.objects.create(nssession=self.session, nsuser=user, nsrole=role)
+        GoalWeightHistory.objects.bulk_create([
+            GoalWeightHistory(nssession=self.session, goal=goal, goal_weight=1, change_reason=f'Запись {goal.pk}')
+            for goal in other
+        ])
+        with CaptureQueriesContext(connection) as filled:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(filled), len(before))
+        self.assertContains(response, other[0].goal_name)
+        self.assertNotContains(response, f'Запись {other[0].pk}')
+        self.assertContains(response, f'?nssession__id__exact={self.session.pk}')
+
+    def test_goal_is_added_through_add_inline(self):
+        SessionGoal.objects.filter(nssession=self.session).update(goal_plan='План', goal_steps='Шаги')
+        url = reverse('admin:goal_sessions_nssession_change', args=[self.session.pk])
+        response = self.client.get(url)
+        data = {
+            'session_type': self.session.session_type_id,
+            'session_status': self.session.session_status_id,
+            'start_date': '2026-01-01',
+            'stop_date': '2026-03-31',
+        }
+        for inline in response.context['inline_admin_formsets']:
+            formset = inline.formset
+            data.update({
+                f'{formset.prefix}-TOTAL_FORMS': formset.total_form_count(),
+                f'{formset.prefix}-INITIAL_FORMS': formset.initial_form_count(),
+            })
+            for form in formset.initial_forms:
+                for name, field in form.fields.items():
+                    value = form[name].value()
+                    if value is not None and value is not False:
+                        data[form.add_prefix(name)] = getattr(value, 'pk', value)
+        goal = self.create_goal('Новая цель сессии', 2)
+        data.update({
+            'session_goals-2-0-goal': goal.pk,
+            'session_goals-2-0-current_weight': 5,
+            'session_goals-2-0-goal_plan': 'План',
+            'session_goals-2-0-goal_steps': 'Шаги',
+        })
+
+        response = self.client.post(url, data)
+
+        self.assertEqual(response.status_code, 302, getattr(response, 'context', None) and [
+            inline.formset.errors for inline in response.context['inline_admin_formsets']
+        ])
+        self.assertTrue(SessionGoal.objects.filter(nssession=self.session, goal=goal, current_weight=5).exists())
+        self.assertEqual(SessionGoal.objects.filter(nssession=self.session).count(), 2)
+
+    def test_session_history_link(self):
+        GoalWeightHistory.objects.create(nssession=self.session, goal_weight=1, change_reason='Запись')
+        response = self.client.get(
+            reverse('admin:goal_sessions_goalweighthistory_changelist'),
+            {'nssession__id__exact': self.session.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Запись')
+
+    def test_changelist_uses_estimated_count(self):
+        with patch.object(EstimatedCountPaginator, 'exact_count_limit', 0):
+            response = self.client.get(reverse('admin:goals_goalsbacklog_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.context['cl'].paginator, EstimatedCountPaginator)
+        self.assertIsNone(response.context['cl'].full_result_count)
+
+
+class BulkActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = NSUser.objects.create_superuser('admin', 'admin@example.com', 'password')
+        UserProfile.objects.filter(user=cls.admin).update(email_verified=True)
+        goal_type = GoalType.objects.get_or_create(type_name='Личная')[0]
+        cls.in_progress = GoalResultType.objects.get_or_create(type_name='В работе')[0]
+        cls.achieved = GoalResultType.objects.get_or_create(type_name='Достигнута')[0]
+        cls.open = SessionStatus.objects.get_or_create(type_name='Открыта')[0]
+        cls.closed = SessionStatus.objects.get_or_create(type_name='Закрыта')[0]
+        session_type = SessionType.objects.get_or_create(type_name='Квартальная')[0]
+        cls.sessions = [
+            NSSession.objects.create(
+                session_type=session_type, session_status=cls.open,
+                start_date=date(2026, 1, 1), stop_date=date(2026, 3, 31),
+            )
+            for _ in range(2)
+        ]
+        for weight, session in enumerate(cls.sessions, start=1):
+            goal = GoalsBacklog.objects.create(
+                nsuser=cls.admin, goal_type=goal_type, goal_result_type=cls.in_progress,
+                goal_name=f'Цель {weight}', priority_weight=weight,
+            )
+            SessionGoal.objects.create(nssession=session, goal=goal, current_weight=weight * 10)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_session_status_dry_run_and_apply(self):
+        sessions = NSSession.objects.filter(pk=self.sessions[0].pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(set_session_status(sessions, self.closed.pk, dry_run=True), 1)
+        self.assertEqual(NSSession.objects.filter(session_status=self.closed).count(), 0)
+
+        self.assertEqual(set_session_status(sessions, self.closed.pk), 1)
+        self.assertEqual(set_session_status(sessions, self.closed.pk, dry_run=True), 0)
+        self.assertEqual(NSSession.objects.get(pk=self.sessions[0].pk).session_status, self.closed)
+
+    def test_admin_action_preview_and_apply(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:goal_sessions_nssession_changelist')
+        data = {
+            'action': 'set_goal_results',
+            ACTION_CHECKBOX_NAME: [session.pk for session in self.sessions],
+            'goal_result_type': self.achieved.pk,
+        }
+
+        response = self.client.post(url, {**data, 'preview': '1'})
+        self.assertEqual(response.context['affected'], 2)
+        self.assertFalse(GoalsBacklog.objects.filter(goal_result_type=self.achieved).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {**data, 'apply': '1'})
+        self.assertRedirects(response, url)
+        self.assertEqual(GoalsBacklog.objects.filter(goal_result_type=self.achieved).count(), 2)
+        self.assertEqual(
+            SessionSummary.objects.get(nssession=self.sessions[0]).results_by_type, {'Достигнута': 1}
+        )
+
+    def test_history_command(self):
+        out = StringIO()
+        call_command('bulk_update_sessions', 'history', 'Итог квартала', status='Открыта', dry_run=True, stdout=out)
+        self.assertIn('Будет изменено строк: 2', out.getvalue())
+        self.assertFalse(GoalWeightHistory.objects.exists())
+
+        call_command('bulk_update_sessions', 'history', 'Итог квартала', status='Открыта', stdout=StringIO())
+        self.assertEqual(
+            sorted(GoalWeightHistory.objects.values_list('goal_weight', 'change_reason')),
+            [(10, 'Итог квартала'), (20, 'Итог квартала')]
+        )
+
+
+class IndexUsageTests(TestCase):
+    """Основные выборки по участникам и целям сессий выполняются по индексам"""
+
+    @classmethod
+    def setUpTestData(cls):
+        session_type = SessionType.objects.get_or_create(type_name='Квартальная')[0]
+        session_status = SessionStatus.objects.get_or_create(type_name='Открыта')[0]
+        goal_type = GoalType.objects.get_or_create(type_name='Личная')[0]
+        result_type = GoalResultType.objects.get_or_create(type_name='В работе')[0]
+        role = NSRole.objects.get_or_create(rolename='Участник')[0]
+
+        users = NSUser.objects.bulk_create([
+            NSUser(userlogin=f'user{i}', useremail=f'user{i}@example.com')
+            for i in range(50)
+        ])
+        sessions = NSSession.objects.bulk_create([
+            NSSession(
+                session_type=session_type, session_status=session_status,
+                start_date=date(2026, 1, 1), stop_date=date(2026, 3, 31),
+            )
+            for _ in range(200)
+        ])
+        goals = GoalsBacklog.objects.bulk_create([
+            GoalsBacklog(
+                nsuser=user, goal_type=goal_type, goal_result_type=result_type,
+                goal_name=f'Цель {user.pk}-{i}', priority_weight=i,
+            )
+            for user in users[:5] for i in range(1, 11)
+        ])
+        # Каждый пользователь участвует в 20 сессиях из 200
+        SUR.objects.bulk_create([
+            SUR(nssession=session, nsuser=users[(index * 5 + offset) % len(users)], nsrole=role)
+            for index, session in enumerate(sessions) for offset in range(5)
+        ])
+        SessionGoal.objects.bulk_create([
+            SessionGoal(nssession=session, goal=goal, current_weight=goal.priority_weight, goal_plan='', goal_steps='')
+            for session in sessions for goal in goals[:10]
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE sur, session_goals')
+        cls.user, cls.session = users[0], sessions[0]
+
+    def plan_nodes(self, queryset):
+        """Узлы плана запроса: (тип узла, индекс)"""
+        def walk(node):
+            yield node['Node Type'], node.get('Index Name')
+            for child in node.get('Plans', ()):
+                yield from walk(child)
+        return list(walk(json.loads(queryset.explain(format='json'))[0]['Plan']))
+
+    def assertIndexScan(self, queryset, index_name=None):
+        nodes = self.plan_nodes(queryset)
+        scans = [(node, index) for node, index in nodes if node.endswith('Scan')]
+        self.assertTrue(scans, nodes)
+        self.assertFalse([node for node, index in scans if node == 'Seq Scan'], nodes)
+        if index_name:
+            self.assertIn(index_name, [index for node, index in scans], nodes)
+
+    def test_user_sessions(self):
+        self.assertIndexScan(
+            SUR.objects.filter(nsuser=self.user).order_by().values('nssession_id'),
+            'unique_user_session_role'
+        )
+
+    def test_session_participants(self):
+        self.assertIndexScan(
+            SUR.objects.filter(nssession=self.session).order_by().values('nsuser_id', 'nsrole_id'),
+            'sur_session_user_idx'
+        )
+        self.assertIndexScan(SUR.objects.filter(nssession=self.session, nsuser=self.user))
+
+    def test_session_goals_by_weight(self):
+        queryset = SessionGoal.objects.filter(nssession=self.session).order_by('-current_weight')
+        self.assertIndexScan(queryset.values('goal_id', 'current_weight'), 'session_goals_weight_idx')
+        self.assertNotIn('Sort', [node for node, index in self.plan_nodes(queryset.values('goal_id'))])
+
+
+class MySessionListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = NSUser.objects.create_user('member', 'member@example.com', 'password')
+        UserProfile.objects.filter(user=cls.user).update(email_verified=True)
+        other = NSUser.objects.create_user('other', 'other@example.com', 'password')
+        leader = NSRole.objects.get_or_create(rolename='Ведущий')[0]
+        member = NSRole.objects.get_or_create(rolename='Участник')[0]
+        goal_type = GoalType.objects.get_or_create(type_name='Личная')[0]
+        result_type = GoalResultType.objects.get_or_create(type_name='В работе')[0]
+        session_type = SessionType.objects.get_or_create(type_name='Квартальная')[0]
+        session_status = SessionStatus.objects.get_or_create(type_name='Открыта')[0]
+        cls.led, cls.joined, cls.foreign = NSSession.objects.bulk_create([
+            NSSession(
+                session_type=session_type, session_status=session_status,
+                start_date=date(2026, 1, 1), stop_date=date(2026, 3, 31),
+            )
+            for _ in range(3)
+        ])
+        SUR.objects.bulk_create([
+            SUR(nssession=cls.led, nsuser=cls.user, nsrole=leader),
+            SUR(nssession=cls.led, nsuser=cls.user, nsrole=member),
+            SUR(nssession=cls.joined, nsuser=cls.user, nsrole=member),
+            SUR(nssession=cls.foreign, nsuser=other, nsrole=leader),
+        ])
+        for weight in (10, 20):
+            goal = GoalsBacklog.objects.create(
+                nsuser=cls.user, goal_type=goal_type, goal_result_type=result_type,
+                goal_name=f'Цель {weight}', priority_weight=weight,
+            )
+            SessionGoal.objects.create(nssession=cls.led, goal=goal, current_weight=weight)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sessions_are_scoped_and_annotated(self):
+        with self.assertNumQueries(1):
+            sessions = {session.pk: session for session in NSSession.objects.for_participant(self.user)}
+
+        self.assertEqual(set(sessions), {self.led.pk, self.joined.pk})
+        led, joined = sessions[self.led.pk], sessions[self.joined.pk]
+        self.assertEqual(led.user_roles, ['Ведущий', 'Участник'])
+        self.assertEqual((led.goal_count, led.weight_total), (2, 30))
+        self.assertEqual((joined.goal_count, joined.weight_total), (0, 0))
+
+    def test_page_is_rendered_with_one_session_query(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('my_session_list'))
+
+        self.assertEqual([session.pk for session in response.context['sessions']], [self.joined.pk, self.led.pk])
+        self.assertContains(response, 'Ведущий, Участник')
+        self.assertEqual(len([query for query in queries if 'nssessions' in query['sql']]), 1)
+
+
+class SessionDetailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = NSUser.objects.create_user('member', 'member@example.com', 'password')
+        UserProfile.objects.filter(user=cls.user).update(email_verified=True)
+        cls.other = NSUser.objects.create_user('other', 'other@example.com', 'password')
+        cls.role = NSRole.objects.get_or_create(rolename='Участник')[0]
+        cls.goal_type = GoalType.objects.get_or_create(type_name='Личная')[0]
+        cls.result_type = GoalResultType.objects.get_or_create(type_name='В работе')[0]
+        cls.session = NSSession.objects.create(
+            session_type=SessionType.objects.get_or_create(type_name='Квартальная')[0],
+            session_status=SessionStatus.objects.get_or_create(type_name='Открыта')[0],
+            start_date=date(2026, 1, 1),
+            stop_date=date(2026, 3, 31),
+        )
+        SUR.objects.create(nssession=cls.session, nsuser=cls.user, nsrole=cls.role)
+        cls.own = cls.add_goal(cls.user, 'Своя цель', 10)
+        cls.add_goal(cls.other, 'Чужая скрытая цель', 20)
+
+        # Вес своей цели меняется каждый час в течение всей сессии
+        start = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        GoalWeightHistory.objects.bulk_create([
+            GoalWeightHistory(
+                nssession=cls.session, goal=cls.own.goal, goal_weight=hour % 100,
+                change_reason='Пересчет', createdat=start + timedelta(hours=hour),
+            )
+            for hour in range(0, 24 * 90)
+        ])
+
+    @classmethod
+    def add_goal(cls, nsuser, name, weight, visible=False):
+        goal = GoalsBacklog.objects.create(
+            nsuser=nsuser, goal_type=cls.goal_type, goal_result_type=cls.result_type,
+            goal_name=name, priority_weight=weight, visibleforothers=visible,
+        )
+        return SessionGoal.objects.create(
+            nssession=cls.session, goal=goal, current_weight=weight, goal_plan='План', goal_steps=''
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def get_detail(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('session_detail', args=[self.session.pk]))
+        return response, len(queries)
+
+    def test_detail_renders_in_fixed_number_of_queries(self):
+        # Первый запрос заполняет кэши справочников и статуса email
+        self.get_detail()
+        response, count = self.get_detail()
+        self.assertContains(response, 'Своя цель')
+        self.assertNotContains(response, 'Чужая скрытая цель')
+        self.assertContains(response, 'member')
+
+        for index in range(5):
+            self.add_goal(self.other, f'Открытая цель {index}', 30 + index, visible=True)
+            SUR.objects.create(
+                nssession=self.session, nsuser=NSUser.objects.create_user(f'user{index}', f'user{index}@example.com'),
+                nsrole=self.role,
+            )
+        response, more_goals_count = self.get_detail()
+        self.assertContains(response, 'Открытая цель 4')
+        self.assertEqual(more_goals_count, count)
+
+    def test_participants_are_shown_only_to_participants(self):
+        response, count = self.get_detail()
+        self.assertTrue(response.context['is_participant'])
+        self.assertEqual([sur.nsuser_id for sur in response.context['participants']], [self.user.pk])
+
+        UserProfile.objects.filter(user=self.other).update(email_verified=True)
+        self.client.force_login(self.other)
+        response, count = self.get_detail()
+        self.assertFalse(response.context['is_participant'])
+        self.assertEqual(response.context['participants'], [])
+        self.assertContains(response, 'Список участников доступен только участникам сессии.')
+
+    def test_weight_chart_is_downsampled(self):
+        series = GoalWeightHistory.objects.downsampled(self.session, CHART_POINTS)
+        self.assertEqual(list(series), [self.own.goal_id])
+        self.assertLessEqual(len(series[self.own.goal_id]), CHART_POINTS)
+
+        response, count = self.get_detail()
+        [line] = response.context['weight_chart']['lines']
+        self.assertEqual(line['name'], 'Своя цель')
+        self.assertEqual(len(line['points'].split()), len(series[self.own.goal_id]))
+
+
+class WeightHistorySeriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = NSUser.objects.create_user('owner', 'owner@example.com', 'password')
+        goal_type = GoalType.objects.get_or_create(type_name='Личная')[0]
+        result_type = GoalResultType.objects.get_or_create(type_name='В работе')[0]
+        session_type = SessionType.objects.get_or_create(type_name='Квартальная')[0]
+        session_status = SessionStatus.objects.get_or_create(type_name='Открыта')[0]
+        cls.session, cls.other_session = NSSession.objects.bulk_create([
+            NSSession(
+                session_type=session_type, session_status=session_status,
+                start_date=date(2026, 1, 1), stop_date=date(2026, 3, 31),
+            )
+            for _ in range(2)
+        ])
+        cls.first, cls.second = GoalsBacklog.objects.bulk_create([
+            GoalsBacklog(
+                nsuser=user, goal_type=goal_type, goal_result_type=result_type,
+                goal_name=name, priority_weight=weight,
+            )
+            for weight, name in enumerate(('Первая', 'Вторая'), start=1)
+        ])
+        cls.start = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        # Записи создаются в обратном порядке, чтобы порядок рядов задавала сортировка
+        GoalWeightHistory.objects.bulk_create([
+            GoalWeightHistory(
+                nssession=session, goal=goal, goal_weight=day * 10,
+                change_reason='', createdat=cls.start + timedelta(days=day)
+            )
+            for day in reversed(range(3))
+            for session in (cls.session, cls.other_session)
+            for goal in (cls.first, cls.second)
+        ])
+        GoalWeightHistory.objects.create(
+            nssession=cls.session, goal=None, goal_weight=1, change_reason='', createdat=cls.start
+        )
+
+    def test_in_range_is_half_open(self):
+        history = GoalWeightHistory.objects.filter(nssession=self.session, goal=self.first)
+        in_range = history.in_range(self.start + timedelta(days=1), self.start + timedelta(days=2))
+        self.assertEqual(list(in_range.values_list('goal_weight', flat=True)), [10])
+        self.assertEqual(history.in_range(start=self.start + timedelta(days=1)).count(), 2)
+        self.assertEqual(history.in_range(end=self.start + timedelta(days=1)).count(), 1)
+        self.assertEqual(history.in_range().count(), 3)
+
+    def test_series(self):
+        series = GoalWeightHistory.objects.series(
+            nssession=self.session, start=self.start + timedelta(days=1)
+        )
+        points = [(self.start + timedelta(days=day), day * 10) for day in (1, 2)]
+        self.assertEqual(series, {
+            (self.session.pk, self.first.pk): points,
+            (self.session.pk, self.second.pk): points,
+        })
+
+        series = GoalWeightHistory.objects.series(goals=[self.second.pk])
+        self.assertEqual(set(series), {(self.session.pk, self.second.pk), (self.other_session.pk, self.second.pk)})
+        self.assertEqual(len(series[(self.other_session.pk, self.second.pk)]), 3)
+
+    def test_series_query_follows_index_order(self):
+        queryset = GoalWeightHistory.objects.filter(nssession=self.session, goal__isnull=False).order_by(
+            'nssession_id', 'goal_id', 'createdat'
+        ).values_list('nssession_id', 'goal_id', 'createdat', 'goal_weight')
+        # На нескольких строках планировщик предпочел бы полный просмотр таблицы
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_bitmapscan = off')
+        plan = queryset.explain()
+        self.assertIn('gwh_session_goal_createdat_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+
+class SnapshotBacklogsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        goal_type = GoalType.objects.get_or_create(type_name='Личная')[0]
+        result_type = GoalResultType.objects.get_or_create(type_name='В работе')[0]
+        role = NSRole.objects.get_or_create(rolename='Участник')[0]
+        cls.session = NSSession.objects.create(
+            session_type=SessionType.objects.get_or_create(type_name='Квартальная')[0],
+            session_status=SessionStatus.objects.get_or_create(type_name='Открыта')[0],
+            start_date=date(2026, 1, 1),
+            stop_date=date(2026, 3, 31),
+        )
+        cls.members = [
+            NSUser.objects.create_user(f'member{i}', f'member{i}@example.com', 'password') for i in range(2)
+        ]
+        outsider = NSUser.objects.create_user('outsider', 'outsider@example.com', 'password')
+        SUR.objects.bulk_create([SUR(nssession=cls.session, nsuser=user, nsrole=role) for user in cls.members])
+        # Веса идут не по порядку создания, чтобы порядок задавал priority_weight
+        GoalsBacklog.objects.bulk_create([
+            GoalsBacklog(
+                nsuser=user, goal_type=goal_type, goal_result_type=result_type,
+                goal_name=f'{user.userlogin} {weight}', priority_weight=weight,
+            )
+            for user in (*cls.members, outsider) for weight in (300, 100, 400, 200)
+        ])
+
+    def snapshot(self):
+        return dict(
+            SessionGoal.objects.filter(nssession=self.session).values_list('goal__goal_name', 'current_weight')
+        )
+
+    def test_top_goals_of_each_participant(self):
+        created = SessionGoal.objects.snapshot_backlogs(self.session, 2)
+
+        self.assertEqual(len(created), 4)
+        self.assertEqual(self.snapshot(), {
+            'member0 100': 100, 'member0 200': 200,
+            'member1 100': 100, 'member1 200': 200,
+        })
+        history = GoalWeightHistory.objects.filter(nssession=self.session)
+        self.assertEqual(
+            sorted(history.values_list('goal__goal_name', 'goal_weight')),
+            sorted(self.snapshot().items())
+        )
+        self.assertEqual(history.get(goal__goal_name='member0 100').change_reason, 'Начальный вес цели «member0 100»')
+
+    def test_rerun_is_idempotent(self):
+        SessionGoal.objects.snapshot_backlogs(self.session, 2)
+
+        self.assertEqual(SessionGoal.objects.snapshot_backlogs(self.session, 2), [])
+        self.assertEqual(SessionGoal.objects.filter(nssession=self.session).count(), 4)
+        self.assertEqual(GoalWeightHistory.objects.filter(nssession=self.session).count(), 4)
+
+        # Увеличение top_n добавляет только недостающие цели
+        created = SessionGoal.objects.snapshot_backlogs(self.session, 3)
+        self.assertEqual(sorted(goal.goal.goal_name for goal in created), ['member0 300', 'member1 300'])
+        self.assertEqual(GoalWeightHistory.objects.filter(nssession=self.session).count(), 6)
+
+    def test_command(self):
+        stdout = StringIO()
+        call_command('snapshot_session_goals', self.session.pk, '--top=1', stdout=stdout)
+        self.assertIn(f'В сессию {self.session.pk} добавлено целей: 2', stdout.getvalue())
+        self.assertEqual(self.snapshot(), {'member0 100': 100, 'member1 100': 100})
+
+        stdout = StringIO()
+        call_command('snapshot_session_goals', self.session.pk, '--top=1', stdout=stdout)
+        self.assertIn('добавлено целей: 0', stdout.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('snapshot_session_goals', 0, stdout=StringIO())
+
+
+class SessionAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = NSUser.objects.create_user('member', 'member@example.com', 'password')
+        cls.outsider = NSUser.objects.create_user('outsider', 'outsider@example.com', 'password')
+        UserProfile.objects.update(email_verified=True)
+        role = NSRole.objects.get_or_create(rolename='Участник')[0]
+        session_type = SessionType.objects.get_or_create(type_name='Квартальная')[0]
+        session_status = SessionStatus.objects.get_or_create(type_name='Открыта')[0]
+        cls.own, cls.foreign = NSSession.objects.bulk_create([
+            NSSession(
+                session_type=session_type, session_status=session_status,
+                start_date=date(2026, 1, 1), stop_date=date(2026, 3, 31),
+            )
+            for _ in range(2)
+        ])
+        cls.own_sur, cls.foreign_sur = SUR.objects.bulk_create([
+            SUR(nssession=cls.own, nsuser=cls.member, nsrole=role),
+            SUR(nssession=cls.foreign, nsuser=cls.outsider, nsrole=role),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.member)
+
+    def ids(self, url_name):
+        return [row['id'] for row in self.client.get(reverse(url_name)).json()['results']]
+
+    def test_sessions_are_limited_to_participation(self):
+        self.assertEqual(self.ids('api_session_list'), [self.own.pk])
+        self.assertEqual(self.client.get(reverse('api_session_detail', args=[self.own.pk])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('api_session_detail', args=[self.foreign.pk])).status_code, 404)
 
-# Create your tests here.
+    def test_participants_are_limited_to_own_sessions(self):
+        self.assertEqual(self.ids('api_sur_list'), [self.own_sur.pk])
+        self.assertEqual(self.client.get(reverse('api_sur_detail', args=[self.foreign_sur.pk])).status_code, 404)
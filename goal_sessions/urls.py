@@ -1,8 +1,25 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
+
+# Под ASGI списки и карточки обслуживаются асинхронными представлениями
+if settings.ASYNC_VIEWS:
+    SessionListView, SessionDetailView = views.SessionListAsyncView, views.SessionDetailAsyncView
+    MySessionListView = views.MySessionListAsyncView
+else:
+    SessionListView, SessionDetailView = views.SessionListView, views.SessionDetailView
+    MySessionListView = views.MySessionListView
 
 urlpatterns = [
-    path('', views.SessionListView.as_view(), name='session_list'),
+    path('', SessionListView.as_view(), name='session_list'),
+    path('my/', MySessionListView.as_view(), name='my_session_list'),
     path('create/', views.SessionCreateView.as_view(), name='session_create'),
-    path('<int:pk>/', views.SessionDetailView.as_view(), name='session_detail'),
+    path('<int:pk>/', SessionDetailView.as_view(), name='session_detail'),
+    path('export/', views.SessionExportView.as_view(), name='session_export'),
+    path('api/', api.SessionListAPIView.as_view(), name='api_session_list'),
+    path('api/<int:pk>/', api.SessionDetailAPIView.as_view(), name='api_session_detail'),
+    path('api/goals/', api.SessionGoalListAPIView.as_view(), name='api_session_goal_list'),
+    path('api/goals/<int:pk>/', api.SessionGoalDetailAPIView.as_view(), name='api_session_goal_detail'),
+    path('api/participants/', api.SURListAPIView.as_view(), name='api_sur_list'),
+    path('api/participants/<int:pk>/', api.SURDetailAPIView.as_view(), name='api_sur_detail'),
 ]
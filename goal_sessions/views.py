@@ -1,21 +1,164 @@
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.db.models import Exists, OuterRef, Prefetch, Q
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, render
+from django.views import View
 from django.views.generic import ListView, DetailView, CreateView
 from django.urls import reverse_lazy
-from django.contrib.auth.mixins import LoginRequiredMixin
-from .models import NSSession, SessionType, SessionStatus
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from ns.mixins import AsyncLoginRequiredMixin, PageCacheMixin, ReplicaReadMixin
+from ns.pagination import KeysetPaginator, apaginate
+from goals.models import GoalResultType
+from .charts import CHART_POINTS, weight_chart
+from .export import FORMATS, export_lines
+from .forms import SessionExportForm
+from .models import NSSession, SessionType, SessionStatus, SessionGoal, SUR, GoalWeightHistory
 
-class SessionListView(LoginRequiredMixin, ListView):
+
+def session_detail_queryset(nsuser):
+    """
+    Сессия для карточки с целями и участниками.
+    Сессия со справочниками и сводкой, цели сессии с целями бэклога
+    и участники с пользователями и ролями загружаются тремя запросами
+    независимо от их количества. Показываются свои цели пользователя
+    и цели, видимые для других; участники - только участникам сессии
+    (is_participant).
+    """
+    session_goals = SessionGoal.objects.filter(
+        Q(goal__nsuser=nsuser) | Q(goal__visibleforothers=True)
+    ).select_related('goal').only(
+        'id', 'nssession_id', 'current_weight', 'goal_plan', 'goal_steps',
+        'goal__id', 'goal__goal_name', 'goal__nsuser_id', 'goal__goal_result_type_id',
+    ).order_by('-current_weight')
+    participants = SUR.objects.filter(
+        Exists(SUR.objects.filter(nssession=OuterRef('nssession'), nsuser=nsuser))
+    ).select_related('nsuser', 'nsrole').only(
+        'id', 'nssession_id', 'nsuser__userlogin', 'nsuser__username', 'nsrole__rolename',
+    ).order_by('nsrole__rolename', 'nsuser__userlogin')
+    return NSSession.objects.select_related('session_type', 'session_status', 'summary').annotate(
+        is_participant=Exists(SUR.objects.filter(nssession=OuterRef('pk'), nsuser=nsuser))
+    ).prefetch_related(
+        Prefetch('session_goals', queryset=session_goals, to_attr='visible_goals'),
+        Prefetch('participants', queryset=participants, to_attr='participant_list'),
+    )
+
+
+def session_detail_context(session):
+    """Данные карточки сессии из session_detail_queryset и график весов (еще один запрос)"""
+    goals = [session_goal.goal for session_goal in session.visible_goals]
+    GoalResultType.lookups.attach(goals, 'goal_result_type')
+    series = {}
+    if goals:
+        series = GoalWeightHistory.objects.downsampled(session, CHART_POINTS, goals=[goal.pk for goal in goals])
+    return {
+        'summary': getattr(session, 'summary', None),
+        'session_goals': session.visible_goals,
+        'participants': session.participant_list,
+        'is_participant': session.is_participant,
+        'weight_chart': weight_chart(series, {goal.pk: goal.goal_name for goal in goals}),
+    }
+
+class SessionListView(LoginRequiredMixin, ReplicaReadMixin, PageCacheMixin, ListView):
     model = NSSession
     template_name = 'goal_sessions/session_list.html'
     context_object_name = 'sessions'
+    paginate_by = 50
     
     def get_queryset(self):
-        return NSSession.objects.all()
+        # Типы и статусы загружаются тем же запросом, только нужные для списка колонки
+        return NSSession.objects.select_related('session_type', 'session_status').only(
+            'id', 'start_date', 'stop_date', 'modifiedat',
+            'session_type__type_name', 'session_status__type_name',
+        )
+
+class MySessionListView(LoginRequiredMixin, ReplicaReadMixin, ListView):
+    """
+    Сессии, в которых участвует пользователь, с его ролями, количеством
+    и суммарным весом целей. Страница выбирается одним запросом: страницы
+    по курсору, без отдельного COUNT.
+    """
+    template_name = 'goal_sessions/my_session_list.html'
+    context_object_name = 'sessions'
+    paginate_by = 50
+    page_key = '-id'
+
+    def get_queryset(self):
+        return NSSession.objects.for_participant(self.request.user).select_related(
+            'session_type', 'session_status'
+        ).only(
+            'id', 'start_date', 'stop_date',
+            'session_type__type_name', 'session_status__type_name',
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, self.page_key, page_size)
+        try:
+            page = paginator.page(self.request.GET.get('after'))
+        except InvalidPage as e:
+            raise Http404(str(e))
+        return paginator, page, page.object_list, page.has_next() or page.has_previous()
 
-class SessionDetailView(LoginRequiredMixin, DetailView):
+class SessionDetailView(LoginRequiredMixin, ReplicaReadMixin, DetailView):
     model = NSSession
     template_name = 'goal_sessions/session_detail.html'
     context_object_name = 'session'
 
+    def get_queryset(self):
+        return session_detail_queryset(self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(session_detail_context(self.object))
+        return context
+
+class SessionListAsyncView(AsyncLoginRequiredMixin, ReplicaReadMixin, View):
+    """Асинхронный вариант SessionListView для развертывания под ASGI"""
+    template_name = SessionListView.template_name
+    paginate_by = SessionListView.paginate_by
+
+    async def get(self, request):
+        queryset = SessionListView().get_queryset()
+        try:
+            paginator, page = await apaginate(queryset, self.paginate_by, request.GET.get('page') or 1)
+        except InvalidPage as e:
+            raise Http404(str(e))
+
+        return render(request, self.template_name, {
+            'sessions': page.object_list,
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': page.has_other_pages(),
+        })
+
+class MySessionListAsyncView(AsyncLoginRequiredMixin, ReplicaReadMixin, View):
+    """Асинхронный вариант MySessionListView для развертывания под ASGI"""
+    template_name = MySessionListView.template_name
+    paginate_by = MySessionListView.paginate_by
+
+    async def get(self, request):
+        view = MySessionListView(request=request)
+        paginator = KeysetPaginator(view.get_queryset(), view.page_key, self.paginate_by)
+        try:
+            page = await paginator.apage(request.GET.get('after'))
+        except InvalidPage as e:
+            raise Http404(str(e))
+
+        return render(request, self.template_name, {
+            'sessions': page.object_list,
+            'page_obj': page,
+            'is_paginated': page.has_next() or page.has_previous(),
+        })
+
+class SessionDetailAsyncView(AsyncLoginRequiredMixin, ReplicaReadMixin, View):
+    """Асинхронный вариант SessionDetailView для развертывания под ASGI"""
+    template_name = SessionDetailView.template_name
+
+    async def get(self, request, pk):
+        session = await aget_object_or_404(session_detail_queryset(request.user), pk=pk)
+        context = await sync_to_async(session_detail_context)(session)
+        return render(request, self.template_name, {'session': session, **context})
+
 class SessionCreateView(LoginRequiredMixin, CreateView):
     model = NSSession
     template_name = 'goal_sessions/session_form.html'
@@ -24,6 +167,30 @@ class SessionCreateView(LoginRequiredMixin, CreateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['session_types'] = SessionType.objects.all()
-        context['session_statuses'] = SessionStatus.objects.all()
+        context['session_types'] = SessionType.lookups.all()
+        context['session_statuses'] = SessionStatus.lookups.all()
         return context
+
+class SessionExportView(LoginRequiredMixin, UserPassesTestMixin, ReplicaReadMixin, View):
+    """
+    Потоковая выгрузка сессий, целей сессий или истории весов в CSV/NDJSON.
+    Параметры GET - поля SessionExportForm.
+    """
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        form = SessionExportForm(request.GET)
+        if not form.is_valid():
+            # Ошибки содержат переданные значения и отдаются как текст, не как HTML
+            return HttpResponseBadRequest(form.errors.as_text(), content_type='text/plain; charset=utf-8')
+
+        dataset = form.cleaned_data['dataset']
+        export_format = form.cleaned_data['format']
+        response = StreamingHttpResponse(
+            export_lines(dataset, export_format, **form.filters()),
+            content_type=FORMATS[export_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.{export_format}"'
+        return response
@@ -1,4 +1,11 @@
 from django.contrib import admin
+from goal_sessions.bulk import set_goal_results
+from goal_sessions.forms import GoalResultForm
+from ns.admin_actions import bulk_action
+from ns.admin_filters import LookupListFilter
+from ns.mixins import ReplicaChangeListMixin
+from ns.pagination import EstimatedCountPaginator
+from ns.search import FullTextSearchMixin
 from .models import GoalType, GoalResultType, GoalsBacklog
 
 
@@ -27,12 +34,24 @@ class GoalsBacklogInline(admin.TabularInline):
 
 
 @admin.register(GoalsBacklog)
-class GoalsBacklogAdmin(admin.ModelAdmin):
+class GoalsBacklogAdmin(ReplicaChangeListMixin, FullTextSearchMixin, admin.ModelAdmin):
     """Админка для целей в бэклоге"""
     list_display = ('goal_name', 'nsuser', 'goal_type', 'priority_weight', 'visibleforothers', 'createdat')
-    list_filter = ('goal_type', 'goal_result_type', 'visibleforothers', 'createdat')
+    list_select_related = ('nsuser', 'goal_type')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    autocomplete_fields = ('nsuser',)
+    list_filter = (
+        ('goal_type', LookupListFilter),
+        ('goal_result_type', LookupListFilter),
+        'visibleforothers',
+        'createdat',
+    )
     search_fields = ('goal_name', 'goal_reason', 'nsuser__userlogin')
+    search_exact_fields = ('nsuser__userlogin',)
+    search_help_text = 'Поиск по словам в имени и причине цели или по точному логину пользователя'
     readonly_fields = ('createdat', 'modifiedat')
+    actions = ['set_goal_results']
     fieldsets = (
         (None, {
             'fields': ('goal_name', 'nsuser', 'goal_type', 'goal_result_type')
@@ -44,4 +63,11 @@ class GoalsBacklogAdmin(admin.ModelAdmin):
             'fields': ('createdat', 'modifiedat'),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+
+    @admin.action(description='Установить результат целей')
+    def set_goal_results(self, request, queryset):
+        return bulk_action(
+            self, request, queryset, GoalResultForm,
+            set_goal_results, 'Установка результата целей'
+        )
@@ -0,0 +1,23 @@
+from ns.api import ModelListAPIView, ModelDetailAPIView
+from .models import GoalsBacklog
+
+
+class GoalAPIMixin:
+    """JSON API бэклога целей текущего пользователя"""
+    model = GoalsBacklog
+    fields = (
+        'id', 'goal_type', 'goal_result_type', 'goal_name', 'goal_reason',
+        'visibleforothers', 'priority_weight', 'createdat', 'modifiedat',
+    )
+    filter_fields = ('goal_type', 'goal_result_type', 'visibleforothers')
+
+    def get_queryset(self):
+        return GoalsBacklog.objects.filter(nsuser=self.request.user)
+
+
+class GoalListAPIView(GoalAPIMixin, ModelListAPIView):
+    pass
+
+
+class GoalDetailAPIView(GoalAPIMixin, ModelDetailAPIView):
+    pass
@@ -0,0 +1,50 @@
+from django import forms
+
+from .models import GoalType, GoalResultType
+
+VISIBILITY_CHOICES = (
+    ('', 'Все'),
+    ('1', 'Видимые для других'),
+    ('0', 'Скрытые'),
+)
+
+
+def lookup_choices(model):
+    """Варианты выбора из кэша справочника (без запроса к БД)"""
+    return lambda: [('', 'Все')] + model.lookups.choices()
+
+
+class GoalFilterForm(forms.Form):
+    """Фильтры списка целей"""
+    goal_type = forms.TypedChoiceField(
+        label='Тип цели',
+        choices=lookup_choices(GoalType),
+        coerce=int,
+        empty_value=None,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    goal_result_type = forms.TypedChoiceField(
+        label='Тип результата',
+        choices=lookup_choices(GoalResultType),
+        coerce=int,
+        empty_value=None,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    visibleforothers = forms.TypedChoiceField(
+        label='Видимость',
+        choices=VISIBILITY_CHOICES,
+        coerce=lambda value: value == '1',
+        empty_value=None,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+
+    def filter(self, queryset):
+        """Применение корректно заполненных фильтров к queryset"""
+        self.is_valid()
+        for name, value in self.cleaned_data.items():
+            if value is not None:
+                queryset = queryset.filter(**{name: value})
+        return queryset
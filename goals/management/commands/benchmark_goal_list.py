@@ -0,0 +1,108 @@
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет количество запросов в секунду к списку целей (GoalListView) '
+        'при текущих настройках соединений с БД или в нескольких режимах DB_CONNECTION_MODE'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', type=str, help='Логин пользователя, от имени которого выполняются запросы')
+        parser.add_argument('--requests', type=int, default=500, help='Количество запросов')
+        parser.add_argument('--threads', type=int, default=4, help='Количество параллельных клиентов')
+        parser.add_argument(
+            '--modes', type=str,
+            help='Режимы соединений через запятую (none,persistent,pool); '
+                 'каждый замеряется в отдельном процессе'
+        )
+
+    def handle(self, *args, **options):
+        if options['modes']:
+            return self.compare(options)
+
+        User = get_user_model()
+        try:
+            user = User.objects.get(userlogin=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['user']} не найден")
+        url = reverse('goal_list')
+
+        # Запросы идут через WSGI-обработчик, как от gunicorn: в отличие от
+        # тестового клиента он закрывает соединения по окончании запроса
+        # в соответствии с CONN_MAX_AGE
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        client.force_login(user)
+        session_cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+        application = get_wsgi_application()
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': url,
+            'QUERY_STRING': '',
+            'SERVER_NAME': settings.ALLOWED_HOSTS[0],
+            'SERVER_PORT': '80',
+            'HTTP_HOST': settings.ALLOWED_HOSTS[0],
+            'HTTP_COOKIE': f'{settings.SESSION_COOKIE_NAME}={session_cookie}',
+            'wsgi.url_scheme': 'http',
+        }
+
+        threads = max(options['threads'], 1)
+        per_thread = -(-options['requests'] // threads)
+
+        def start_response(status, headers):
+            if not status.startswith('200'):
+                raise CommandError(f'{url} вернул {status}')
+
+        def run(count):
+            try:
+                for _ in range(count):
+                    response = application(dict(environ, **{'wsgi.input': BytesIO()}), start_response)
+                    b''.join(response)
+                    response.close()
+            finally:
+                connection.close()
+            return count
+
+        # Прогрев: справочники, шаблоны, первое соединение
+        run(1)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            total = sum(executor.map(run, [per_thread] * threads))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'{settings.DB_CONNECTION_MODE}: {total} запросов за {elapsed:.2f} с, '
+            f'{total / elapsed:.1f} запросов/с'
+        )
+
+    def compare(self, options):
+        """Замер каждого режима в отдельном процессе: настройки БД читаются при запуске"""
+        for mode in options['modes'].split(','):
+            env = dict(os.environ, DB_CONNECTION_MODE=mode.strip())
+            result = subprocess.run(
+                [
+                    sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_goal_list', options['user'],
+                    '--requests', str(options['requests']), '--threads', str(options['threads']),
+                ],
+                env=env, capture_output=True, text=True,
+            )
+            if result.returncode:
+                errors = result.stderr.strip().splitlines()
+                error = errors[-1] if errors else f'код возврата {result.returncode}'
+                self.stdout.write(self.style.ERROR(f'{mode}: {error}'))
+            else:
+                self.stdout.write(result.stdout.strip())
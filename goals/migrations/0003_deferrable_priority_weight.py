@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 16:13
+
+import django.db.models.constraints
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goals", "0002_initial_data"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="goalsbacklog",
+            name="unique_user_priority_weight",
+        ),
+        migrations.AddConstraint(
+            model_name="goalsbacklog",
+            constraint=models.UniqueConstraint(
+                deferrable=django.db.models.constraints.Deferrable["IMMEDIATE"],
+                fields=("nsuser", "priority_weight"),
+                name="unique_user_priority_weight",
+            ),
+        ),
+    ]
@@ -1,8 +1,17 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connections, models, transaction
+from django.db.models import Max
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
+from ns.lookups import LookupCache
+from ns.search import search_vector
 from users.models import NSUser
 
+# Шаг между весами соседних целей. Промежутки позволяют переставить цель,
+# изменив вес только у нее, без перенумерации остальных целей.
+PRIORITY_WEIGHT_STEP = 1024
+
 
 class GoalType(models.Model):
     """Модель типов целей (таблица goal_type)"""
@@ -23,6 +32,9 @@ class GoalType(models.Model):
         auto_now=True
     )
 
+    # Кэш справочника в памяти процесса
+    lookups = LookupCache('type_name')
+
     class Meta:
         db_table = 'goal_type'
         verbose_name = _('Тип цели')
@@ -52,6 +64,9 @@ class GoalResultType(models.Model):
         auto_now=True
     )
 
+    # Кэш справочника в памяти процесса
+    lookups = LookupCache('type_name')
+
     class Meta:
         db_table = 'goal_result_type'
         verbose_name = _('Тип результата цели')
@@ -62,6 +77,87 @@ class GoalResultType(models.Model):
         return self.type_name
 
 
+class GoalsBacklogManager(models.Manager):
+    """Менеджер бэклога целей с операциями изменения порядка"""
+
+    def get_queryset(self):
+        # Поисковый вектор нужен только в условиях поиска и не загружается в объекты
+        return super().get_queryset().defer('search_vector')
+
+    def next_priority_weight(self, nsuser):
+        """Вес для новой цели в конце бэклога пользователя"""
+        last = self.filter(nsuser=nsuser).aggregate(Max('priority_weight'))['priority_weight__max']
+        return PRIORITY_WEIGHT_STEP if last is None else last + PRIORITY_WEIGHT_STEP
+
+    def move(self, goal, after=None):
+        """
+        Перемещение цели сразу после цели after (None - в начало бэклога).
+
+        Цель получает вес посередине между новыми соседями, поэтому обычно
+        обновляется одна строка. Если свободного веса между соседями нет,
+        бэклог пользователя перенумеровывается с шагом PRIORITY_WEIGHT_STEP.
+        """
+        with transaction.atomic(using=self.db):
+            # Перестановки в бэклоге одного пользователя выполняются по очереди
+            list(NSUser.objects.using(self.db).select_for_update().filter(pk=goal.nsuser_id).values_list('pk'))
+
+            weight = self._free_weight(goal, after)
+            if weight is None:
+                self.rebalance(goal.nsuser_id)
+                # Вес цели в памяти устарел: новый вес сравнивается с перенумерованным
+                goal.refresh_from_db(fields=['priority_weight', 'modifiedat'])
+                weight = self._free_weight(goal, after)
+
+            if weight != goal.priority_weight:
+                goal.priority_weight = weight
+                goal.modifiedat = timezone.now()
+                self.filter(pk=goal.pk).update(
+                    priority_weight=goal.priority_weight,
+                    modifiedat=goal.modifiedat
+                )
+        return goal
+
+    def _free_weight(self, goal, after):
+        """Вес для цели между after и следующей за ним целью, None - если места нет"""
+        backlog = self.filter(nsuser_id=goal.nsuser_id).exclude(pk=goal.pk)
+        current = self.filter(pk=goal.pk).values_list('priority_weight', flat=True).get()
+
+        lower = 0
+        if after is not None:
+            lower = self.filter(pk=after.pk).values_list('priority_weight', flat=True).get()
+            backlog = backlog.filter(priority_weight__gt=lower)
+        upper = backlog.order_by('priority_weight').values_list('priority_weight', flat=True).first()
+
+        if upper is None:
+            return current if current > lower else lower + PRIORITY_WEIGHT_STEP
+        if lower < current < upper:
+            return current
+        if upper - lower > 1:
+            return (lower + upper) // 2
+        return None
+
+    def rebalance(self, nsuser_id):
+        """
+        Перенумерация весов бэклога пользователя с шагом PRIORITY_WEIGHT_STEP.
+        Проверка уникальности весов откладывается до конца транзакции,
+        поэтому промежуточные совпадения весов не приводят к ошибке.
+        """
+        goals = list(
+            self.filter(nsuser_id=nsuser_id).order_by('priority_weight').only('id', 'priority_weight')
+        )
+        now = timezone.now()
+        for position, goal in enumerate(goals, start=1):
+            goal.priority_weight = position * PRIORITY_WEIGHT_STEP
+            goal.modifiedat = now
+
+        with transaction.atomic(using=self.db):
+            db_connection = connections[self.db]
+            if db_connection.vendor == 'postgresql':
+                with db_connection.cursor() as cursor:
+                    cursor.execute('SET CONSTRAINTS unique_user_priority_weight DEFERRED')
+            self.bulk_update(goals, ['priority_weight', 'modifiedat'], batch_size=1000)
+
+
 class GoalsBacklog(models.Model):
     """Модель бэклога целей (таблица goals_backlog)"""
     id = models.AutoField(primary_key=True, verbose_name=_('ID'))
@@ -102,6 +198,13 @@ class GoalsBacklog(models.Model):
         _('Вес цели'),
         help_text=_('Вес цели относительно всех других, уникален для пользователя')
     )
+    # Поисковый вектор имени (вес A) и причины (вес B), поддерживается PostgreSQL
+    search_vector = models.GeneratedField(
+        expression=search_vector(('goal_name', 'A'), ('goal_reason', 'B')),
+        output_field=SearchVectorField(),
+        db_persist=True,
+        editable=False
+    )
 
     # Служебные поля с DateTimeField
     createdat = models.DateTimeField(
@@ -114,6 +217,8 @@ class GoalsBacklog(models.Model):
         auto_now=True
     )
 
+    objects = GoalsBacklogManager()
+
     class Meta:
         db_table = 'goals_backlog'
         verbose_name = _('Цель в бэклоге')
@@ -122,9 +227,13 @@ class GoalsBacklog(models.Model):
         constraints = [
             models.UniqueConstraint(
                 fields=['nsuser', 'priority_weight'],
-                name='unique_user_priority_weight'
+                name='unique_user_priority_weight',
+                deferrable=models.Deferrable.IMMEDIATE
             )
         ]
+        indexes = [
+            GinIndex(fields=['search_vector'], name='goals_backlog_search_idx'),
+        ]
 
     def __str__(self):
         return f"{self.goal_name} (Вес: {self.priority_weight})"
\ No newline at end of file
@@ -1,3 +1,304 @@
-from django.test import TestCase
+import json
+import subprocess
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import path, reverse
+
+from ns.urls import urlpatterns as ns_urlpatterns
+from users.models import NSUser, UserProfile
+from .models import PRIORITY_WEIGHT_STEP, GoalsBacklog, GoalType, GoalResultType
+from .views import GoalListAsyncView, GoalDetailAsyncView
+
+# Асинхронные представления подключаются к URL только при ASYNC_VIEWS,
+# для тестов они добавляются отдельными путями
+urlpatterns = [
+    path('async/goals/', GoalListAsyncView.as_view(), name='async_goal_list'),
+    path('async/goals/<int:pk>/', GoalDetailAsyncView.as_view(), name='async_goal_detail'),
+] + ns_urlpatterns
+
+
+class GoalAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = NSUser.objects.create_user('owner', 'owner@example.com', 'password')
+        UserProfile.objects.filter(user=cls.user).update(email_verified=True)
+        goal_type = GoalType.objects.get_or_create(type_name='Личная')[0]
+        result_type = GoalResultType.objects.get_or_create(type_name='В работе')[0]
+        for i in range(5):
+            GoalsBacklog.objects.create(
+                nsuser=cls.user,
+                goal_type=goal_type,
+                goal_result_type=result_type,
+                goal_name=f'Цель {i}',
+                priority_weight=(i + 1) * 1024,
+            )
+        other = NSUser.objects.create_user('other', 'other@example.com', 'password')
+        GoalsBacklog.objects.create(
+            nsuser=other, goal_type=goal_type, goal_result_type=result_type,
+            goal_name='Чужая цель', priority_weight=1024,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('api_goal_list')
+
+    def test_fields_and_cursor_pagination(self):
+        response = self.client.get(self.url, {'fields': 'id,goal_name', 'limit': 3})
+        data = response.json()
+        self.assertEqual(len(data['results']), 3)
+        self.assertEqual(set(data['results'][0]), {'id', 'goal_name'})
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual([goal['goal_name'] for goal in data['results']], ['Цель 3', 'Цель 4'])
+        self.assertIsNone(data['next'])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(self.url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unchanged_collection_returns_304(self):
+        response = self.client.get(self.url)
+        etag = response.headers['ETag']
+
+        # Сессия, пользователь и один агрегирующий запрос - строки не выбираются
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        goal = GoalsBacklog.objects.filter(nsuser=self.user).first()
+        goal.goal_name = 'Новое имя'
+        goal.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_detail_etag(self):
+        goal = GoalsBacklog.objects.filter(nsuser=self.user).first()
+        url = reverse('api_goal_detail', args=[goal.pk])
+        etag = self.client.get(url).headers['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_stream_export(self):
+        response = self.client.get(self.url, {'stream': 1, 'fields': 'id,goal_name'})
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(data), 5)
+        self.assertNotIn('Чужая цель', [goal['goal_name'] for goal in data])
+
+
+@override_settings(ROOT_URLCONF='goals.tests')
+class GoalAsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = NSUser.objects.create_user('owner', 'owner@example.com', 'password')
+        goal_type = GoalType.objects.get_or_create(type_name='Личная')[0]
+        result_type = GoalResultType.objects.get_or_create(type_name='В работе')[0]
+        cls.goal = GoalsBacklog.objects.create(
+            nsuser=cls.user, goal_type=goal_type, goal_result_type=result_type,
+            goal_name='Асинхронная цель', priority_weight=1024,
+        )
+
+    def setUp(self):
+        # Статус подтверждения email кэшируется между тестами
+        cache.clear()
+
+    async def test_list_and_detail(self):
+        await UserProfile.objects.filter(user=self.user).aupdate(email_verified=True)
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse('async_goal_list'))
+        self.assertContains(response, 'Асинхронная цель')
+
+        response = await self.async_client.get(reverse('async_goal_detail', args=[self.goal.pk]))
+        self.assertContains(response, 'Личная')
+
+    async def test_anonymous_is_redirected_to_login(self):
+        response = await self.async_client.get(reverse('async_goal_list'))
+        self.assertEqual(response.status_code, 302)
+
+    async def test_unverified_email_is_redirected(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('async_goal_list'))
+        self.assertRedirects(response, reverse('users:resend_verification'), fetch_redirect_response=False)
+
+
+class GoalSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = NSUser.objects.create_user('owner', 'owner@example.com', 'password')
+        UserProfile.objects.filter(user=cls.user).update(email_verified=True)
+        other = NSUser.objects.create_user('other', 'other@example.com', 'password')
+        goal_type = GoalType.objects.get_or_create(type_name='Личная')[0]
+        result_type = GoalResultType.objects.get_or_create(type_name='В работе')[0]
+        for nsuser, name, reason, visible in (
+            (cls.user, 'Марафон', 'Пробежать марафон за четыре часа', False),
+            (cls.user, 'Английский', 'Готовиться к марафону по английскому', False),
+            (other, 'Полумарафон', 'Пробежать марафон осенью', False),
+            (other, 'Открытый марафон', 'Бегать по утрам', True),
+        ):
+            GoalsBacklog.objects.create(
+                nsuser=nsuser, goal_type=goal_type, goal_result_type=result_type,
+                goal_name=name, goal_reason=reason, visibleforothers=visible,
+                priority_weight=GoalsBacklog.objects.next_priority_weight(nsuser),
+            )
+
+    def test_search_uses_stemming_ranking_and_visibility(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('goal_search'), {'q': 'марафоны'})
+
+        names = [goal.goal_name for goal in response.context['goals']]
+        # Совпадение в имени (вес A) выше совпадения только в причине (вес B)
+        self.assertEqual(names[0], 'Марафон')
+        self.assertEqual(set(names), {'Марафон', 'Английский', 'Открытый марафон'})
+
+
+class GoalListCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = NSUser.objects.create_user('owner', 'owner@example.com', 'password')
+        UserProfile.objects.filter(user=cls.user).update(email_verified=True)
+        goal_type = GoalType.objects.get_or_create(type_name='Личная')[0]
+        result_type = GoalResultType.objects.get_or_create(type_name='В работе')[0]
+        cls.goal = GoalsBacklog.objects.create(
+            nsuser=cls.user, goal_type=goal_type, goal_result_type=result_type,
+            goal_name='Кэшируемая цель', priority_weight=1024,
+        )
+
+    def setUp(self):
+        cache.clear()
+        caches['fragments'].clear()
+        self.client.force_login(self.user)
+
+    def test_repeated_list_is_served_from_page_cache(self):
+        # Первый запрос получает CSRF-cookie, второй отрисовывает и кэширует страницу
+        self.client.get(reverse('goal_list'))
+        first = self.client.get(reverse('goal_list'))
+        self.assertTemplateUsed(first, 'goals/goal_list.html')
+
+        second = self.client.get(reverse('goal_list'))
+        self.assertEqual(second.templates, [])
+        self.assertEqual(second.content, first.content)
+
+    def test_changed_goal_is_rendered_again(self):
+        self.client.get(reverse('goal_list'))
+
+        self.goal.goal_name = 'Новое имя'
+        self.goal.save()
+        response = self.client.get(reverse('goal_list'))
+        self.assertTemplateUsed(response, 'goals/goal_list.html')
+        self.assertContains(response, 'Новое имя')
+
+
+class GoalMoveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = NSUser.objects.create_user('owner', 'owner@example.com', 'password')
+        UserProfile.objects.filter(user=cls.user).update(email_verified=True)
+        cls.other = NSUser.objects.create_user('other', 'other@example.com', 'password')
+        cls.goal_type = GoalType.objects.get_or_create(type_name='Личная')[0]
+        cls.result_type = GoalResultType.objects.get_or_create(type_name='В работе')[0]
+        cls.first, cls.second, cls.third = [
+            cls.create_goal(cls.user, name, weight * PRIORITY_WEIGHT_STEP)
+            for weight, name in enumerate(('Первая', 'Вторая', 'Третья'), start=1)
+        ]
+        cls.foreign = cls.create_goal(cls.other, 'Чужая', PRIORITY_WEIGHT_STEP)
+
+    @classmethod
+    def create_goal(cls, nsuser, name, weight):
+        return GoalsBacklog.objects.create(
+            nsuser=nsuser, goal_type=cls.goal_type, goal_result_type=cls.result_type,
+            goal_name=name, priority_weight=weight,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def backlog(self):
+        return list(
+            GoalsBacklog.objects.filter(nsuser=self.user).order_by('priority_weight')
+            .values_list('goal_name', flat=True)
+        )
+
+    def test_move_to_head(self):
+        GoalsBacklog.objects.move(self.third)
+        self.assertEqual(self.third.priority_weight, PRIORITY_WEIGHT_STEP // 2)
+        self.assertEqual(self.backlog(), ['Третья', 'Первая', 'Вторая'])
+
+    def test_move_to_middle(self):
+        GoalsBacklog.objects.move(self.first, self.second)
+        self.assertEqual(self.first.priority_weight, 2 * PRIORITY_WEIGHT_STEP + PRIORITY_WEIGHT_STEP // 2)
+        self.assertEqual(self.backlog(), ['Вторая', 'Первая', 'Третья'])
+
+    def test_move_to_tail(self):
+        GoalsBacklog.objects.move(self.first, self.third)
+        self.assertEqual(self.first.priority_weight, 4 * PRIORITY_WEIGHT_STEP)
+        self.assertEqual(self.backlog(), ['Вторая', 'Третья', 'Первая'])
+
+    def test_move_without_gap_rebalances(self):
+        for weight, goal in enumerate((self.first, self.second, self.third), start=1):
+            GoalsBacklog.objects.filter(pk=goal.pk).update(priority_weight=weight)
+
+        GoalsBacklog.objects.move(self.third, self.first)
+
+        self.assertEqual(self.backlog(), ['Первая', 'Третья', 'Вторая'])
+        weights = dict(GoalsBacklog.objects.filter(nsuser=self.user).values_list('goal_name', 'priority_weight'))
+        self.assertEqual(weights['Первая'], PRIORITY_WEIGHT_STEP)
+        self.assertEqual(weights['Вторая'], 2 * PRIORITY_WEIGHT_STEP)
+        self.assertEqual(weights['Третья'], PRIORITY_WEIGHT_STEP + PRIORITY_WEIGHT_STEP // 2)
+
+    def test_rebalanced_slot_equal_to_old_weight(self):
+        # После перенумерации Первая=1024, Вторая=2048, Третья=3072, место между
+        # Первой и Второй - 1536, т. е. прежний вес Третьей
+        for weight, goal in ((1024, self.first), (1025, self.second), (1536, self.third)):
+            GoalsBacklog.objects.filter(pk=goal.pk).update(priority_weight=weight)
+        self.third.refresh_from_db()
+
+        GoalsBacklog.objects.move(self.third, self.first)
+
+        self.assertEqual(self.backlog(), ['Первая', 'Третья', 'Вторая'])
+        self.assertEqual(self.third.priority_weight, 1536)
+        self.assertEqual(GoalsBacklog.objects.get(pk=self.third.pk).priority_weight, 1536)
+
+    def test_move_view(self):
+        self.client.force_login(self.user)
+        url = reverse('goal_move', args=[self.first.pk])
+
+        response = self.client.post(url, {'after': self.third.pk})
+        self.assertEqual(response.json(), {'id': self.first.pk, 'priority_weight': 4 * PRIORITY_WEIGHT_STEP})
+
+        self.assertEqual(self.client.post(url, {'after': self.foreign.pk}).status_code, 404)
+        self.assertEqual(self.client.post(url, {'after': 'abc'}).status_code, 400)
+        self.assertEqual(self.backlog(), ['Вторая', 'Третья', 'Первая'])
+
+
+class BenchmarkCompareTests(TestCase):
+    """Сравнение режимов соединений: каждый режим запускается в отдельном процессе"""
+
+    def compare(self, result):
+        stdout = StringIO()
+        with mock.patch('subprocess.run', return_value=result) as run:
+            call_command('benchmark_goal_list', 'owner', '--modes', 'none,pool', stdout=stdout)
+        return run, stdout.getvalue()
+
+    def test_children_are_started_through_manage_py(self):
+        run, output = self.compare(subprocess.CompletedProcess([], 0, stdout='none: 10 запросов/с\n', stderr=''))
+        args, kwargs = run.call_args
+        self.assertEqual(args[0][1:3], [str(settings.BASE_DIR / 'manage.py'), 'benchmark_goal_list'])
+        self.assertEqual(kwargs['env']['DB_CONNECTION_MODE'], 'pool')
+        self.assertEqual(run.call_count, 2)
+        self.assertIn('none: 10 запросов/с', output)
+
+    def test_failed_child_reports_last_error_line(self):
+        run, output = self.compare(
+            subprocess.CompletedProcess([], 1, stdout='', stderr='Traceback\nImportError: no psycopg_pool\n')
+        )
+        self.assertIn('pool: ImportError: no psycopg_pool', output)
+
+    def test_failed_child_without_stderr_reports_return_code(self):
+        run, output = self.compare(subprocess.CompletedProcess([], -9, stdout='', stderr=''))
+        self.assertIn('none: код возврата -9', output)
@@ -1,8 +1,19 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
+
+# Под ASGI списки и карточки обслуживаются асинхронными представлениями
+if settings.ASYNC_VIEWS:
+    GoalListView, GoalDetailView = views.GoalListAsyncView, views.GoalDetailAsyncView
+else:
+    GoalListView, GoalDetailView = views.GoalListView, views.GoalDetailView
 
 urlpatterns = [
-    path('', views.GoalListView.as_view(), name='goal_list'),
+    path('', GoalListView.as_view(), name='goal_list'),
     path('create/', views.GoalCreateView.as_view(), name='goal_create'),
-    path('<int:pk>/', views.GoalDetailView.as_view(), name='goal_detail'),
+    path('<int:pk>/', GoalDetailView.as_view(), name='goal_detail'),
+    path('<int:pk>/move/', views.GoalMoveView.as_view(), name='goal_move'),
+    path('search/', views.GoalSearchView.as_view(), name='goal_search'),
+    path('api/', api.GoalListAPIView.as_view(), name='api_goal_list'),
+    path('api/<int:pk>/', api.GoalDetailAPIView.as_view(), name='api_goal_detail'),
 ]
@@ -1,17 +1,58 @@
-from django.views.generic import ListView, DetailView, CreateView
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, render
+from django.views import View
+from django.views.generic import ListView, DetailView, CreateView, TemplateView
 from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
+from ns.mixins import AsyncLoginRequiredMixin, PageCacheMixin, ReplicaReadMixin
+from ns.pagination import KeysetPaginator
+from ns.search import search
+from goal_sessions.models import SessionGoal
+from .forms import GoalFilterForm
 from .models import GoalsBacklog, GoalType, GoalResultType
 
-class GoalListView(LoginRequiredMixin, ListView):
+# Количество результатов поиска в каждом разделе
+SEARCH_RESULTS_LIMIT = 50
+
+def filter_query(request):
+    """Параметры фильтров без курсора - для ссылок постраничного вывода"""
+    query = request.GET.copy()
+    query.pop('after', None)
+    return query.urlencode()
+
+class GoalListView(LoginRequiredMixin, ReplicaReadMixin, PageCacheMixin, ListView):
     model = GoalsBacklog
     template_name = 'goals/goal_list.html'
     context_object_name = 'goals'
+    paginate_by = 50
     
     def get_queryset(self):
-        return GoalsBacklog.objects.filter(nsuser=self.request.user)
+        self.filter_form = GoalFilterForm(self.request.GET)
+        return self.filter_form.filter(GoalsBacklog.objects.filter(nsuser=self.request.user))
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Постраничный вывод по курсору в порядке priority_weight.
+        Порядок поддержан уникальным индексом (nsuser, priority_weight).
+        """
+        paginator = KeysetPaginator(queryset, 'priority_weight', page_size)
+        try:
+            page = paginator.page(self.request.GET.get('after'))
+        except InvalidPage as e:
+            raise Http404(str(e))
+        return paginator, page, page.object_list, page.has_next() or page.has_previous()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Типы целей подставляются из кэша справочника, без запроса на каждую строку
+        context['goals'] = GoalType.lookups.attach(context['goals'], 'goal_type')
+        context['filter_form'] = self.filter_form
+        context['filter_query'] = filter_query(self.request)
+        return context
 
-class GoalDetailView(LoginRequiredMixin, DetailView):
+class GoalDetailView(LoginRequiredMixin, ReplicaReadMixin, DetailView):
     model = GoalsBacklog
     template_name = 'goals/goal_detail.html'
     context_object_name = 'goal'
@@ -19,18 +60,113 @@ class GoalDetailView(LoginRequiredMixin, DetailView):
     def get_queryset(self):
         return GoalsBacklog.objects.filter(nsuser=self.request.user)
 
+    def get_object(self, queryset=None):
+        goal = super().get_object(queryset)
+        GoalType.lookups.attach([goal], 'goal_type')
+        GoalResultType.lookups.attach([goal], 'goal_result_type')
+        return goal
+
+class GoalListAsyncView(AsyncLoginRequiredMixin, ReplicaReadMixin, View):
+    """Асинхронный вариант GoalListView для развертывания под ASGI"""
+    template_name = GoalListView.template_name
+    paginate_by = GoalListView.paginate_by
+
+    async def get(self, request):
+        # Справочники загружаются заранее: форма и шаблон читают их синхронно
+        await GoalType.lookups.aload()
+        await GoalResultType.lookups.aload()
+
+        filter_form = GoalFilterForm(request.GET)
+        queryset = filter_form.filter(GoalsBacklog.objects.filter(nsuser=request.user))
+        paginator = KeysetPaginator(queryset, 'priority_weight', self.paginate_by)
+        try:
+            page = await paginator.apage(request.GET.get('after'))
+        except InvalidPage as e:
+            raise Http404(str(e))
+
+        return render(request, self.template_name, {
+            'goals': GoalType.lookups.attach(page.object_list, 'goal_type'),
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': page.has_next() or page.has_previous(),
+            'filter_form': filter_form,
+            'filter_query': filter_query(request),
+        })
+
+class GoalDetailAsyncView(AsyncLoginRequiredMixin, ReplicaReadMixin, View):
+    """Асинхронный вариант GoalDetailView для развертывания под ASGI"""
+    template_name = GoalDetailView.template_name
+
+    async def get(self, request, pk):
+        goal = await aget_object_or_404(GoalsBacklog, nsuser=request.user, pk=pk)
+        await GoalType.lookups.aload()
+        await GoalResultType.lookups.aload()
+        GoalType.lookups.attach([goal], 'goal_type')
+        GoalResultType.lookups.attach([goal], 'goal_result_type')
+        return render(request, self.template_name, {'goal': goal})
+
+class GoalSearchView(LoginRequiredMixin, ReplicaReadMixin, TemplateView):
+    """
+    Полнотекстовый поиск по своим и открытым для других целям и планам
+    в сессиях, результаты упорядочены по релевантности.
+    """
+    template_name = 'goals/goal_search.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        context['query'] = query
+        if not query:
+            return context
+
+        visible = Q(nsuser=self.request.user) | Q(visibleforothers=True)
+        goals = search(GoalsBacklog.objects.filter(visible), query)[:SEARCH_RESULTS_LIMIT]
+        context['goals'] = GoalType.lookups.attach(goals, 'goal_type')
+
+        session_goals = SessionGoal.objects.filter(
+            Q(goal__nsuser=self.request.user) | Q(goal__visibleforothers=True)
+        ).select_related('goal').only(
+            'id', 'nssession_id', 'goal_plan', 'goal_steps', 'goal__id', 'goal__goal_name'
+        )
+        context['session_goals'] = list(search(session_goals, query)[:SEARCH_RESULTS_LIMIT])
+        return context
+
 class GoalCreateView(LoginRequiredMixin, CreateView):
     model = GoalsBacklog
     template_name = 'goals/goal_form.html'
     fields = ['goal_type', 'goal_result_type', 'goal_name', 'goal_reason', 'visibleforothers', 'priority_weight']
     success_url = reverse_lazy('goal_list')
     
+    def get_initial(self):
+        initial = super().get_initial()
+        initial['priority_weight'] = GoalsBacklog.objects.next_priority_weight(self.request.user)
+        return initial
+
     def form_valid(self, form):
         form.instance.nsuser = self.request.user
         return super().form_valid(form)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['goal_types'] = GoalType.objects.all()
-        context['result_types'] = GoalResultType.objects.all()
+        context['goal_types'] = GoalType.lookups.all()
+        context['result_types'] = GoalResultType.lookups.all()
         return context
+
+
+class GoalMoveView(LoginRequiredMixin, View):
+    """
+    Перемещение цели в бэклоге (drag-and-drop).
+    POST-параметр after - id цели, после которой встает перемещаемая;
+    пустое значение - переместить в начало бэклога.
+    """
+
+    def post(self, request, pk):
+        goals = GoalsBacklog.objects.filter(nsuser=request.user)
+        goal = get_object_or_404(goals, pk=pk)
+        after_id = request.POST.get('after')
+        if after_id and not after_id.isdigit():
+            return JsonResponse({'error': 'Некорректное значение after'}, status=400)
+        after = get_object_or_404(goals, pk=after_id) if after_id else None
+
+        GoalsBacklog.objects.move(goal, after)
+        return JsonResponse({'id': goal.pk, 'priority_weight': goal.priority_weight})
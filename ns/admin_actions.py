@@ -0,0 +1,37 @@
+from django.contrib import messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.template.response import TemplateResponse
+
+
+def bulk_action(modeladmin, request, queryset, form_class, operation, title):
+    """
+    Массовое действие админки с параметрами и предпросмотром.
+
+    Сначала показывается страница с формой параметров. Кнопка
+    «Предпросмотр» выполняет operation(queryset, dry_run=True, **параметры)
+    и показывает количество строк, которые будут изменены; кнопка
+    «Применить» выполняет операцию и возвращает на список.
+    """
+    submitted = 'preview' in request.POST or 'apply' in request.POST
+    form = form_class(request.POST if submitted else None)
+
+    affected = None
+    if submitted and form.is_valid():
+        if 'apply' in request.POST:
+            count = operation(queryset, **form.cleaned_data)
+            modeladmin.message_user(request, f'{title}: изменено строк {count}', messages.SUCCESS)
+            return None
+        affected = operation(queryset, dry_run=True, **form.cleaned_data)
+
+    context = {
+        **modeladmin.admin_site.each_context(request),
+        'title': title,
+        'opts': modeladmin.model._meta,
+        'form': form,
+        'affected': affected,
+        'action': request.POST['action'],
+        'selected': request.POST.getlist(ACTION_CHECKBOX_NAME),
+        'select_across': request.POST.get('select_across', '0'),
+        'action_checkbox_name': ACTION_CHECKBOX_NAME,
+    }
+    return TemplateResponse(request, 'admin/bulk_action.html', context)
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+
+class LookupListFilter(admin.RelatedFieldListFilter):
+    """Фильтр по справочнику: варианты берутся из кэша справочника, а не из БД"""
+
+    def field_choices(self, field, request, model_admin):
+        lookup_cache = getattr(field.related_model, 'lookups', None)
+        if lookup_cache is None:
+            return super().field_choices(field, request, model_admin)
+        return lookup_cache.choices()
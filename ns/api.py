@@ -0,0 +1,187 @@
+import hashlib
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views import View
+
+from .mixins import ReplicaReadMixin
+from .pagination import KeysetPaginator
+
+
+class APIError(Exception):
+    """Некорректные параметры запроса к API (ответ 400)"""
+
+
+class ModelAPIMixin(LoginRequiredMixin):
+    """
+    Общая часть read-only JSON API модели.
+
+    Параметры запроса:
+    fields - список полей через запятую (по умолчанию все из fields);
+    <поле из filter_fields>=<значение> - фильтр по точному совпадению.
+
+    Ответы содержат ETag и Last-Modified, вычисленные по modifiedat.
+    Если версия данных у клиента актуальна (If-None-Match/If-Modified-Since),
+    возвращается 304 без выборки и сериализации строк.
+    """
+    raise_exception = True
+    model = None
+    fields = ()
+    filter_fields = ()
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def get_fields(self):
+        requested = self.request.GET.get('fields')
+        if not requested:
+            return list(self.fields)
+        fields = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = set(fields) - set(self.fields)
+        if unknown:
+            raise APIError(f"Неизвестные поля: {', '.join(sorted(unknown))}")
+        return fields
+
+    def filter_queryset(self, queryset):
+        for name in self.filter_fields:
+            if name not in self.request.GET:
+                continue
+            field = self.model._meta.get_field(name)
+            try:
+                value = field.to_python(self.request.GET[name])
+            except ValidationError:
+                raise APIError(f'Некорректное значение фильтра {name}')
+            queryset = queryset.filter(**{name: value})
+        return queryset
+
+    def serialize(self, obj, fields):
+        # Для внешних ключей отдается id связанной записи, как в values()
+        return {name: self.model._meta.get_field(name).value_from_object(obj) for name in fields}
+
+    def not_modified(self, version, last_modified):
+        """
+        Проверка условного запроса. Возвращает ответ 304/412 или None.
+        ETag зависит от версии данных, пользователя и параметров запроса.
+        """
+        key = f'{version}:{self.request.user.pk}:{self.request.get_full_path()}'
+        self.etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+        self.last_modified = last_modified.timestamp() if last_modified else None
+        return get_conditional_response(
+            self.request, etag=self.etag, last_modified=self.last_modified
+        )
+
+    def add_validators(self, response):
+        response.headers['ETag'] = self.etag
+        if self.last_modified is not None:
+            response.headers['Last-Modified'] = http_date(self.last_modified)
+        # Ответ зависит от пользователя, общий кэш не должен его переиспользовать
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except APIError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+
+class ModelListAPIView(ModelAPIMixin, ReplicaReadMixin, View):
+    """
+    Список записей модели с постраничным выводом по курсору.
+
+    after - курсор следующей страницы (из поля next предыдущего ответа),
+    limit - размер страницы (не больше max_per_page),
+    stream=1 - выгрузка всей выборки потоковым JSON-массивом без страниц.
+    """
+    key = 'id'
+    per_page = 100
+    max_per_page = 1000
+    chunk_size = 2000
+
+    def get_per_page(self):
+        try:
+            limit = int(self.request.GET.get('limit', self.per_page))
+        except ValueError:
+            raise APIError('Некорректное значение limit')
+        return max(1, min(limit, self.max_per_page))
+
+    def get(self, request, *args, **kwargs):
+        fields = self.get_fields()
+        queryset = self.filter_queryset(self.get_queryset())
+
+        # Версия коллекции: последнее изменение и количество строк (учитывает удаления)
+        state = queryset.aggregate(last_modified=Max('modifiedat'), count=Count('pk'))
+        response = self.not_modified(
+            f"{state['last_modified']}:{state['count']}", state['last_modified']
+        )
+        if response is not None:
+            return response
+
+        if request.GET.get('stream'):
+            rows = queryset.order_by(self.key).values(*fields)
+            # БД выбирается сейчас: строки читаются уже после выхода из представления
+            rows = rows.using(rows.db)
+            response = StreamingHttpResponse(self.stream(rows), content_type='application/json')
+        else:
+            response = JsonResponse(self.get_page_data(queryset.only(*fields), fields))
+        return self.add_validators(response)
+
+    def get_page_data(self, queryset, fields):
+        paginator = KeysetPaginator(queryset, self.key, self.get_per_page())
+        try:
+            page = paginator.page(self.request.GET.get('after'))
+        except InvalidPage as e:
+            raise APIError(str(e))
+
+        next_url = None
+        if page.has_next():
+            query = self.request.GET.copy()
+            query['after'] = page.next_cursor
+            next_url = f'{self.request.path}?{query.urlencode()}'
+        return {
+            'results': [self.serialize(obj, fields) for obj in page],
+            'next': next_url,
+        }
+
+    def stream(self, rows):
+        """JSON-массив строк, выдаваемый частями по chunk_size записей"""
+        encoder = DjangoJSONEncoder()
+        yield '['
+        chunk = []
+        separator = ''
+        for row in rows.iterator(chunk_size=self.chunk_size):
+            chunk.append(encoder.encode(row))
+            if len(chunk) >= self.chunk_size:
+                yield separator + ','.join(chunk)
+                separator = ','
+                chunk = []
+        if chunk:
+            yield separator + ','.join(chunk)
+        yield ']'
+
+
+class ModelDetailAPIView(ModelAPIMixin, ReplicaReadMixin, View):
+    """Одна запись модели по id"""
+
+    def get(self, request, pk, *args, **kwargs):
+        fields = self.get_fields()
+        queryset = self.get_queryset().filter(pk=pk)
+
+        # Сначала читается только modifiedat: для 304 строка целиком не нужна
+        last_modified = queryset.values_list('modifiedat', flat=True).first()
+        if last_modified is None:
+            raise Http404
+        response = self.not_modified(last_modified.isoformat(), last_modified)
+        if response is not None:
+            return response
+
+        obj = queryset.only(*fields).first()
+        if obj is None:
+            raise Http404
+        return self.add_validators(JsonResponse(self.serialize(obj, fields)))
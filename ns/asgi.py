@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ns.settings")
 
 application = get_asgi_application()
+
+from ns.lookups import warm_lookup_caches  # noqa: E402
+
+warm_lookup_caches()
@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import Signal, receiver
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+logger = logging.getLogger('ns.instrumentation')
+
+# Отправляется, когда представление выполнило больше запросов, чем его бюджет.
+# Аргументы: view_name, queries, budget, request.
+query_budget_exceeded = Signal()
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Показатели одного запроса. Запросы к БД и время в БД считает
+    record_query, пока показатели установлены текущими (_current).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def finish(self):
+        self.total_time = time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing (длительности в миллисекундах)"""
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ))
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обертка выполнения запросов (execute_wrapper), постоянно установленная
+    на соединениях. Запрос учитывается в показателях текущего запроса из
+    ContextVar, поэтому учитываются и запросы из потоков sync_to_async под
+    ASGI: контекст копируется в поток, а соединения там свои.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection):
+    """Установка record_query на соединение (повторная установка ничего не делает)"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def _install_on_connect(sender, connection, **kwargs):
+    install_query_recorder(connection)
+
+
+class MetricsRegistry:
+    """
+    Скользящее окно последних замеров по имени URL в памяти процесса.
+    Перцентили считаются при чтении, запись - добавление в deque.
+    """
+    fields = ('total_time', 'db_time', 'template_time', 'queries')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, view_name, metrics):
+        sample = tuple(getattr(metrics, field) for field in self.fields)
+        with self._lock:
+            samples = self._samples.get(view_name)
+            if samples is None:
+                samples = self._samples[view_name] = deque(maxlen=settings.METRICS_WINDOW)
+            samples.append(sample)
+
+    def summary(self):
+        """Сводка по URL: количество замеров и перцентили 50/95/99 каждого показателя"""
+        with self._lock:
+            snapshot = {name: list(samples) for name, samples in self._samples.items()}
+
+        rows = []
+        for view_name, samples in sorted(snapshot.items()):
+            row = {'view_name': view_name, 'count': len(samples)}
+            for index, field in enumerate(self.fields):
+                values = sorted(sample[index] for sample in samples)
+                for percentile in (50, 95, 99):
+                    row[f'{field}_p{percentile}'] = percentile_value(values, percentile)
+            rows.append(row)
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+metrics_registry = MetricsRegistry()
+
+
+def percentile_value(values, percentile):
+    """Перцентиль отсортированного списка (ближайший ранг)"""
+    if not values:
+        return 0
+    index = max(0, -(-len(values) * percentile // 100) - 1)
+    return values[index]
+
+
+class InstrumentedTemplate(Template):
+    """Шаблон, добавляющий время отрисовки к показателям текущего запроса"""
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    Бэкенд шаблонов Django с замером времени отрисовки.
+    Учитываются шаблоны верхнего уровня (render, TemplateResponse,
+    render_to_string), включаемые через extends/include входят в их время.
+    """
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return InstrumentedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,116 @@
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models.signals import post_delete, post_save
+
+
+class LookupCache:
+    """
+    Кэш небольшой справочной таблицы в памяти процесса.
+
+    Подключается к модели как атрибут (GoalType.lookups) и отдает записи
+    по id и по имени без обращения к БД. Кэш заполняется при первом
+    обращении, сбрасывается сигналами post_save/post_delete и перечитывается
+    через LOOKUP_CACHE_TIMEOUT секунд, чтобы изменения из других процессов
+    тоже становились видны.
+    """
+    instances = []
+
+    def __init__(self, name_field):
+        self.name_field = name_field
+        self.model = None
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def contribute_to_class(self, cls, name):
+        self.model = cls
+        setattr(cls, name, self)
+        post_save.connect(self._on_change, sender=cls, weak=False)
+        post_delete.connect(self._on_change, sender=cls, weak=False)
+        LookupCache.instances.append(self)
+
+    def _on_change(self, sender, **kwargs):
+        self.invalidate()
+
+    def _load(self):
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot['expires'] > time.monotonic():
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot['expires'] <= time.monotonic():
+                objects = tuple(self.model._default_manager.all())
+                snapshot = {
+                    'expires': time.monotonic() + settings.LOOKUP_CACHE_TIMEOUT,
+                    'objects': objects,
+                    'by_id': {obj.pk: obj for obj in objects},
+                    'by_name': {getattr(obj, self.name_field): obj for obj in objects},
+                }
+                self._snapshot = snapshot
+        return snapshot
+
+    async def aload(self):
+        """
+        Заполнение кэша из асинхронного кода. Вызывается перед all()/attach()
+        в асинхронных представлениях, чтобы они не обращались к БД из цикла событий.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or snapshot['expires'] <= time.monotonic():
+            await sync_to_async(self._load)()
+
+    def all(self):
+        """Все записи справочника в порядке сортировки модели"""
+        return list(self._load()['objects'])
+
+    def get(self, pk):
+        """Запись по id или None"""
+        return self._load()['by_id'].get(pk)
+
+    def get_by_name(self, name):
+        """Запись по имени или None"""
+        return self._load()['by_name'].get(name)
+
+    def choices(self):
+        """Пары (id, имя) для выпадающих списков и фильтров"""
+        return [(obj.pk, getattr(obj, self.name_field)) for obj in self._load()['objects']]
+
+    def attach(self, objects, field_name):
+        """
+        Подстановка связанных записей справочника в объекты по внешнему ключу.
+        После этого обращение к obj.<field_name> не выполняет запрос к БД.
+        """
+        objects = list(objects)
+        if not objects:
+            return objects
+
+        field = objects[0]._meta.get_field(field_name)
+        for obj in objects:
+            related = self.get(getattr(obj, field.attname))
+            if related is not None:
+                field.set_cached_value(obj, related)
+        return objects
+
+    def invalidate(self):
+        self._snapshot = None
+
+
+def warm_lookup_caches():
+    """
+    Заполнение всех кэшей справочников при старте процесса.
+
+    Соединения с БД после заполнения закрываются: при запуске с --preload
+    воркеры создаются fork'ом и не должны наследовать сокет или пул мастера.
+    """
+    try:
+        for lookup_cache in LookupCache.instances:
+            lookup_cache.all()
+    except DatabaseError:
+        # БД еще недоступна - кэши заполнятся при первом обращении
+        for lookup_cache in LookupCache.instances:
+            lookup_cache.invalidate()
+    finally:
+        connections.close_all()
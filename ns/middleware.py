@@ -0,0 +1,129 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from .instrumentation import (
+    RequestMetrics, _current, install_query_recorder, logger, metrics_registry, query_budget_exceeded
+)
+from .routers import RoutingState, _state
+
+# Cookie, закрепляющая чтения клиента за основной БД после записи
+PRIMARY_PIN_COOKIE = 'db_primary'
+
+
+class PrimaryPinMiddleware:
+    """
+    Закрепление чтений за основной БД после записи.
+
+    Если запрос выполнил запись, клиенту на REPLICA_PIN_SECONDS ставится
+    cookie, и его следующие запросы читают из основной БД, пока реплики
+    не догонят изменения (read-your-writes).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        state = RoutingState(pinned=PRIMARY_PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.process_response(state, response)
+
+    async def __acall__(self, request):
+        state = RoutingState(pinned=PRIMARY_PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.process_response(state, response)
+
+    def process_response(self, state, response):
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class InstrumentationMiddleware:
+    """
+    Замер запроса: количество запросов и время в БД (record_query на
+    всех соединениях), время отрисовки шаблонов и общее время.
+
+    Показатели отдаются в заголовке Server-Timing и накапливаются по имени
+    URL для страницы /admin/metrics/. При превышении бюджета запросов
+    (атрибут query_budget представления или QUERY_BUDGET) пишется
+    предупреждение и отправляется сигнал query_budget_exceeded.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = self.start()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process_response(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = self.start()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process_response(request, response, metrics)
+
+    def start(self):
+        # Соединения, открытые до подключения сигнала connection_created
+        # (например, при прогреве кэшей), получают обертку здесь
+        for alias in connections:
+            install_query_recorder(connections[alias])
+        return RequestMetrics()
+
+    def process_response(self, request, response, metrics):
+        metrics.finish()
+        if settings.SERVER_TIMING:
+            response.headers['Server-Timing'] = metrics.server_timing()
+
+        match = request.resolver_match
+        if match is None:
+            return response
+
+        metrics_registry.record(match.view_name, metrics)
+        view = getattr(match.func, 'view_class', match.func)
+        budget = getattr(view, 'query_budget', settings.QUERY_BUDGET)
+        if metrics.queries > budget:
+            logger.warning(
+                'Представление %s выполнило %d запросов к БД при бюджете %d (%s)',
+                match.view_name, metrics.queries, budget, request.get_full_path(),
+            )
+            query_budget_exceeded.send(
+                sender=self.__class__, view_name=match.view_name,
+                queries=metrics.queries, budget=budget, request=request,
+            )
+        return response
@@ -0,0 +1,101 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.mixins import AccessMixin
+from django.core.cache import caches
+from django.db.models import Count, Max
+from django.http import HttpResponse
+
+from .routers import replica_reads
+
+
+class AsyncLoginRequiredMixin(AccessMixin):
+    """
+    Аналог LoginRequiredMixin для асинхронных представлений.
+    Пользователь загружается через request.auser() и сохраняется в
+    request.user, чтобы шаблоны не обращались к БД синхронно.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class ReplicaReadMixin:
+    """
+    Чтения представления (включая отрисовку шаблона) направляются на реплику.
+    Только для представлений, которые не пишут в БД.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self._adispatch(request, *args, **kwargs)
+        with replica_reads():
+            response = super().dispatch(request, *args, **kwargs)
+            # Ленивые queryset шаблона выполняются внутри блока
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+            return response
+
+    async def _adispatch(self, request, *args, **kwargs):
+        with replica_reads():
+            return await super().dispatch(request, *args, **kwargs)
+
+
+class ReplicaChangeListMixin:
+    """Списки записей в админке читаются с реплики"""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with replica_reads():
+            response = super().changelist_view(request, extra_context)
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+            return response
+
+
+class PageCacheMixin:
+    """
+    Кэш отрисованной страницы списка (ListView).
+
+    Ключ - пользователь, адрес страницы с параметрами, CSRF-cookie (токен в
+    формах страницы) и версия выборки: последний modifiedat и количество
+    строк. Любое изменение выборки меняет версию, при попадании в кэш
+    страница отдается без выборки строк и отрисовки шаблона.
+    """
+    page_cache_alias = 'fragments'
+
+    def get_page_version(self):
+        state = self.get_queryset().aggregate(last_modified=Max('modifiedat'), count=Count('pk'))
+        return f"{state['last_modified']}:{state['count']}"
+
+    def get_page_cache_key(self):
+        key = ':'.join((
+            str(self.request.user.pk),
+            self.request.get_full_path(),
+            self.request.COOKIES[settings.CSRF_COOKIE_NAME],
+            self.get_page_version(),
+        ))
+        return f'page:{self.__class__.__name__}:{hashlib.md5(key.encode()).hexdigest()}'
+
+    def get(self, request, *args, **kwargs):
+        # Страница с уведомлениями одноразовая, а без CSRF-cookie токен в
+        # формах будет выдан заново - такие страницы не кэшируются
+        if len(messages.get_messages(request)) or settings.CSRF_COOKIE_NAME not in request.COOKIES:
+            return super().get(request, *args, **kwargs)
+
+        cache = caches[self.page_cache_alias]
+        key = self.get_page_cache_key()
+        content = cache.get(key)
+        if content is not None:
+            return HttpResponse(content)
+
+        response = super().get(request, *args, **kwargs)
+        response.add_post_render_callback(
+            lambda response: cache.set(key, response.content, settings.PAGE_CACHE_TIMEOUT)
+        )
+        return response
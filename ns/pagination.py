@@ -0,0 +1,117 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+class KeysetPage:
+    """Страница выборки с курсором следующей страницы"""
+
+    def __init__(self, object_list, cursor, next_cursor):
+        self.object_list = object_list
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Постраничный вывод по ключу (keyset/cursor) вместо OFFSET.
+
+    Выборка упорядочивается по уникальному в пределах queryset полю key
+    ('-' в начале - по убыванию), следующая страница начинается после
+    значения ключа последней записи. Стоимость страницы не зависит от ее
+    номера, если порядок поддержан индексом.
+    """
+
+    def __init__(self, queryset, key, per_page):
+        self.queryset = queryset
+        self.key = key
+        self.per_page = per_page
+        self.descending = key.startswith('-')
+        self.field = queryset.model._meta.get_field(key.lstrip('-'))
+
+    def _page_queryset(self, cursor):
+        queryset = self.queryset.order_by(self.key)
+        if cursor in (None, ''):
+            return queryset
+        try:
+            value = self.field.to_python(cursor)
+        except ValidationError:
+            raise InvalidPage('Некорректный курсор страницы')
+        lookup = 'lt' if self.descending else 'gt'
+        return queryset.filter(**{f'{self.field.name}__{lookup}': value})
+
+    def _make_page(self, items, cursor):
+        next_cursor = None
+        if len(items) > self.per_page:
+            items = items[:self.per_page]
+            next_cursor = self.field.value_to_string(items[-1])
+        return KeysetPage(items, cursor or None, next_cursor)
+
+    def page(self, cursor=None):
+        items = list(self._page_queryset(cursor)[:self.per_page + 1])
+        return self._make_page(items, cursor)
+
+    async def apage(self, cursor=None):
+        items = [obj async for obj in self._page_queryset(cursor)[:self.per_page + 1]]
+        return self._make_page(items, cursor)
+
+
+async def apaginate(queryset, per_page, number):
+    """
+    Асинхронный постраничный вывод по номеру страницы.
+    Возвращает Paginator и Page с уже загруженными записями.
+    """
+    paginator = Paginator(queryset, per_page)
+    # count - cached_property, подставляем значение, посчитанное асинхронно
+    paginator.count = await queryset.acount()
+    if number == 'last':
+        number = paginator.num_pages
+    page = paginator.page(number)
+    page.object_list = [obj async for obj in page.object_list]
+    return paginator, page
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Постраничный вывод с оценкой количества строк по плану PostgreSQL.
+
+    Точный COUNT(*) большой таблицы читает ее целиком. Количество строк
+    берется из EXPLAIN (оценка планировщика по статистике), и только если
+    оценка меньше exact_count_limit, выполняется точный подсчет.
+    Номер последней страницы для больших выборок приблизительный.
+    """
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet) or not queryset.query.can_filter():
+            return super().count
+        estimate = self.estimate(queryset)
+        if estimate is None or estimate < self.exact_count_limit:
+            return super().count
+        return estimate
+
+    @staticmethod
+    def estimate(queryset):
+        """Оценка количества строк выборки или None, если БД не PostgreSQL"""
+        if connections[queryset.db].vendor != 'postgresql':
+            return None
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
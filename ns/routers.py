@@ -0,0 +1,81 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class RoutingState:
+    """Маршрутизация запросов к БД в текущем запросе/задаче"""
+
+    def __init__(self, pinned=False):
+        # Чтения разрешено направлять на реплики (внутри replica_reads)
+        self.replica_reads = False
+        # Чтения закреплены за основной БД: была запись в этом или недавнем запросе
+        self.pinned = pinned
+        # В текущем запросе выполнялась запись
+        self.wrote = False
+        # Реплика выбирается один раз, чтобы все чтения видели одинаковые данные
+        self.replica = None
+
+
+_state = ContextVar('db_routing_state', default=None)
+
+
+def current_state():
+    state = _state.get()
+    if state is None:
+        state = RoutingState()
+        _state.set(state)
+    return state
+
+
+@contextmanager
+def replica_reads():
+    """
+    Чтения внутри блока направляются на реплику, если реплики настроены,
+    чтение не внутри транзакции и в запросе еще не было записи.
+    """
+    state = current_state()
+    previous = state.replica_reads
+    state.replica_reads = True
+    try:
+        yield
+    finally:
+        state.replica_reads = previous
+
+
+class ReplicaRouter:
+    """
+    Маршрутизатор основной БД и реплик для чтения (DATABASE_REPLICAS).
+    Запись и миграции - только в основную БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if not settings.DATABASE_REPLICAS or state is None:
+            return None
+        if not state.replica_reads or state.pinned:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Внутри транзакции читаем то, что в ней записано
+            return None
+        if state.replica is None:
+            state.replica = random.choice(settings.DATABASE_REPLICAS)
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,50 @@
+import operator
+from functools import reduce
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import F, Q
+
+# Конфигурация полнотекстового поиска PostgreSQL: русская морфология
+SEARCH_CONFIG = 'russian'
+
+
+def search_vector(*fields):
+    """
+    Выражение tsvector по полям модели для GeneratedField.
+    fields - пары (поле, вес от 'A' до 'D').
+    """
+    return reduce(operator.add, [
+        SearchVector(name, weight=weight, config=SEARCH_CONFIG) for name, weight in fields
+    ])
+
+
+def search_query(text):
+    """Запрос в синтаксисе веб-поиска: слова, "фразы", -исключения, or"""
+    return SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+
+
+def search(queryset, text, field='search_vector'):
+    """Записи, подходящие под запрос, в порядке релевантности (annotate rank)"""
+    query = search_query(text)
+    return queryset.filter(**{field: query}).annotate(
+        rank=SearchRank(F(field), query)
+    ).order_by('-rank', 'pk')
+
+
+class FullTextSearchMixin:
+    """
+    Поиск в админке по поисковым векторам (GIN-индекс) вместо icontains.
+    search_fields нужны только для отображения строки поиска,
+    search_exact_fields сравниваются со строкой поиска целиком (логин и т.п.).
+    """
+    search_vector_fields = ('search_vector',)
+    search_exact_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        query = search_query(search_term)
+        conditions = [Q(**{field: query}) for field in self.search_vector_fields]
+        conditions += [Q(**{field: search_term}) for field in self.search_exact_fields]
+        return queryset.filter(reduce(operator.or_, conditions)), False
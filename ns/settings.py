@@ -1,5 +1,5 @@
 import os
-from decouple import config, Csv
+from decouple import config, Choices, Csv
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -18,6 +18,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'crispy_forms',
     'crispy_bootstrap5',
     'users',
@@ -26,7 +27,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ns.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'ns.middleware.PrimaryPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -40,7 +43,9 @@ ROOT_URLCONF = 'ns.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Шаблоны Django с замером времени отрисовки для InstrumentationMiddleware
+        'BACKEND': 'ns.instrumentation.InstrumentedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -49,6 +54,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'users.context_processors.email_verification',
             ],
         },
     },
@@ -64,9 +70,57 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': False,
+        'OPTIONS': {},
     }
 }
 
+# Режим соединений с БД:
+# none - новое соединение на каждый запрос;
+# persistent - соединение процесса/потока переиспользуется DB_CONN_MAX_AGE секунд
+#   (gunicorn с синхронными воркерами);
+# pool - пул соединений psycopg 3, нужен пакет psycopg[pool] (ASGI, потоковые воркеры)
+DB_CONNECTION_MODE = config(
+    'DB_CONNECTION_MODE', default='persistent', cast=Choices(['none', 'persistent', 'pool'])
+)
+if DB_CONNECTION_MODE == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=60, cast=int)
+    # Перед повторным использованием соединение проверяется, разорванное открывается заново
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool)
+elif DB_CONNECTION_MODE == 'pool':
+    # С CONN_HEALTH_CHECKS Django передает пулу проверку соединения при выдаче
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+        'max_idle': config('DB_POOL_MAX_IDLE', default=600, cast=float),
+    }
+
+# Реплики для чтения: список host[:port][/dbname] через запятую, например
+# DB_REPLICAS=replica1.local,replica2.local:5433 или localhost/ns_db_replica.
+# Пользователь, пароль и режим соединений - как у основной БД.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(config('DB_REPLICAS', default='', cast=Csv()), start=1):
+    address, _, name = replica.partition('/')
+    host, _, port = address.partition(':')
+    alias = f'replica{number}'
+    DATABASES[alias] = dict(
+        DATABASES['default'],
+        HOST=host,
+        PORT=port or DATABASES['default']['PORT'],
+        NAME=name or DATABASES['default']['NAME'],
+        # В тестах реплика - зеркало тестовой основной БД
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['ns.routers.ReplicaRouter']
+
+# Сколько секунд после записи чтения клиента идут в основную БД (задержка репликации)
+REPLICA_PIN_SECONDS = config('DB_REPLICA_PIN_SECONDS', default=5, cast=int)
+
 if DEBUG:
     AUTH_PASSWORD_VALIDATORS = []
 else:
@@ -89,6 +143,63 @@ DEFAULT_FROM_EMAIL = config('EMAIL_FROM', default=EMAIL_HOST_USER)
 DEFAULT_SERVER_EMAIL = config('SERVER_EMAIL',default=EMAIL_HOST_USER)
 EMAIL_SUBJECT_PREFIX = config('EMAIL_SUBJECT_PREFIX',default='[NS Platform] ')
 
+# Адрес сайта для ссылок в письмах, отправляемых вне запроса
+SITE_URL = config('SITE_URL', default='http://localhost:8000')
+
+# Очередь исходящих писем
+EMAIL_OUTBOX_BATCH_SIZE = config('EMAIL_OUTBOX_BATCH_SIZE', default=50, cast=int)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+EMAIL_OUTBOX_RETRY_DELAY = config('EMAIL_OUTBOX_RETRY_DELAY', default=60, cast=int)
+# Через сколько дней отправленные и неотправленные письма удаляются командой purge_outbox
+EMAIL_OUTBOX_RETENTION_DAYS = config('EMAIL_OUTBOX_RETENTION_DAYS', default=30, cast=int)
+
+# Время жизни кэша справочников в памяти процесса (секунды)
+LOOKUP_CACHE_TIMEOUT = config('LOOKUP_CACHE_TIMEOUT', default=300, cast=int)
+
+# Время жизни кэша статуса подтверждения email (секунды)
+EMAIL_VERIFIED_CACHE_TIMEOUT = config('EMAIL_VERIFIED_CACHE_TIMEOUT', default=300, cast=int)
+
+# Кэш: locmem - в памяти процесса (по умолчанию, тесты), file - каталог
+# CACHE_LOCATION, redis - сервер CACHE_LOCATION (redis://host:6379/0, пакет redis).
+# default - данные приложения, fragments - отрисованные фрагменты и страницы.
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem', cast=Choices(['locmem', 'file', 'redis']))
+CACHE_LOCATION = config('CACHE_LOCATION', default='')
+# Время жизни кэша страниц списков (секунды); фрагменты строк живут сутки
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=300, cast=int)
+
+
+def cache_settings(name):
+    if CACHE_BACKEND == 'file':
+        return {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(CACHE_LOCATION or BASE_DIR / '.cache', name),
+        }
+    if CACHE_BACKEND == 'redis':
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_LOCATION or 'redis://localhost:6379/0',
+            'KEY_PREFIX': name,
+        }
+    return {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': name,
+    }
+
+
+CACHES = {
+    'default': cache_settings('default'),
+    'fragments': dict(cache_settings('fragments'), TIMEOUT=24 * 60 * 60),
+}
+
+# Замеры запросов: заголовок Server-Timing, окно замеров на URL для
+# /admin/metrics/ и бюджет запросов к БД по умолчанию для представления
+SERVER_TIMING = config('SERVER_TIMING', default=True, cast=bool)
+METRICS_WINDOW = config('METRICS_WINDOW', default=1000, cast=int)
+QUERY_BUDGET = config('QUERY_BUDGET', default=30, cast=int)
+
+# Асинхронные представления списков и карточек целей и сессий (для запуска под ASGI)
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
 LANGUAGE_CODE = 'ru-ru'
 TIME_ZONE = 'Europe/Moscow'
 USE_I18N = True
@@ -0,0 +1,251 @@
+import os
+import runpy
+from importlib.util import find_spec
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.db import router
+from django.http import HttpResponse
+from django.template import engines
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import ResolverMatch, reverse
+
+from goals.models import GoalsBacklog, GoalResultType, GoalType
+from users.models import NSUser, UserProfile
+from .admin_filters import LookupListFilter
+from .lookups import warm_lookup_caches
+from .instrumentation import MetricsRegistry, RequestMetrics, metrics_registry, query_budget_exceeded
+from .middleware import PRIMARY_PIN_COOKIE, InstrumentationMiddleware, PrimaryPinMiddleware
+from .routers import replica_reads
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=5)
+class ReplicaRouterTests(SimpleTestCase):
+    def run_request(self, view, cookies=None):
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies or {})
+        return PrimaryPinMiddleware(view)(request)
+
+    def test_reads_go_to_replica_only_inside_block(self):
+        def view(request):
+            self.assertEqual(router.db_for_read(GoalsBacklog), 'default')
+            with replica_reads():
+                self.assertEqual(router.db_for_read(GoalsBacklog), 'replica1')
+            return HttpResponse()
+
+        response = self.run_request(view)
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+    def test_write_pins_reads_to_primary(self):
+        def view(request):
+            with replica_reads():
+                self.assertEqual(router.db_for_write(GoalsBacklog), 'default')
+                self.assertEqual(router.db_for_read(GoalsBacklog), 'default')
+            return HttpResponse()
+
+        response = self.run_request(view)
+        self.assertEqual(response.cookies[PRIMARY_PIN_COOKIE]['max-age'], 5)
+
+    def test_pin_cookie_keeps_reads_on_primary(self):
+        def view(request):
+            with replica_reads():
+                self.assertEqual(router.db_for_read(GoalsBacklog), 'default')
+            return HttpResponse()
+
+        response = self.run_request(view, cookies={PRIMARY_PIN_COOKIE: '1'})
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(router.allow_migrate('replica1', 'goals'))
+        self.assertTrue(router.allow_migrate('default', 'goals'))
+
+
+@override_settings(QUERY_BUDGET=1, SERVER_TIMING=True, METRICS_WINDOW=3)
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics_registry.clear()
+        self.addCleanup(metrics_registry.clear)
+
+    def run_request(self, view):
+        request = RequestFactory().get('/goals/')
+        request.resolver_match = ResolverMatch(view, (), {}, url_name='goal_list')
+        return InstrumentationMiddleware(view)(request)
+
+    def test_server_timing_and_registry(self):
+        def view(request):
+            GoalsBacklog.objects.count()
+            return HttpResponse(engines['django'].from_string('{{ value }}').render())
+
+        response = self.run_request(view)
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+        [row] = metrics_registry.summary()
+        self.assertEqual(row['view_name'], 'goal_list')
+        self.assertEqual(row['count'], 1)
+        self.assertEqual(row['queries_p50'], 1)
+
+    def test_query_budget_signal(self):
+        received = []
+
+        def receiver(sender, **kwargs):
+            received.append((kwargs['view_name'], kwargs['queries'], kwargs['budget']))
+
+        query_budget_exceeded.connect(receiver)
+        self.addCleanup(query_budget_exceeded.disconnect, receiver)
+
+        def view(request):
+            GoalsBacklog.objects.count()
+            GoalsBacklog.objects.exists()
+            return HttpResponse()
+
+        with self.assertLogs('ns.instrumentation', 'WARNING'):
+            self.run_request(view)
+        self.assertEqual(received, [('goal_list', 2, 1)])
+
+        # Бюджет представления важнее общего
+        view.query_budget = 5
+        self.run_request(view)
+        self.assertEqual(len(received), 1)
+
+    async def test_queries_are_counted_under_asgi(self):
+        user = await sync_to_async(NSUser.objects.create_user)('metrics', 'metrics@example.com', 'password')
+        await UserProfile.objects.filter(user=user).aupdate(email_verified=True)
+        await self.async_client.aforce_login(user)
+
+        # Синхронное представление выполняется в потоке sync_to_async
+        response = await self.async_client.get(reverse('goal_list'))
+        self.assertEqual(response.status_code, 200)
+        queries = int(response['Server-Timing'].split('desc="')[1].split()[0])
+        self.assertGreater(queries, 0)
+        [row] = metrics_registry.summary()
+        self.assertEqual(row['queries_p50'], queries)
+
+    def test_registry_percentiles_and_window(self):
+        registry = MetricsRegistry()
+        for queries in (1, 2, 3, 10):
+            metrics = RequestMetrics()
+            metrics.queries = queries
+            registry.record('goal_list', metrics)
+        [row] = registry.summary()
+        # В окне остаются последние METRICS_WINDOW замеров
+        self.assertEqual(row['count'], 3)
+        self.assertEqual(row['queries_p50'], 3)
+        self.assertEqual(row['queries_p99'], 10)
+
+
+class LookupCacheTests(TestCase):
+    def setUp(self):
+        GoalType.lookups.invalidate()
+        self.addCleanup(GoalType.lookups.invalidate)
+        self.goal_type = GoalType.objects.create(type_name='Справочная')
+
+    def test_lookups_are_served_from_memory(self):
+        GoalType.lookups.all()
+        with self.assertNumQueries(0):
+            self.assertEqual(GoalType.lookups.get(self.goal_type.pk), self.goal_type)
+            self.assertEqual(GoalType.lookups.get_by_name('Справочная'), self.goal_type)
+            self.assertIn((self.goal_type.pk, 'Справочная'), GoalType.lookups.choices())
+            self.assertIsNone(GoalType.lookups.get(-1))
+
+    @override_settings(LOOKUP_CACHE_TIMEOUT=60)
+    def test_cache_is_reloaded_after_timeout(self):
+        with mock.patch('ns.lookups.time.monotonic', return_value=1000):
+            GoalType.lookups.all()
+            with self.assertNumQueries(0):
+                GoalType.lookups.all()
+        with mock.patch('ns.lookups.time.monotonic', return_value=1059):
+            with self.assertNumQueries(0):
+                GoalType.lookups.all()
+        with mock.patch('ns.lookups.time.monotonic', return_value=1060):
+            with self.assertNumQueries(1):
+                GoalType.lookups.all()
+
+    def test_changes_invalidate_cache(self):
+        GoalType.lookups.all()
+        self.goal_type.type_name = 'Переименованная'
+        self.goal_type.save()
+        self.assertIsNone(GoalType.lookups.get_by_name('Справочная'))
+        self.assertEqual(GoalType.lookups.get(self.goal_type.pk).type_name, 'Переименованная')
+
+        pk = self.goal_type.pk
+        self.goal_type.delete()
+        self.assertIsNone(GoalType.lookups.get(pk))
+
+    def test_attach_sets_related_objects(self):
+        user = NSUser.objects.create_user('lookup', 'lookup@example.com', 'password')
+        result_type = GoalResultType.objects.create(type_name='Справочный результат')
+        GoalsBacklog.objects.create(
+            nsuser=user, goal_type=self.goal_type, goal_result_type=result_type,
+            goal_name='Цель', priority_weight=1,
+        )
+        goals = list(GoalsBacklog.objects.filter(nsuser=user))
+        GoalType.lookups.all()
+
+        self.assertEqual(GoalType.lookups.attach(goals, 'goal_type'), goals)
+        with self.assertNumQueries(0):
+            self.assertEqual(goals[0].goal_type.type_name, 'Справочная')
+        self.assertEqual(GoalType.lookups.attach([], 'goal_type'), [])
+
+    def test_warm_fills_caches_and_closes_connections(self):
+        with mock.patch('ns.lookups.connections') as connections:
+            warm_lookup_caches()
+        connections.close_all.assert_called_once_with()
+        with self.assertNumQueries(0):
+            self.assertEqual(GoalType.lookups.get(self.goal_type.pk), self.goal_type)
+
+    def test_list_filter_choices_come_from_cache(self):
+        field = GoalsBacklog._meta.get_field('goal_type')
+        model_admin = admin.site._registry[GoalsBacklog]
+        request = RequestFactory().get('/')
+        GoalType.lookups.all()
+
+        with self.assertNumQueries(0):
+            list_filter = LookupListFilter(field, request, {}, GoalsBacklog, model_admin, 'goal_type')
+        self.assertIn((self.goal_type.pk, 'Справочная'), list_filter.lookup_choices)
+
+
+class ConnectionModeSettingsTests(SimpleTestCase):
+    """Настройки соединений с БД для каждого значения DB_CONNECTION_MODE"""
+
+    def load_settings(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(str(settings.BASE_DIR / 'ns' / 'settings.py'))
+
+    def test_default_is_persistent(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('DB_CONNECTION_MODE', None)
+            loaded = self.load_settings()
+        self.assertEqual(loaded['DB_CONNECTION_MODE'], 'persistent')
+
+    def test_none(self):
+        database = self.load_settings(DB_CONNECTION_MODE='none')['DATABASES']['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertFalse(database['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('pool', database['OPTIONS'])
+
+    def test_persistent(self):
+        database = self.load_settings(
+            DB_CONNECTION_MODE='persistent', DB_CONN_MAX_AGE='30'
+        )['DATABASES']['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 30)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('pool', database['OPTIONS'])
+
+    @skipUnless(find_spec('psycopg_pool'), 'нужен пакет psycopg[pool]')
+    def test_pool(self):
+        database = self.load_settings(
+            DB_CONNECTION_MODE='pool', DB_POOL_MAX_SIZE='4'
+        )['DATABASES']['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('check', database['OPTIONS']['pool'])
+        self.assertEqual(database['OPTIONS']['pool']['max_size'], 4)
+        self.assertEqual(database['OPTIONS']['pool']['min_size'], 2)
+
+    def test_unknown_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.load_settings(DB_CONNECTION_MODE='pgbouncer')
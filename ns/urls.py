@@ -4,7 +4,10 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
 
+from .views import metrics_view
+
 urlpatterns = [
+    path('admin/metrics/', metrics_view, name='admin_metrics'),
     path('admin/', admin.site.urls),
     path('users/', include(('users.urls','users'),namespace='users')),
     path('goals/', include('goals.urls')),
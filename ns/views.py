@@ -0,0 +1,21 @@
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+
+from .instrumentation import metrics_registry
+
+
+@staff_member_required
+def metrics_view(request):
+    """Перцентили времени и количества запросов по URL (данные текущего процесса)"""
+    if request.method == 'POST':
+        metrics_registry.clear()
+        return redirect('admin_metrics')
+
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Замеры запросов',
+        'rows': metrics_registry.summary(),
+    }
+    return TemplateResponse(request, 'admin/metrics.html', context)
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ns.settings")
 
 application = get_wsgi_application()
+
+from ns.lookups import warm_lookup_caches  # noqa: E402
+
+warm_lookup_caches()
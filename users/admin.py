@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import gettext_lazy as _
-from .models import NSUser, NSRole,UserProfile
+from .models import NSUser, NSRole,UserProfile, EmailOutbox
 
 from .utils import send_verification_email
 
@@ -37,8 +37,19 @@ class NSRoleAdmin(admin.ModelAdmin):
     search_fields = ('rolename',)
 
 
+class EmailOutboxAdmin(admin.ModelAdmin):
+    """Админка для очереди исходящих писем"""
+    list_display = ('recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('recipient',)
+    # Текст письма содержит ссылку с токеном подтверждения и в админке не показывается
+    exclude = ('body',)
+    readonly_fields = ('createdat', 'modifiedat', 'sent_at', 'last_error')
+
+
 admin.site.register(NSUser, NSUserAdmin)
 admin.site.register(NSRole, NSRoleAdmin)
+admin.site.register(EmailOutbox, EmailOutboxAdmin)
 
 
 class UserProfileInline(admin.StackedInline):
@@ -67,7 +78,7 @@ class UserAdmin(UserAdmin):
                 send_verification_email(obj, request)
                 self.message_user(
                     request,
-                    f"Письмо для подтверждения email отправлено на {obj.email}"
+                    f"Письмо для подтверждения email поставлено в очередь для {obj.email}"
                 )
             except Exception as e:
                 self.message_user(
@@ -84,7 +95,7 @@ class UserAdmin(UserAdmin):
                     send_verification_email(user, request)
                     self.message_user(
                         request,
-                        f"Письмо отправлено на {user.email}"
+                        f"Письмо поставлено в очередь для {user.email}"
                     )
                 except Exception as e:
                     self.message_user(
@@ -92,6 +103,6 @@ class UserAdmin(UserAdmin):
                         f"Ошибка отправки для {user.email}: {str(e)}",
                         level='ERROR'
                     )
-        self.message_user(request, f"Письма отправлены выбранным пользователям")
+        self.message_user(request, f"Письма поставлены в очередь для выбранных пользователей")
 
     resend_verification_email.short_description = "Отправить письмо для подтверждения email"
\ No newline at end of file
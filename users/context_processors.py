@@ -0,0 +1,13 @@
+from .utils import is_email_verified
+
+
+def email_verification(request):
+    """
+    Статус подтверждения email для шаблонов.
+    Значение вычисляется лениво и берется из кэша, а не из user.profile,
+    чтобы отрисовка меню не добавляла запрос к профилю на каждой странице.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'email_verified': lambda: is_email_verified(user)}
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from users.models import UserProfile, VERIFICATION_TOKEN_TTL
+
+
+class Command(BaseCommand):
+    help = 'Удаляет просроченные токены подтверждения email (для запуска по расписанию)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество профилей, очищаемых одним запросом'
+        )
+
+    def handle(self, *args, **options):
+        expired = UserProfile.objects.filter(
+            verification_token__isnull=False,
+            token_created_at__lt=timezone.now() - VERIFICATION_TOKEN_TTL,
+        )
+
+        # Очищаем пачками, чтобы не держать блокировку на всей таблице
+        total = 0
+        while True:
+            ids = list(expired.values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            total += UserProfile.objects.filter(pk__in=ids).update(
+                verification_token=None,
+                token_created_at=None,
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Удалено просроченных токенов: {total}')
+        )
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from users.models import EmailOutbox
+
+
+class Command(BaseCommand):
+    help = 'Удаляет из очереди старые отправленные и неотправленные письма (для запуска по расписанию)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.EMAIL_OUTBOX_RETENTION_DAYS,
+            help='Сколько дней хранить обработанные письма'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество писем, удаляемых одним запросом'
+        )
+
+    def handle(self, *args, **options):
+        processed = EmailOutbox.objects.filter(
+            status__in=(EmailOutbox.STATUS_SENT, EmailOutbox.STATUS_FAILED),
+            modifiedat__lt=timezone.now() - timedelta(days=options['days']),
+        )
+
+        # Удаляем пачками, чтобы не держать блокировку на всей таблице
+        total = 0
+        while True:
+            ids = list(processed.values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            total += EmailOutbox.objects.filter(pk__in=ids).delete()[0]
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Удалено писем из очереди: {total}')
+        )
@@ -1,7 +1,37 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.mail import get_connection
 from django.core.management.base import BaseCommand
-from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models import Q
-from users.utils import send_verification_email
+from django.utils import timezone
+from users.models import EmailOutbox, UserProfile
+from users.outbox import delivery_lease, mark_results, send_entries
+from users.utils import build_verification_email
+
+
+class RateLimiter:
+    """Общее для всех потоков ограничение скорости отправки (писем в секунду)"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(self.next_time, now) + self.interval
+        if delay > 0:
+            time.sleep(delay)
 
 
 class Command(BaseCommand):
@@ -10,13 +40,34 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--all', action='store_true', help='Отправить всем пользователям')
         parser.add_argument('--emails', type=str, help='Список email через запятую')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Количество пользователей в одной пачке'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Количество потоков отправки, у каждого свое SMTP-соединение'
+        )
+        parser.add_argument(
+            '--rate-limit', type=float, default=0,
+            help='Максимум писем в секунду для всех потоков (0 - без ограничения)'
+        )
+        parser.add_argument(
+            '--checkpoint', type=str, default='.send_verifications.checkpoint',
+            help='Файл с прогрессом для продолжения прерванного запуска'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать заново, не учитывая сохраненный прогресс'
+        )
 
     def handle(self, *args, **options):
+        User = get_user_model()
         users = User.objects.all()
 
         if options['emails']:
             emails = [email.strip() for email in options['emails'].split(',')]
-            users = users.filter(email__in=emails)
+            users = users.filter(useremail__in=emails)
 
         if not options['all'] and not options['emails']:
             # По умолчанию только незавершенные
@@ -24,19 +75,100 @@ class Command(BaseCommand):
                 Q(profile__email_verified=False) | Q(profile__isnull=True)
             )
 
-        count = 0
-        for user in users:
-            try:
-                send_verification_email(user, None)
-                self.stdout.write(
-                    self.style.SUCCESS(f'Отправлено для {user.email}')
-                )
-                count += 1
-            except Exception as e:
+        users = users.order_by('pk')
+        checkpoint_key = f"{options['all']}:{options['emails'] or ''}"
+        last_pk = None if options['restart'] else self.read_checkpoint(options['checkpoint'], checkpoint_key)
+        if last_pk is not None:
+            self.stdout.write(f'Продолжение с пользователя id > {last_pk}')
+
+        limiter = RateLimiter(options['rate_limit'])
+        workers = max(options['workers'], 1)
+        lease = delivery_lease(options['batch_size'], workers, options['rate_limit'])
+        count = failed = 0
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                pending = users if last_pk is None else users.filter(pk__gt=last_pk)
+                chunk = list(pending[:options['batch_size']])
+                if not chunk:
+                    break
+
+                entries = self.enqueue_chunk(chunk, lease)
+                last_pk = chunk[-1].pk
+                self.write_checkpoint(options['checkpoint'], checkpoint_key, last_pk)
+
+                sent, errors = self.deliver(executor, entries, workers, limiter)
+                count += sent
+                failed += errors
                 self.stdout.write(
-                    self.style.ERROR(f'Ошибка для {user.email}: {str(e)}')
+                    f'Обработано до id {last_pk}: отправлено {sent}, ошибок {errors}'
                 )
 
+        if os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
+
+        if failed:
+            self.stdout.write(
+                self.style.WARNING(f'Не отправлено: {failed} писем, они будут повторены через process_outbox')
+            )
         self.stdout.write(
             self.style.SUCCESS(f'Всего отправлено: {count} писем')
-        )
\ No newline at end of file
+        )
+
+    @transaction.atomic
+    def enqueue_chunk(self, users, lease):
+        """Создание профилей, токенов и писем для пачки пользователей в одной транзакции"""
+        profiles = {
+            profile.user_id: profile
+            for profile in UserProfile.objects.filter(user__in=users)
+        }
+
+        missing = [UserProfile(user=user) for user in users if user.pk not in profiles]
+        for profile in UserProfile.objects.bulk_create(missing):
+            profiles[profile.user_id] = profile
+
+        deliver_at = timezone.now() + lease
+        entries = []
+        for user in users:
+            token = profiles[user.pk].set_verification_token()
+            subject, message = build_verification_email(user, token)
+            entries.append(EmailOutbox(
+                recipient=user.useremail,
+                subject=subject,
+                body=message,
+                next_attempt_at=deliver_at,
+            ))
+
+        UserProfile.objects.bulk_update(
+            profiles.values(), ['verification_token', 'token_created_at']
+        )
+        return EmailOutbox.objects.bulk_create(entries)
+
+    def deliver(self, executor, entries, workers, limiter):
+        """Параллельная отправка пачки: каждый поток использует одно соединение"""
+        size = -(-len(entries) // workers)
+        parts = [entries[i:i + size] for i in range(0, len(entries), size)]
+
+        errors = {}
+        for result in executor.map(
+            lambda part: send_entries(part, get_connection(), throttle=limiter.wait), parts
+        ):
+            errors.update(result)
+
+        mark_results(entries, errors)
+        return len(entries) - len(errors), len(errors)
+
+    def read_checkpoint(self, path, key):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('key') != key:
+            self.stdout.write(self.style.WARNING('Сохраненный прогресс относится к другому запуску и будет проигнорирован'))
+            return None
+        return data.get('last_pk')
+
+    def write_checkpoint(self, path, key, last_pk):
+        with open(path, 'w') as f:
+            json.dump({'key': key, 'last_pk': last_pk}, f)
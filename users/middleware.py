@@ -1,37 +1,76 @@
 # users/middleware.py
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.contrib import messages
 
+from .utils import ais_email_verified, is_email_verified
+
 
 class EmailVerificationMiddleware:
+    """
+    Перенаправление пользователей с неподтвержденным email на страницу
+    повторной отправки письма.
+
+    Работает и в синхронном, и в асинхронном режиме: под ASGI проверка
+    выполняется в цикле событий без переключения в поток.
+    """
+    sync_capable = True
+    async_capable = True
+
+    # Имена URL, доступные пользователю без подтвержденного email
+    excluded_url_names = (
+        'users:logout',
+        'users:resend_verification',
+        'users:login',
+        'users:register',
+        'admin:login',
+        'admin:index',
+    )
+    excluded_prefixes = ('/admin/',)
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self._excluded_paths = None
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        response = self.get_response(request)
-        return response
-
-    def process_view(self, request, view_func, view_args, view_kwargs):
-        # Исключаем определенные пути из проверки
-        excluded_paths = [
-            reverse('users:logout'),
-            reverse('users:resend_verification'),
-           # reverse('users:verify_email'),
-            reverse('users:login'),
-            reverse('users:register'),
-            reverse('admin:login'),
-            reverse('admin:index'),
-        ]
-
-        if request.user.is_authenticated and not request.path.startswith('/admin/'):
-            # Проверяем, подтвержден ли email
-            if hasattr(request.user, 'profile') and not request.user.profile.email_verified:
-                if request.path not in excluded_paths:
-                    messages.warning(
-                        request,
-                        'Пожалуйста, подтвердите ваш email для полного доступа к системе.'
-                    )
-                    return redirect('users:resend_verification')
-
-        return None
\ No newline at end of file
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if self.is_checked(request, request.user) and not is_email_verified(request.user):
+            return self.verification_required(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        user = await request.auser()
+        # Пользователь уже загружен: синхронный request.user не должен
+        # обращаться к БД из цикла событий при отрисовке шаблонов
+        request.user = user
+
+        if self.is_checked(request, user) and not await ais_email_verified(user):
+            return self.verification_required(request)
+        return await self.get_response(request)
+
+    @property
+    def excluded_paths(self):
+        """Пути, исключенные из проверки (вычисляются один раз на процесс)"""
+        if self._excluded_paths is None:
+            self._excluded_paths = frozenset(
+                reverse(name) for name in self.excluded_url_names
+            )
+        return self._excluded_paths
+
+    def is_checked(self, request, user):
+        """Нужна ли проверка email: дешевые проверки без обращения к кэшу/БД"""
+        if not user.is_authenticated:
+            return False
+        return not (request.path.startswith(self.excluded_prefixes) or request.path in self.excluded_paths)
+
+    def verification_required(self, request):
+        messages.warning(
+            request,
+            'Пожалуйста, подтвердите ваш email для полного доступа к системе.'
+        )
+        return redirect('users:resend_verification')
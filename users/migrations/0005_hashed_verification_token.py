@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-18 16:09
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_existing_tokens(apps, schema_editor):
+    UserProfile = apps.get_model("users", "UserProfile")
+    profiles = list(UserProfile.objects.exclude(verification_token__isnull=True))
+    for profile in profiles:
+        profile.verification_token = hashlib.sha256(
+            profile.verification_token.encode()
+        ).hexdigest()
+    UserProfile.objects.bulk_update(profiles, ["verification_token"], batch_size=1000)
+
+
+def clear_hashed_tokens(apps, schema_editor):
+    # Исходные токены из хэшей не восстановить, ссылки придется отправить заново
+    UserProfile = apps.get_model("users", "UserProfile")
+    UserProfile.objects.update(verification_token=None, token_created_at=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_email_outbox"),
+    ]
+
+    operations = [
+        migrations.RunPython(hash_existing_tokens, clear_hashed_tokens),
+        migrations.AlterField(
+            model_name="userprofile",
+            name="verification_token",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="userprofile",
+            index=models.Index(
+                condition=models.Q(("verification_token__isnull", False)),
+                fields=["token_created_at"],
+                name="userprofile_token_expiry_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="userprofile",
+            constraint=models.UniqueConstraint(
+                fields=("verification_token",), name="unique_verification_token"
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-18 16:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_profiles(apps, schema_editor):
+    # Оставляем по одному профилю на пользователя: подтвержденный, иначе самый ранний
+    UserProfile = apps.get_model("users", "UserProfile")
+    duplicated = (
+        UserProfile.objects.values("user_id")
+        .annotate(total=Count("id"))
+        .filter(total__gt=1)
+        .values_list("user_id", flat=True)
+    )
+    for user_id in duplicated:
+        keep = (
+            UserProfile.objects.filter(user_id=user_id)
+            .order_by("-email_verified", "id")
+            .first()
+        )
+        UserProfile.objects.filter(user_id=user_id).exclude(pk=keep.pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0005_hashed_verification_token"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_profiles, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="userprofile",
+            name="user",
+            field=models.OneToOneField(
+                db_column="user_id",
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="profile",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
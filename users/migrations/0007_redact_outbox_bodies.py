@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-18 19:20
+
+from django.db import migrations
+
+
+def redact_processed_bodies(apps, schema_editor):
+    # Тексты уже обработанных писем содержат ссылки с исходными токенами
+    EmailOutbox = apps.get_model("users", "EmailOutbox")
+    EmailOutbox.objects.filter(status__in=("sent", "failed")).exclude(body="").update(body="")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0006_one_to_one_profile"),
+    ]
+
+    operations = [
+        migrations.RunPython(redact_processed_bodies, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,27 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.db import models
+from django.db import models, transaction
+from django.core.mail import EmailMessage
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
+import hashlib
 import uuid
 from datetime import timedelta
 
+from ns.lookups import LookupCache
+
+from .utils import invalidate_email_verified
+
+# Срок действия ссылки подтверждения email
+VERIFICATION_TOKEN_TTL = timedelta(hours=24)
+
+
+def hash_verification_token(token):
+    """Хэш токена верификации: в БД хранится только он, а не сам токен"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
 
 
 class NSUserManager(BaseUserManager):
@@ -31,6 +46,20 @@ class NSUserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    def bulk_create_with_profiles(self, users, batch_size=None):
+        """
+        Массовое создание пользователей вместе с профилями.
+        Сигнал post_save при bulk_create не вызывается, поэтому профили
+        создаются одним bulk_create в той же транзакции.
+        """
+        with transaction.atomic(using=self.db):
+            users = self.bulk_create(users, batch_size=batch_size)
+            UserProfile.objects.using(self.db).bulk_create(
+                [UserProfile(user=user) for user in users],
+                batch_size=batch_size
+            )
+        return users
+
     def create_superuser(self, userlogin, useremail, password=None, **extra_fields):
         """
         Создает и возвращает суперпользователя.
@@ -108,45 +137,109 @@ class NSUser(AbstractBaseUser, PermissionsMixin):
 
 class UserProfile(models.Model):
     id = models.AutoField(primary_key=True, verbose_name=_('ID'))
-    user = models.ForeignKey(
+    user = models.OneToOneField(
         NSUser,
         on_delete=models.CASCADE,
         db_column='user_id',
         related_name='profile')
     email_verified = models.BooleanField(default=False)
-    verification_token = models.CharField(max_length=100, blank=True, null=True)
+    verification_token = models.CharField(max_length=64, blank=True, null=True)
     token_created_at = models.DateTimeField(null=True, blank=True)
     verification_sent_at = models.DateTimeField(null=True, blank=True)
 
+    # Поля, изменения которых отслеживаются при сохранении профиля
+    tracked_fields = ('email_verified', 'verification_token', 'token_created_at', 'verification_sent_at')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['verification_token'],
+                name='unique_verification_token'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['token_created_at'],
+                condition=models.Q(verification_token__isnull=False),
+                name='userprofile_token_expiry_idx'
+            )
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loaded_values = self._tracked_values()
+
+    def _tracked_values(self):
+        # Отложенные (deferred) поля не попадают в __dict__ и не загружаются
+        return {name: self.__dict__[name] for name in self.tracked_fields if name in self.__dict__}
+
+    def get_dirty_fields(self):
+        """Поля профиля, измененные после загрузки из БД"""
+        return [
+            name for name, value in self._tracked_values().items()
+            if name not in self._loaded_values or self._loaded_values[name] != value
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Сохранение только измененных полей.
+        Если поля профиля не менялись, запрос к БД не выполняется.
+        """
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            dirty_fields = self.get_dirty_fields()
+            if not dirty_fields:
+                return
+            kwargs['update_fields'] = dirty_fields
+        super().save(*args, **kwargs)
+        self._loaded_values = self._tracked_values()
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._loaded_values = self._tracked_values()
+
+    def set_verification_token(self):
+        """
+        Генерация нового токена верификации без сохранения (для bulk_update).
+        Возвращает токен для ссылки, в профиле сохраняется его хэш.
+        """
+        token = uuid.uuid4().hex
+        self.verification_token = hash_verification_token(token)
+        self.token_created_at = timezone.now()
+        return token
+
     def generate_verification_token(self):
         """Генерация нового токена верификации"""
-        self.verification_token = uuid.uuid4().hex
-        self.token_created_at = timezone.now()
+        token = self.set_verification_token()
         self.save()
-        return self.verification_token
+        return token
 
     def is_token_valid(self):
         """Проверка валидности токена (24 часа)"""
         if not self.token_created_at or not self.verification_token:
             return False
-        return timezone.now() < self.token_created_at + timedelta(hours=24)
+        return timezone.now() < self.token_created_at + VERIFICATION_TOKEN_TTL
 
     def __str__(self):
         return f"{self.user.username} - {'Verified' if self.email_verified else 'Not Verified'}"
 
 
 @receiver(post_save, sender=NSUser)
-def create_user_profile(sender, instance, created, **kwargs):
-    """Создание профиля при создании пользователя"""
-    if created:
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    """
+    Создание профиля при создании пользователя.
+    Профиль сохраняется явно через profile.save(), поэтому обычные
+    сохранения пользователя (например, обновление last_login при входе)
+    не затрагивают таблицу профилей.
+    """
+    if created and not raw:
         UserProfile.objects.create(user=instance)
 
 
-@receiver(post_save, sender=NSUser)
-def save_user_profile(sender, instance, **kwargs):
-    """Сохранение профиля при сохранении пользователя"""
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def reset_email_verified_cache(sender, instance, **kwargs):
+    """Сброс кэша статуса подтверждения email при изменении профиля"""
+    invalidate_email_verified(instance.user_id)
 
 class NSRole(models.Model):
     """Модель ролей системы (таблица nsroles)"""
@@ -167,6 +260,9 @@ class NSRole(models.Model):
         auto_now=True
     )
 
+    # Кэш справочника в памяти процесса
+    lookups = LookupCache('rolename')
+
     class Meta:
         db_table = 'nsroles'
         verbose_name = _('Роль системы')
@@ -174,4 +270,90 @@ class NSRole(models.Model):
         ordering = ['id']
 
     def __str__(self):
-        return self.rolename
\ No newline at end of file
+        return self.rolename
+
+
+class EmailOutbox(models.Model):
+    """Очередь исходящих писем (таблица email_outbox)"""
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _('Ожидает отправки')),
+        (STATUS_SENT, _('Отправлено')),
+        (STATUS_FAILED, _('Ошибка отправки')),
+    )
+
+    id = models.AutoField(primary_key=True, verbose_name=_('ID'))
+    recipient = models.EmailField(
+        _('Получатель'),
+        max_length=250
+    )
+    subject = models.CharField(
+        _('Тема письма'),
+        max_length=250
+    )
+    body = models.TextField(
+        _('Текст письма')
+    )
+    status = models.CharField(
+        _('Статус'),
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(
+        _('Количество попыток'),
+        default=0
+    )
+    next_attempt_at = models.DateTimeField(
+        _('Время следующей попытки'),
+        default=timezone.now
+    )
+    last_error = models.TextField(
+        _('Последняя ошибка'),
+        blank=True,
+        default=''
+    )
+    sent_at = models.DateTimeField(
+        _('Дата и время отправки'),
+        null=True,
+        blank=True
+    )
+
+    # Служебные поля с DateTimeField
+    createdat = models.DateTimeField(
+        _('Дата и время создания'),
+        default=timezone.now,
+        editable=False
+    )
+    modifiedat = models.DateTimeField(
+        _('Дата и время последнего изменения'),
+        auto_now=True
+    )
+
+    class Meta:
+        db_table = 'email_outbox'
+        verbose_name = _('Исходящее письмо')
+        verbose_name_plural = _('Исходящие письма')
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(status='pending'),
+                name='email_outbox_pending_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.recipient}: {self.subject} ({self.get_status_display()})"
+
+    def as_message(self, connection=None):
+        """Письмо Django для отправки через указанное соединение"""
+        return EmailMessage(
+            self.subject,
+            self.body,
+            settings.DEFAULT_FROM_EMAIL,
+            [self.recipient],
+            connection=connection,
+        )
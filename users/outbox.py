@@ -0,0 +1,137 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+# Максимальная задержка между повторными попытками отправки
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+# Захваченные для отправки письма откладываются для других обработчиков на
+# оценку времени отправки (delivery_lease) плюс этот запас. Если обработчик
+# прерван до записи результатов, письма снова выбираются после этого срока.
+DELIVERY_LEASE = timedelta(minutes=10)
+
+# Оценка времени отправки одного письма потоком без ограничения скорости
+SEND_TIME_ALLOWANCE = timedelta(seconds=1)
+
+
+def enqueue_email(subject, body, recipients):
+    """Постановка письма в очередь вместо синхронной отправки"""
+    return EmailOutbox.objects.bulk_create([
+        EmailOutbox(recipient=recipient, subject=subject, body=body)
+        for recipient in recipients
+    ])
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка перед следующей попыткой"""
+    delay = timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+    return min(delay, MAX_RETRY_DELAY)
+
+
+def delivery_lease(batch_size, workers=1, rate_limit=0):
+    """
+    Срок, на который письма пачки скрываются от других обработчиков.
+    Оценка времени отправки пачки (по ограничению скорости или по числу
+    писем на поток) берется с двойным запасом и добавляется к DELIVERY_LEASE.
+    """
+    per_worker = SEND_TIME_ALLOWANCE * -(-batch_size // max(workers, 1))
+    throttled = timedelta(seconds=batch_size / rate_limit) if rate_limit else timedelta(0)
+    return DELIVERY_LEASE + 2 * max(per_worker, throttled)
+
+
+def claim_batch(batch_size):
+    """
+    Захват пачки писем, готовых к отправке, в короткой транзакции.
+    Строки выбираются с SKIP LOCKED, поэтому несколько обработчиков могут
+    разбирать очередь одновременно, и откладываются на delivery_lease:
+    отправка идет уже после фиксации, без открытой транзакции и блокировок.
+    """
+    with transaction.atomic():
+        entries = list(
+            EmailOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=EmailOutbox.STATUS_PENDING, next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if entries:
+            EmailOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+                next_attempt_at=timezone.now() + delivery_lease(len(entries))
+            )
+    return entries
+
+
+def send_entries(entries, connection, throttle=None):
+    """
+    Отправка писем через одно открытое SMTP-соединение.
+    throttle вызывается перед каждым письмом для ограничения скорости.
+    Возвращает словарь {id письма: текст ошибки} для неотправленных писем.
+    """
+    try:
+        connection.open()
+    except Exception as e:
+        return {entry.pk: str(e) for entry in entries}
+
+    errors = {}
+    try:
+        for entry in entries:
+            if throttle is not None:
+                throttle()
+            try:
+                connection.send_messages([entry.as_message(connection)])
+            except Exception as e:
+                errors[entry.pk] = str(e)
+    finally:
+        connection.close()
+    return errors
+
+
+def mark_results(entries, errors):
+    """
+    Сохранение результатов отправки одним запросом.
+    У отправленных и окончательно неотправленных писем текст стирается:
+    в нем могут быть ссылки с токенами, которые не должны храниться в БД.
+    """
+    now = timezone.now()
+    for entry in entries:
+        entry.attempts += 1
+        entry.modifiedat = now
+        error = errors.get(entry.pk)
+        if error is None:
+            entry.status = EmailOutbox.STATUS_SENT
+            entry.sent_at = now
+            entry.last_error = ''
+            entry.body = ''
+        else:
+            entry.last_error = error
+            if entry.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                entry.status = EmailOutbox.STATUS_FAILED
+                entry.body = ''
+            else:
+                entry.next_attempt_at = now + retry_delay(entry.attempts)
+
+    with transaction.atomic():
+        EmailOutbox.objects.bulk_update(
+            entries,
+            ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at', 'body', 'modifiedat']
+        )
+
+
+def process_batch(batch_size=None, connection=None):
+    """
+    Отправка одной пачки писем из очереди: захват, отправка вне транзакции
+    и запись результатов. Возвращает количество отправленных и неотправленных писем.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+
+    entries = claim_batch(batch_size)
+    if not entries:
+        return 0, 0
+    errors = send_entries(entries, connection or get_connection())
+    mark_results(entries, errors)
+
+    return len(entries) - len(errors), len(errors)
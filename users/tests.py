@@ -1,3 +1,403 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .middleware import EmailVerificationMiddleware
+from .models import VERIFICATION_TOKEN_TTL, EmailOutbox, NSUser, UserProfile
+from .outbox import DELIVERY_LEASE, claim_batch, delivery_lease, enqueue_email, process_batch
+from .utils import EMAIL_VERIFIED_CACHE_KEY, ais_email_verified, is_email_verified
+
+
+class ConcurrentClaimEmailBackend(EmailBackend):
+    """Бэкенд, который во время отправки пытается захватить очередь как второй обработчик"""
+    claimed = None
+
+    def send_messages(self, messages):
+        ConcurrentClaimEmailBackend.claimed = claim_batch(10)
+        return super().send_messages(messages)
+
+
+class FailingEmailBackend(EmailBackend):
+    """Бэкенд, отклоняющий письма на адреса в домене fail.test"""
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(address.endswith('@fail.test') for address in message.to):
+                raise ConnectionError('SMTP недоступен')
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+    EMAIL_OUTBOX_RETRY_DELAY=60,
+)
+class EmailOutboxTests(TestCase):
+    def test_enqueue_does_not_send(self):
+        enqueue_email('Тема', 'Текст', ['a@example.com', 'b@example.com'])
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailOutbox.objects.filter(status=EmailOutbox.STATUS_PENDING).count(), 2)
+
+    def test_process_batch_sends_pending(self):
+        enqueue_email('Тема', 'Текст', ['a@example.com', 'b@example.com', 'c@example.com'])
+
+        self.assertEqual(process_batch(batch_size=2), (2, 0))
+        self.assertEqual(process_batch(batch_size=2), (1, 0))
+        self.assertEqual(process_batch(batch_size=2), (0, 0))
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].body, 'Текст')
+        self.assertFalse(EmailOutbox.objects.exclude(status=EmailOutbox.STATUS_SENT).exists())
+        # Текст отправленного письма со ссылкой и токеном не хранится
+        self.assertFalse(EmailOutbox.objects.exclude(body='').exists())
+
+    @override_settings(EMAIL_BACKEND='users.tests.FailingEmailBackend')
+    def test_failed_message_is_retried_with_backoff(self):
+        enqueue_email('Тема', 'Текст', ['ok@example.com', 'user@fail.test'])
+
+        self.assertEqual(process_batch(), (1, 1))
+        entry = EmailOutbox.objects.get(recipient='user@fail.test')
+        self.assertEqual(entry.status, EmailOutbox.STATUS_PENDING)
+        self.assertEqual(entry.attempts, 1)
+        self.assertIn('SMTP недоступен', entry.last_error)
+        self.assertEqual(entry.body, 'Текст')
+        self.assertGreater(entry.next_attempt_at, timezone.now() + timedelta(seconds=30))
+
+        # Пока не наступило время повтора, письмо не выбирается
+        self.assertEqual(process_batch(), (0, 0))
+
+        EmailOutbox.objects.filter(pk=entry.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(process_batch(), (0, 1))
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, EmailOutbox.STATUS_FAILED)
+        self.assertEqual(entry.body, '')
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_BACKEND='users.tests.ConcurrentClaimEmailBackend')
+    def test_claimed_messages_are_hidden_while_sending(self):
+        enqueue_email('Тема', 'Текст', ['a@example.com'])
+
+        self.assertEqual(process_batch(), (1, 0))
+        self.assertEqual(ConcurrentClaimEmailBackend.claimed, [])
+
+    def test_interrupted_batch_is_not_resent_before_lease_expires(self):
+        [entry] = enqueue_email('Тема', 'Текст', ['a@example.com'])
+
+        with mock.patch('users.outbox.send_entries', side_effect=RuntimeError('обработчик остановлен')):
+            with self.assertRaises(RuntimeError):
+                process_batch()
+
+        # Захват зафиксирован до отправки, письмо отложено на срок аренды
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, EmailOutbox.STATUS_PENDING)
+        self.assertGreater(entry.next_attempt_at, timezone.now() + DELIVERY_LEASE - timedelta(minutes=1))
+        self.assertEqual(process_batch(), (0, 0))
+
+        EmailOutbox.objects.filter(pk=entry.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(process_batch(), (1, 0))
+
+    def test_purge_removes_old_processed_messages(self):
+        old, recent, pending = enqueue_email('Тема', 'Текст', ['a@example.com', 'b@example.com', 'c@example.com'])
+        EmailOutbox.objects.filter(pk__in=[old.pk, recent.pk]).update(status=EmailOutbox.STATUS_SENT)
+        EmailOutbox.objects.filter(pk__in=[old.pk, pending.pk]).update(modifiedat=timezone.now() - timedelta(days=31))
+
+        stdout = StringIO()
+        call_command('purge_outbox', '--days=30', stdout=stdout)
+
+        self.assertEqual(sorted(EmailOutbox.objects.values_list('pk', flat=True)), [recent.pk, pending.pk])
+        self.assertIn('Удалено писем из очереди: 1', stdout.getvalue())
+
+    def test_admin_does_not_show_body(self):
+        admin = NSUser.objects.create_superuser('admin', 'admin@example.com', 'password')
+        UserProfile.objects.filter(user=admin).update(email_verified=True)
+        [entry] = enqueue_email('Тема', 'Ссылка с токеном', ['a@example.com'])
+        self.client.force_login(admin)
+
+        response = self.client.get(reverse('admin:users_emailoutbox_change', args=[entry.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Ссылка с токеном')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class SendVerificationsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            NSUser.objects.create_user(f'user{i}', f'user{i}@example.com', 'password')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.checkpoint))
+
+    def run_command(self, *args):
+        call_command(
+            'send_verifications', '--batch-size=2', '--workers=2',
+            f'--checkpoint={self.checkpoint}', *args, stdout=StringIO()
+        )
+
+    def test_queue_deliver_mark(self):
+        self.run_command()
+
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [user.useremail for user in self.users])
+        self.assertEqual(EmailOutbox.objects.count(), 3)
+        self.assertFalse(EmailOutbox.objects.exclude(status=EmailOutbox.STATUS_SENT).exists())
+        self.assertFalse(os.path.exists(self.checkpoint))
+        # Отправленные командой письма не достаются обработчику очереди
+        self.assertEqual(process_batch(), (0, 0))
+
+    def test_restart_from_checkpoint(self):
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'key': 'False:', 'last_pk': self.users[0].pk}, f)
+
+        self.run_command()
+
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            [user.useremail for user in self.users[1:]]
+        )
+
+    def test_lease_covers_throttled_chunk(self):
+        # 1000 писем при 1 письме в секунду отправляются около 17 минут
+        self.assertGreater(delivery_lease(1000, 4, 1), timedelta(seconds=1000))
+        self.assertGreaterEqual(delivery_lease(10, 4, 0), DELIVERY_LEASE)
+
+
+class UserProfileSaveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = NSUser.objects.create_user('owner', 'owner@example.com', 'password')
+
+    def test_save_writes_only_changed_fields(self):
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.get_dirty_fields(), [])
+
+        with self.assertNumQueries(0):
+            profile.save()
+
+        profile.email_verified = True
+        with self.assertNumQueries(1) as context:
+            profile.save()
+        sql = context.captured_queries[0]['sql']
+        self.assertIn('"email_verified"', sql)
+        self.assertNotIn('"verification_token"', sql)
+        self.assertNotIn('"token_created_at"', sql)
+
+        # После сохранения поле больше не считается измененным
+        self.assertEqual(profile.get_dirty_fields(), [])
+        with self.assertNumQueries(0):
+            profile.save()
+        self.assertTrue(UserProfile.objects.get(pk=profile.pk).email_verified)
+
+    def test_save_does_not_overwrite_concurrent_changes(self):
+        profile = UserProfile.objects.get(user=self.user)
+        UserProfile.objects.filter(pk=profile.pk).update(email_verified=True)
+
+        profile.verification_sent_at = timezone.now()
+        profile.save()
+
+        profile.refresh_from_db()
+        self.assertTrue(profile.email_verified)
+        self.assertIsNotNone(profile.verification_sent_at)
+        self.assertEqual(profile.get_dirty_fields(), [])
+
+    def test_deferred_fields_are_not_written(self):
+        profile = UserProfile.objects.only('id', 'user_id', 'email_verified').get(user=self.user)
+        profile.email_verified = True
+        with self.assertNumQueries(1) as context:
+            profile.save()
+        self.assertNotIn('"verification_sent_at"', context.captured_queries[0]['sql'])
+
+    def test_bulk_create_with_profiles(self):
+        with self.assertNumQueries(4):
+            users = NSUser.objects.bulk_create_with_profiles([
+                NSUser(userlogin=f'bulk{i}', useremail=f'bulk{i}@example.com')
+                for i in range(3)
+            ])
+
+        profiles = UserProfile.objects.filter(user__in=users)
+        self.assertEqual(sorted(profiles.values_list('user_id', flat=True)), sorted(user.pk for user in users))
+        self.assertFalse(profiles.filter(email_verified=True).exists())
+
+
+class RemoveDuplicateProfilesMigrationTests(TransactionTestCase):
+    """Миграция users 0006 оставляет по одному профилю на пользователя"""
+
+    migrate_from = [('users', '0005_hashed_verification_token')]
+    migrate_to = [('users', '0006_one_to_one_profile')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.addCleanup(self.migrate_to_latest)
+        executor.migrate(self.migrate_from)
+        self.apps = executor.loader.project_state(self.migrate_from).apps
+
+    def migrate_to_latest(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_verified_or_earliest_profile_is_kept(self):
+        User = self.apps.get_model('users', 'NSUser')
+        Profile = self.apps.get_model('users', 'UserProfile')
+        verified_user = User.objects.create(userlogin='verified', useremail='verified@example.com')
+        plain_user = User.objects.create(userlogin='plain', useremail='plain@example.com')
+        single_user = User.objects.create(userlogin='single', useremail='single@example.com')
+
+        Profile.objects.create(user=verified_user)
+        kept_verified = Profile.objects.create(user=verified_user, email_verified=True)
+        Profile.objects.create(user=verified_user)
+        kept_plain = Profile.objects.create(user=plain_user)
+        Profile.objects.create(user=plain_user)
+        kept_single = Profile.objects.create(user=single_user)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+
+        self.assertEqual(
+            sorted(UserProfile.objects.values_list('pk', flat=True)),
+            sorted([kept_verified.pk, kept_plain.pk, kept_single.pk])
+        )
+
+
+class VerificationTokenTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = NSUser.objects.create_user('owner', 'owner@example.com', 'password')
+
+    def setUp(self):
+        self.profile = UserProfile.objects.get(user=self.user)
+        self.token = self.profile.generate_verification_token()
+
+    def verify(self, token):
+        return self.client.get(reverse('users:verify_email', args=[token]))
+
+    def test_only_token_hash_is_stored(self):
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.verification_token, hashlib.sha256(self.token.encode()).hexdigest())
+        self.assertNotEqual(self.profile.verification_token, self.token)
+
+    def test_raw_token_verifies_email(self):
+        self.assertRedirects(self.verify(self.token), reverse('users:login'), fetch_redirect_response=False)
+        self.profile.refresh_from_db()
+        self.assertTrue(self.profile.email_verified)
+        self.assertIsNone(self.profile.verification_token)
+        self.assertIsNone(self.profile.token_created_at)
+
+    def test_stored_hash_is_not_a_valid_token(self):
+        self.profile.refresh_from_db()
+        response = self.verify(self.profile.verification_token)
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.profile.refresh_from_db()
+        self.assertFalse(self.profile.email_verified)
+
+    def test_expired_token_is_rejected(self):
+        UserProfile.objects.filter(pk=self.profile.pk).update(
+            token_created_at=timezone.now() - VERIFICATION_TOKEN_TTL - timedelta(minutes=1)
+        )
+        response = self.verify(self.token)
+        self.assertRedirects(response, reverse('users:resend_verification'), fetch_redirect_response=False)
+        self.profile.refresh_from_db()
+        self.assertFalse(self.profile.email_verified)
+        self.assertIsNotNone(self.profile.verification_token)
+
+
+class ClearExpiredTokensTests(TestCase):
+    def test_only_expired_tokens_are_cleared(self):
+        users = NSUser.objects.bulk_create_with_profiles([
+            NSUser(userlogin=f'user{i}', useremail=f'user{i}@example.com') for i in range(4)
+        ])
+        now = timezone.now()
+        created = {
+            users[0].pk: now - VERIFICATION_TOKEN_TTL - timedelta(hours=1),
+            users[1].pk: now - VERIFICATION_TOKEN_TTL - timedelta(days=3),
+            users[2].pk: now - timedelta(hours=1),
+        }
+        for user_id, token_created_at in created.items():
+            UserProfile.objects.filter(user_id=user_id).update(
+                verification_token=f'hash-{user_id}', token_created_at=token_created_at
+            )
+
+        stdout = StringIO()
+        call_command('clear_expired_tokens', '--batch-size=1', stdout=stdout)
+
+        tokens = dict(UserProfile.objects.values_list('user_id', 'verification_token'))
+        self.assertIsNone(tokens[users[0].pk])
+        self.assertIsNone(tokens[users[1].pk])
+        self.assertEqual(tokens[users[2].pk], f'hash-{users[2].pk}')
+        self.assertIsNone(tokens[users[3].pk])
+        self.assertFalse(
+            UserProfile.objects.filter(user__in=users[:2], token_created_at__isnull=False).exists()
+        )
+        self.assertTrue(UserProfile.objects.get(user=users[2]).token_created_at)
+        self.assertIn('Удалено просроченных токенов: 2', stdout.getvalue())
+
+
+class EmailVerifiedCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = NSUser.objects.create_user('owner', 'owner@example.com', 'password')
+        UserProfile.objects.filter(user=cls.user).update(email_verified=True)
+
+    def setUp(self):
+        cache.clear()
+        self.key = EMAIL_VERIFIED_CACHE_KEY.format(self.user.pk)
+
+    def run_middleware(self):
+        request = RequestFactory().get('/goals/')
+        request.user = self.user
+        return EmailVerificationMiddleware(lambda request: HttpResponse())(request)
+
+    def test_verified_user_is_checked_once(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.run_middleware().status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.run_middleware().status_code, 200)
+
+    def test_async_check_uses_cache(self):
+        self.assertTrue(async_to_sync(ais_email_verified)(self.user))
+        with self.assertNumQueries(0):
+            self.assertTrue(async_to_sync(ais_email_verified)(self.user))
+
+    def test_unverified_user_is_not_cached(self):
+        UserProfile.objects.filter(user=self.user).update(email_verified=False)
+        self.assertFalse(is_email_verified(self.user))
+        self.assertIsNone(cache.get(self.key))
+        with self.assertNumQueries(1):
+            self.assertFalse(is_email_verified(self.user))
+
+    def test_unverifying_profile_invalidates_cache(self):
+        self.assertTrue(is_email_verified(self.user))
+
+        profile = UserProfile.objects.get(user=self.user)
+        profile.email_verified = False
+        profile.save()
+
+        self.assertIsNone(cache.get(self.key))
+        self.assertFalse(is_email_verified(self.user))
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('goal_list'))
+        self.assertRedirects(response, reverse('users:resend_verification'), fetch_redirect_response=False)
+
+    def test_deleting_profile_invalidates_cache(self):
+        self.assertTrue(is_email_verified(self.user))
+        UserProfile.objects.get(user=self.user).delete()
+        self.assertIsNone(cache.get(self.key))
@@ -1,19 +1,20 @@
-from django.core.mail import send_mail
+from django.core.cache import cache
 from django.conf import settings
 from django.urls import reverse
 
 
-def send_verification_email(user, request):
-    """Отправка email с ссылкой верификации"""
-    from .models import UserProfile
+EMAIL_VERIFIED_CACHE_KEY = 'users:email_verified:{}'
 
-    profile, created = UserProfile.objects.get_or_create(user=user)
-    token = profile.generate_verification_token()
+
+def build_verification_email(user, token, request=None):
+    """Тема и текст письма со ссылкой верификации"""
+    path = reverse('users:verify_email', kwargs={'token': token})
 
     # Формируем абсолютный URL
-    verification_url = request.build_absolute_uri(
-        reverse('users:verify_email', kwargs={'token': token})
-    )
+    if request is not None:
+        verification_url = request.build_absolute_uri(path)
+    else:
+        verification_url = settings.SITE_URL.rstrip('/') + path
 
     subject = 'Подтверждение email на платформе NS Platform'
     message = f'''
@@ -30,15 +31,70 @@ def send_verification_email(user, request):
 
     С уважением,
     Команда NS Platform'''
-    
+
+    return subject, message
+
+
+def send_verification_email(user, request=None):
+    """
+    Постановка в очередь письма со ссылкой верификации.
+    Письмо отправляет обработчик очереди (команда process_outbox),
+    поэтому запрос не ждет SMTP-сервер.
+    """
+    from .models import UserProfile
+    from .outbox import enqueue_email
+
+    profile, created = UserProfile.objects.get_or_create(user=user)
+    token = profile.generate_verification_token()
+
+    subject, message = build_verification_email(user, token, request)
 
     # TODO: Переделать на html письмо
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [user.useremail],
-        fail_silently=False,
-    )
-
-    return True
\ No newline at end of file
+    enqueue_email(subject, message, [user.useremail])
+
+    return True
+
+
+def is_email_verified(user):
+    """Проверка подтверждения email с кэшированием положительного результата.
+
+    Для подтвержденных пользователей проверка не обращается к БД.
+    Пользователь без профиля считается подтвержденным.
+    """
+    key = EMAIL_VERIFIED_CACHE_KEY.format(user.pk)
+    if cache.get(key):
+        return True
+
+    from .models import UserProfile
+
+    verified = UserProfile.objects.filter(user_id=user.pk).values_list(
+        'email_verified', flat=True
+    ).first()
+    if verified is False:
+        return False
+
+    cache.set(key, True, settings.EMAIL_VERIFIED_CACHE_TIMEOUT)
+    return True
+
+
+async def ais_email_verified(user):
+    """Асинхронный вариант is_email_verified"""
+    key = EMAIL_VERIFIED_CACHE_KEY.format(user.pk)
+    if await cache.aget(key):
+        return True
+
+    from .models import UserProfile
+
+    verified = await UserProfile.objects.filter(user_id=user.pk).values_list(
+        'email_verified', flat=True
+    ).afirst()
+    if verified is False:
+        return False
+
+    await cache.aset(key, True, settings.EMAIL_VERIFIED_CACHE_TIMEOUT)
+    return True
+
+
+def invalidate_email_verified(user_id):
+    """Сброс кэшированного статуса подтверждения email"""
+    cache.delete(EMAIL_VERIFIED_CACHE_KEY.format(user_id))
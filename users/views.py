@@ -8,7 +8,7 @@ from django.urls import reverse_lazy
 from django.contrib.auth.views import LoginView as AuthLoginView
 from .forms import UserRegistrationForm,LoginForm, ResendVerificationForm
 from .utils import send_verification_email
-from .models import UserProfile
+from .models import UserProfile, hash_verification_token
 
 def home(request):
     return render(request, 'home.html')
@@ -47,7 +47,8 @@ class LoginView(AuthLoginView):
 def verify_email(request, token):
     """Подтверждение email по токену"""
     try:
-        profile = UserProfile.objects.get(verification_token=token)
+        # Поиск по уникальному индексу хэша токена
+        profile = UserProfile.objects.get(verification_token=hash_verification_token(token))
 
         if not profile.is_token_valid():
             messages.error(
@@ -67,11 +68,11 @@ def verify_email(request, token):
             request,
             'Email успешно подтвержден! Теперь вы можете войти в систему.'
         )
-        return redirect('users:log  in')
+        return redirect('users:login')
 
     except UserProfile.DoesNotExist:
         messages.error(request, 'Неверная или устаревшая ссылка подтверждения.')
-        return redirect('main:home')
+        return redirect('home')
 
 
 class ResendVerificationView(FormView):